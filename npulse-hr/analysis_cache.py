@@ -0,0 +1,199 @@
+"""
+Analysis Result Cache
+LRU cache for analysis results and rendered plots, keyed on file identity.
+
+Keys combine the recording's path, size and modification time with the
+pipeline parameters, so an edited or replaced file never hits a stale entry.
+Entries live in memory up to a byte budget (least recently used entries are
+evicted first) and can optionally be written to an on-disk sidecar directory
+that survives restarts.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def file_cache_key(file_path: str, kind: str, **params) -> Optional[str]:
+    """
+    Build a cache key from file identity plus pipeline parameters.
+
+    Args:
+        file_path: Recording path
+        kind: Namespace for the cached value (e.g. 'analysis', 'plot')
+        **params: Parameters that change the cached value
+
+    Returns:
+        Hex digest key, or None if the file cannot be stat'ed
+    """
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    identity = (kind, os.path.abspath(file_path), st.st_size, st.st_mtime_ns, sorted(params.items()))
+    return hashlib.sha1(repr(identity).encode('utf-8')).hexdigest()
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory footprint of a cached value in bytes."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=False).sum())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return 64 + sum(estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return 64 + sum(estimate_size(v) for v in value)
+    return 64
+
+
+class AnalysisCache:
+    """
+    Thread-safe LRU cache with a memory budget and an optional disk tier.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _store(self, key: str, value: Any) -> None:
+        """Insert into the memory tier and evict down to the budget (lock held)."""
+        size = estimate_size(value)
+        if key in self._entries:
+            self._bytes -= self._sizes.pop(key)
+            del self._entries[key]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = value
+        self._sizes[key] = size
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            old_key, _ = self._entries.popitem(last=False)
+            self._bytes -= self._sizes.pop(old_key)
+            self.evictions += 1
+
+    def _load_disk(self, key: str) -> Optional[Any]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # mark as recently used for disk pruning
+            return value
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Cache sidecar unreadable, ignoring: {e}")
+            return None
+
+    def _save_disk(self, key: str, value: Any) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp{threading.get_ident()}"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self._prune_disk()
+        except Exception as e:
+            print(f"Could not write cache sidecar: {e}")
+
+    def _prune_disk(self) -> None:
+        """Remove least recently used sidecar files beyond the disk budget."""
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.pkl'):
+                st = os.stat(os.path.join(self.disk_dir, name))
+                entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+            except OSError:
+                pass
+            total -= size
+
+    def get(self, key: Optional[str]) -> Optional[Any]:
+        """Return a cached value, promoting disk hits to memory, or None."""
+        if key is None:
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        value = self._load_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, value)
+        return value
+
+    def put(self, key: Optional[str], value: Any) -> None:
+        """Store a value in memory and, when configured, on disk."""
+        if key is None or value is None:
+            return
+        with self._lock:
+            self._store(key, value)
+        self._save_disk(key, value)
+
+    def get_or_compute(self, key: Optional[str], compute: Callable[[], Any]) -> Any:
+        """Return the cached value for key, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        """Drop all in-memory entries (the disk tier is left untouched)."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current memory usage."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
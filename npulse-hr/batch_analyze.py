@@ -0,0 +1,226 @@
+"""
+Batch ECG Analysis
+Analyze many recordings in parallel and write one summary row per file.
+
+Inputs may be recordings, directories or glob patterns. Files are analyzed
+across a pool of worker processes (one per core by default); each worker
+returns only a small summary row, so results stream back in input order
+without shipping sample arrays between processes. Plots are skipped unless a
+plot directory is given.
+"""
+
+import contextlib
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from ecg_processor import PUBLIC_DETECTORS, PUBLIC_MODES, analyze_ecg_file
+from recording_format import BINARY_EXTENSION, COMPRESSED_EXTENSION
+from stream_processor import analyze_ecg_stream
+
+
+RECORDING_EXTENSIONS = ('.txt', BINARY_EXTENSION, COMPRESSED_EXTENSION)
+
+# Column order of the summary rows
+SUMMARY_FIELDS = [
+    'file', 'ok', 'error', 'total_samples', 'sampling_rate', 'seconds',
+    'sensor1_avg', 'sensor1_min', 'sensor1_max',
+    'sensor2_avg', 'sensor2_min', 'sensor2_max',
+    'sensor3_avg', 'sensor3_min', 'sensor3_max',
+    'combined_avg', 'combined_min', 'combined_max', 'respiration', 'channels',
+]
+
+
+def find_recordings(inputs: Iterable[str], recursive: bool = False) -> List[str]:
+    """
+    Expand files, directories and glob patterns into a sorted list of recordings.
+
+    URLs are passed through unchanged.
+    """
+    found = []
+    for item in inputs:
+        if item.startswith("http"):
+            found.append(item)
+            continue
+        if os.path.isdir(item):
+            pattern = os.path.join(item, "**", "*") if recursive else os.path.join(item, "*")
+            candidates = glob.glob(pattern, recursive=recursive)
+        elif glob.has_magic(item):
+            candidates = glob.glob(item, recursive=True)
+        else:
+            candidates = [item]
+        # Missing explicit paths are kept so they show up as failed rows
+        found.extend(path for path in candidates
+                     if (os.path.isfile(path) and path.lower().endswith(RECORDING_EXTENSIONS))
+                     or not os.path.exists(path))
+    return sorted(dict.fromkeys(found))
+
+
+def summarize_recording(file_path: str, stream: bool = False, plot_dir: Optional[str] = None,
+                        detector: str = 'find_peaks', top_channels: Optional[int] = None,
+                        mode: str = 'beats') -> Dict:
+    """
+    Analyze one recording and flatten the results into a summary row.
+
+    Args:
+        file_path: Recording path or URL
+        stream: Use the bounded-memory streaming analyzer
+        plot_dir: Save a PNG plot per recording here (None skips plotting)
+        detector: Beat detector for the in-memory analyzer (see ecg_processor.DETECTORS)
+        top_channels: Analyze only this many best-ranked sensors (in-memory
+            analyzer; None analyzes all)
+        mode: 'beats' or 'fast' (spectral average HR only) for the
+            in-memory analyzer
+
+    Returns:
+        Dictionary with the SUMMARY_FIELDS keys
+    """
+    row = dict.fromkeys(SUMMARY_FIELDS)
+    row.update(file=file_path, ok=False)
+    start = time.perf_counter()
+    try:
+        # Analyzer diagnostics must not interleave with a summary written to stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            results = analyze_ecg_stream(file_path) if stream else \
+                analyze_ecg_file(file_path, detector, top_channels=top_channels, mode=mode)
+    except Exception as e:
+        results = None
+        row['error'] = str(e)
+
+    if results:
+        row.update(ok=True, total_samples=results['total_samples'],
+                   sampling_rate=round(float(results['sampling_rate']), 3))
+        for i, hr in enumerate(results['hr_results'], start=1):
+            for key in ('avg', 'min', 'max'):
+                row[f'sensor{i}_{key}'] = round(float(hr[key]), 2)
+        for key in ('avg', 'min', 'max'):
+            row[f'combined_{key}'] = round(float(results['combined_hr'][key]), 2)
+        if 'respiration' in results:
+            row['respiration'] = round(results['respiration']['combined'], 2)
+        if 'analyzed_channels' in results:
+            row['channels'] = ' '.join(str(i + 1) for i in results['analyzed_channels'])
+
+        if plot_dir and 'samples' in results:
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+            from ecg_processor import create_ecg_plot, samples_dataframe
+
+            os.makedirs(plot_dir, exist_ok=True)
+            name = os.path.splitext(os.path.basename(file_path))[0]
+            with contextlib.redirect_stdout(sys.stderr):
+                fig = create_ecg_plot(samples_dataframe(results['samples']), results['hr_results'],
+                                      results['combined_hr'], save_path=os.path.join(plot_dir, f"{name}.png"))
+            plt.close(fig)
+    elif row['error'] is None:
+        row['error'] = "analysis failed"
+
+    row['seconds'] = round(time.perf_counter() - start, 4)
+    return row
+
+
+def _summarize_args(args) -> Dict:
+    return summarize_recording(*args)
+
+
+def analyze_batch(paths: List[str], workers: Optional[int] = None, stream: bool = False,
+                  plot_dir: Optional[str] = None, detector: str = 'find_peaks',
+                  top_channels: Optional[int] = None, mode: str = 'beats') -> Iterator[Dict]:
+    """
+    Analyze recordings across a process pool, yielding summary rows in input order.
+
+    Args:
+        paths: Recordings to analyze
+        workers: Worker processes (default: CPU count; 1 runs in this process)
+        stream: Use the streaming analyzer
+        plot_dir: Directory for per-recording plots (None skips plotting)
+        detector: Beat detector for the in-memory analyzer
+        top_channels: Analyze only this many best-ranked sensors per recording
+        mode: 'beats' or 'fast' for the in-memory analyzer
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = [(path, stream, plot_dir, detector, top_channels, mode) for path in paths]
+    if workers == 1 or len(paths) < 2:
+        yield from map(_summarize_args, jobs)
+        return
+
+    # Several files per task amortize the inter-process round trip for short recordings
+    chunksize = max(1, min(8, len(paths) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        yield from pool.map(_summarize_args, jobs, chunksize=chunksize)
+
+
+def write_rows(rows: Iterable[Dict], out, fmt: str = 'jsonl') -> Iterator[Dict]:
+    """Write rows to out as JSON lines or CSV as they arrive, passing them through."""
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+    for row in rows:
+        if writer:
+            writer.writerow(row)
+        else:
+            out.write(json.dumps(row) + "\n")
+        out.flush()
+        yield row
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analyze many ECG recordings in parallel")
+    parser.add_argument("inputs", nargs="+", help="Recordings, directories or glob patterns")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("-o", "--output", default="-", help="Summary file (default: stdout)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default=None,
+                        help="Summary format (default: from the output extension, else jsonl)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Descend into subdirectories")
+    parser.add_argument("--stream", action="store_true", help="Use the bounded-memory streaming analyzer (no signal quality masking)")
+    parser.add_argument("--detector", choices=PUBLIC_DETECTORS, default='find_peaks',
+                        help="Beat detector (not with --stream)")
+    parser.add_argument("--top-channels", type=int, default=None, metavar="K",
+                        help="Rank sensors on a decimated copy and analyze only the best K "
+                             "(default: all; not with --stream)")
+    parser.add_argument("--mode", choices=PUBLIC_MODES, default='beats',
+                        help="Analysis mode (not with --stream)")
+    parser.add_argument("--plot-dir", default=None, help="Save a plot per recording to this directory (not with --stream)")
+    args = parser.parse_args(argv)
+
+    if args.top_channels is not None and args.top_channels < 1:
+        parser.error("--top-channels must be at least 1")
+
+    paths = find_recordings(args.inputs, args.recursive)
+    if not paths:
+        print("No recordings found.", file=sys.stderr)
+        return 1
+    fmt = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+
+    out = sys.stdout if args.output == "-" else open(args.output, 'w', newline='')
+    start = time.perf_counter()
+    n_files = n_failed = n_samples = 0
+    try:
+        for row in write_rows(analyze_batch(paths, args.workers, args.stream, args.plot_dir, args.detector,
+                                                args.top_channels, args.mode), out, fmt):
+            n_files += 1
+            if row['ok']:
+                n_samples += row['total_samples']
+            else:
+                n_failed += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{n_files} files ({n_failed} failed), {n_samples} samples in {elapsed:.2f} s: "
+          f"{n_files / elapsed:.1f} files/s, {n_samples / elapsed / 1e6:.2f} Msamples/s",
+          file=sys.stderr)
+    return 0 if n_failed < n_files else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Beat Fusion
+Merge per-sensor beat trains into one consensus beat train.
+
+Every sensor sees the same heartbeat, a few samples apart depending on the
+pulse morphology at its site. Pooling the beat-to-beat HR values of all
+sensors counts each beat up to once per sensor and mixes intervals from
+different sensors' clocks. Instead, beats of all sensors are pooled and cut
+into candidate beats wherever two consecutive pooled beats are more than the
+tolerance apart. Each sensor's nearest beat to every candidate is then found
+with searchsorted; a sensor supports the candidate when that beat lies
+within the tolerance, so no sensor counts twice for one beat. The consensus
+beat is the mean position of its supporting beats and its confidence the
+share of contributing sensors that support it.
+
+Per-beat quantities measured by each sensor, such as the HR of the interval
+ending at a beat, are fused the same way: each consensus beat takes the
+median over its supporting sensors, so every heartbeat contributes once and
+every interval is measured on a single sensor's beats. When the sensors
+mostly agree, beats only a minority of them found are left out of the HR;
+sensors that rarely agree leave nothing to vote with, and every beat counts
+in proportion to its confidence.
+"""
+
+from typing import Dict, Sequence
+
+import numpy as np
+
+
+# Beats of different sensors this close (seconds) are the same heartbeat;
+# under half the shortest interval BPM_RANGE accepts
+FUSION_TOLERANCE = 0.12
+
+# Consensus beats need at least MIN_CONFIDENCE of the sensors, once at least
+# CONSENSUS_SHARE of all beats reach it
+MIN_CONFIDENCE = 0.5
+CONSENSUS_SHARE = 0.5
+
+
+def fuse_beats(peaks: Sequence[np.ndarray], fs: float = 220, tolerance: float = FUSION_TOLERANCE) -> Dict:
+    """
+    Consensus beat train of several sensors.
+
+    Args:
+        peaks: Sorted beat indices for each sensor (empty for sensors that
+            were not analyzed; these do not contribute)
+        fs: Sampling frequency in Hz
+        tolerance: Largest distance in seconds between beats of one heartbeat
+
+    Returns:
+        Dictionary with 'beats' (consensus beat indices), 'confidence'
+        (share of contributing sensors supporting each beat), 'match'
+        ((beats, sensors) index of the supporting beat in each sensor's
+        train, -1 where the sensor does not support it) and 'sensors'
+        (number of contributing sensors)
+    """
+    trains = [np.asarray(p, dtype=np.int64) for p in peaks]
+    contributing = [i for i, train in enumerate(trains) if len(train)]
+    if not contributing:
+        return {
+            'beats': np.zeros(0, dtype=np.int64),
+            'confidence': np.zeros(0, dtype=np.float32),
+            'match': np.zeros((0, len(trains)), dtype=np.int64),
+            'sensors': 0,
+        }
+    width = max(tolerance * fs, 1.0)
+    pooled = np.sort(np.concatenate([trains[i] for i in contributing]))
+
+    # Candidate beats: runs of pooled beats with no gap wider than the tolerance
+    starts = np.r_[0, np.flatnonzero(np.diff(pooled) > width) + 1]
+    centers = np.add.reduceat(pooled, starts) / np.diff(np.r_[starts, len(pooled)])
+
+    match = np.full((len(centers), len(trains)), -1, dtype=np.int64)
+    position_sum = np.zeros(len(centers))
+    for i in contributing:
+        train = trains[i]
+        right = np.minimum(np.searchsorted(train, centers), len(train) - 1)
+        left = np.maximum(right - 1, 0)
+        nearest = np.where(np.abs(train[left] - centers) <= np.abs(train[right] - centers), left, right)
+        matched = np.abs(train[nearest] - centers) <= width
+        match[:, i] = np.where(matched, nearest, -1)
+        position_sum += np.where(matched, train[nearest], 0)
+
+    count = np.count_nonzero(match >= 0, axis=1)
+    # A long chained run may leave its center unmatched; it keeps the run mean
+    beats = np.where(count > 0, position_sum / np.maximum(count, 1), centers)
+    return {
+        'beats': np.round(beats).astype(np.int64),
+        'confidence': (count / len(contributing)).astype(np.float32),
+        'match': match,
+        'sensors': len(contributing),
+    }
+
+
+def fuse_values(fusion: Dict, values: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Per consensus beat median of a quantity each sensor measures per beat.
+
+    Args:
+        fusion: Result of fuse_beats
+        values: One array per sensor, aligned with that sensor's beats (NaN
+            where the sensor has no value)
+
+    Returns:
+        float64 array with one value per consensus beat, NaN where no
+        supporting sensor has a value
+    """
+    fused = np.full(fusion['match'].shape, np.nan)
+    for i, sensor_values in enumerate(values):
+        index = fusion['match'][:, i]
+        sensor_values = np.asarray(sensor_values, dtype=np.float64)
+        if len(sensor_values):
+            fused[:, i] = np.where(index >= 0, sensor_values[np.maximum(index, 0)], np.nan)
+    known = ~np.isnan(fused)
+    # Median over the sensors: a sensor that misplaced or missed the previous
+    # beat is outvoted once two others agree
+    fused[~known.any(axis=1)] = 0.0
+    return np.where(known.any(axis=1), np.nanmedian(fused, axis=1), np.nan)
+
+
+def beat_weights(fusion: Dict, min_confidence: float = MIN_CONFIDENCE) -> np.ndarray:
+    """
+    Weight of each consensus beat in combined statistics.
+
+    Beats are weighted by confidence; when at least CONSENSUS_SHARE of them
+    reach min_confidence, the rest get weight 0.
+    """
+    confidence = fusion['confidence'].astype(np.float64)
+    agreed = confidence >= min_confidence
+    if agreed.any() and agreed.mean() >= CONSENSUS_SHARE:
+        return np.where(agreed, confidence, 0.0)
+    return confidence
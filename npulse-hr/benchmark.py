@@ -0,0 +1,952 @@
+"""
+nPulse Benchmarks
+Timing harness for the ECG analysis pipeline.
+Run `python benchmark.py <name>` from this directory; see --help for the list.
+"""
+
+import argparse
+import contextlib
+import glob
+import http.server
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+import threading
+import tracemalloc
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+import scipy.signal as signal
+
+from batch_analyze import analyze_batch
+from beat_fusion import beat_weights, fuse_beats, fuse_values
+from binary_transport import compact_samples, encode_block, pack_frame, unpack_frame
+from chart_downsample import build_pyramid, minmax_downsample, pyramid_range
+from ble_decoder import SampleDecoder
+from ble_handler import BLE_BATCH_BYTES
+from ecg_processor import (BPM_SCALE, analyze_ecg_file, beat_bpm, clean_text, design_bandpass, detect_peaks, filter_channels,
+                           hr_trend, load_samples, parse_samples, peaks_to_bpm, read_file_content, rr_series)
+from hrv import HRV_FIELDS, hrv_batch, hrv_metrics, hrv_windows
+from live_hr import LiveHeartRate
+from plot_renderer import PLOT_SIZES, render_ecg_png
+from qrs_detector import PanTompkinsStream, pan_tompkins_peaks
+from recording_format import (BINARY_EXTENSION, CODECS, SAMPLE_DTYPE, iter_compressed_blocks, pack_header,
+                              write_compressed_recording)
+from respiration import (BREATH_PROMINENCE, MIN_BREATH_INTERVAL, RESP_BAND, RESP_FILTER_ORDER, breaths_to_rate,
+                         respiration_rate)
+from signal_quality import channel_scores, window_quality
+from spectral_hr import spectral_hr
+from stream_processor import analyze_ecg_stream
+
+
+DEFAULT_RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "files-old", "*.txt")
+
+
+def _legacy_process_lines(text: str) -> Optional[pd.DataFrame]:
+    """Original per-line process_lines, kept as the parsing baseline."""
+    line_1, line_2, line_3 = [], [], []
+    for line in text.split('\n'):
+        values = line.split(',')
+        if len(values) >= 3:
+            line_1.append(values[0])
+            line_2.append(values[1])
+            line_3.append(values[2])
+    if not line_1:
+        return None
+    df = pd.DataFrame({'line_1': line_1, 'line_2': line_2, 'line_3': line_3})
+    for col in df.columns:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df.dropna().astype('Int64')
+
+
+def _legacy_channel_peaks(samples: np.ndarray, fs: float = 220) -> List[np.ndarray]:
+    """Original per-column loop: normalize, design, filtfilt and find_peaks for each sensor."""
+    peaks = []
+    for i in range(samples.shape[1]):
+        x = samples[:, i] - np.mean(samples[:, i])
+        x = x / np.std(x)
+        b, a = signal.butter(4, [0.5 / (fs / 2), 8 / (fs / 2)], btype='bandpass')
+        peaks.append(signal.find_peaks(signal.filtfilt(b, a, x), distance=fs * 0.5, prominence=0.5)[0])
+    return peaks
+
+
+def _multichannel_peaks(samples: np.ndarray, fs: float = 220) -> List[np.ndarray]:
+    filtered, _ = filter_channels(samples, fs)
+    return [detect_peaks(filtered[:, i], fs) for i in range(filtered.shape[1])]
+
+
+class _LegacyNotificationDecoder:
+    """Original str-based BLEHandler notification handling, kept as the decoding baseline."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.collected = []
+
+    def feed(self, data: bytes) -> None:
+        self.buffer += data.decode('utf-8')
+        lines = self.buffer.split('\n')
+        self.buffer = lines[-1]
+        for line in lines[:-1]:
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split(',')
+            if len(parts) >= 3:
+                try:
+                    values = [int(p.strip()) for p in parts[:3]]
+                    if 0 not in values:
+                        self.collected.append(line)
+                except ValueError:
+                    pass
+
+
+class _RecordingRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Static file server with keep-alive and ETag validators, standing in for the recordings host."""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    _etag = None
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            st = os.stat(path)
+            self._etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+            if self.headers.get('If-None-Match') == self._etag:
+                self.send_response(304)
+                self.end_headers()
+                return None
+        return super().send_head()
+
+    def end_headers(self):
+        if self._etag:
+            self.send_header('ETag', self._etag)
+        super().end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def local_http_server(directory: str) -> Iterator[str]:
+    """Serve directory over HTTP on a free local port; yields the base URL."""
+    handler = lambda *args, **kwargs: _RecordingRequestHandler(*args, directory=directory, **kwargs)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def time_call(func: Callable, *args, repeat: int = 5, **kwargs) -> float:
+    """Return the best wall time of `repeat` calls in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func: Callable, *args, **kwargs) -> int:
+    """Return the peak traced Python/NumPy allocation of one call in bytes."""
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _child_run(queue, func, args) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    heap = tracemalloc.get_traced_memory()[1]
+    queue.put((result, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, heap))
+
+
+def run_isolated(func: Callable, *args):
+    """
+    Run func in a fresh process.
+
+    Returns (result, seconds, peak RSS in MB, peak traced heap in MB). RSS
+    includes the interpreter and imports; the traced heap covers only the
+    allocations made by func.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child_run, args=(queue, func, args))
+    proc.start()
+    result, elapsed, maxrss, heap = queue.get()
+    proc.join()
+    return result, elapsed, maxrss / 1024, heap / 1e6  # ru_maxrss is in KiB on Linux
+
+
+def synthetic_blocks(n_samples: int, fs: float = 220, bpm: float = 75, seed: int = 0,
+                     block_size: int = 1 << 20) -> Iterator[np.ndarray]:
+    """Yield int16 (n, 3) blocks of a synthetic three-lead pulse recording."""
+    rng = np.random.default_rng(seed)
+    n_beats = int(n_samples / fs * bpm / 60) + 2
+    ibi = 60 / bpm * (1 + 0.05 * rng.standard_normal(n_beats))
+    beats = np.round(np.cumsum(ibi) * fs).astype(np.int64)
+
+    width = int(0.04 * fs)
+    kernel_t = np.arange(-width, width + 1)
+    kernel = np.exp(-0.5 * (kernel_t / (0.012 * fs)) ** 2)
+    gains = np.array([400.0, 250.0, 120.0])
+    baseline = np.array([2000.0, 2600.0, 4800.0])
+
+    for start in range(0, n_samples, block_size):
+        stop = min(start + block_size, n_samples)
+        t = np.arange(start, stop) / fs
+        block = baseline + 40 * np.sin(2 * np.pi * 0.25 * t)[:, None] \
+            + 8 * rng.standard_normal((stop - start, 3))
+        local = beats[(beats >= start - width) & (beats < stop + width)] - start
+        idx = (local[:, None] + kernel_t).ravel()
+        keep = (idx >= 0) & (idx < stop - start)
+        pulse = np.zeros(stop - start)
+        np.add.at(pulse, idx[keep], np.tile(kernel, len(local))[keep])
+        block += pulse[:, None] * gains
+        yield block.astype(SAMPLE_DTYPE)
+
+
+def write_synthetic_recording(path: str, hours: float, fs: float = 220) -> int:
+    """Write a synthetic binary recording block by block; returns the sample count."""
+    n_samples = int(hours * 3600 * fs)
+    with open(path, 'wb') as f:
+        f.write(pack_header(3, fs, n_samples, "synthetic"))
+        for block in synthetic_blocks(n_samples, fs):
+            f.write(block.tobytes())
+    return n_samples
+
+
+def load_recordings(pattern: str) -> Dict[str, str]:
+    """Read and clean every recording matching the glob pattern."""
+    texts = {}
+    for path in sorted(glob.glob(pattern)):
+        content = read_file_content(path)
+        if content:
+            texts[os.path.basename(path)] = clean_text(content)
+    return texts
+
+
+def bench_parse(args) -> None:
+    """Vectorized parse_samples against the per-line pandas parser."""
+    texts = load_recordings(args.files)
+    if not texts:
+        print(f"No recordings match {args.files}")
+        return
+
+    # Tile the first recording to emulate a multi-hour capture
+    first = next(iter(texts.values()))
+    texts[f"synthetic x{args.tile}"] = '\n'.join([first] * args.tile)
+
+    print(f"{'recording':<60} {'bytes':>10} {'legacy ms':>10} {'numpy ms':>10} {'speedup':>8} {'mem ratio':>9}")
+    for name, text in texts.items():
+        repeat = args.repeat if len(text) < 10_000_000 else 1
+        legacy = time_call(_legacy_process_lines, text, repeat=repeat)
+        fast = time_call(parse_samples, text, repeat=repeat)
+        mem_ratio = peak_memory(_legacy_process_lines, text) / max(peak_memory(parse_samples, text), 1)
+        print(f"{name[:60]:<60} {len(text):>10} {legacy * 1e3:>10.1f} {fast * 1e3:>10.1f} "
+              f"{legacy / fast:>7.1f}x {mem_ratio:>8.1f}x")
+
+
+def bench_stream(args) -> None:
+    """Streaming analysis of a synthetic Holter-length recording."""
+    _, _, idle_rss, _ = run_isolated(len, [])
+    print(f"interpreter + imports: peak RSS {idle_rss:7.1f} MB")
+
+    def report(label, result, seconds, rss, heap, extra=""):
+        print(f"{label:<13} {seconds:6.1f} s  peak RSS {rss:7.1f} MB  peak heap {heap:7.1f} MB  "
+              f"combined avg {result['combined_hr']['avg']:.2f} BPM{extra}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        short_path = os.path.join(tmp, "short.npb")
+        write_synthetic_recording(short_path, args.short_hours)
+        report(f"{args.short_hours:g} h batch", *run_isolated(analyze_ecg_file, short_path))
+        report(f"{args.short_hours:g} h stream", *run_isolated(analyze_ecg_stream, short_path))
+
+        long_path = os.path.join(tmp, "long.npb")
+        n_samples = write_synthetic_recording(long_path, args.hours)
+        size_mb = os.path.getsize(long_path) / 1e6
+        report(f"{args.hours:g} h stream", *run_isolated(analyze_ecg_stream, long_path),
+               extra=f"  ({n_samples} samples, {size_mb:.0f} MB file)")
+
+
+def bench_compress(args) -> None:
+    """Compression ratio and decode throughput of the .npc codecs."""
+    recordings = {}
+    for path in sorted(glob.glob(args.files)):
+        content = read_file_content(path)
+        if content:
+            recordings[os.path.basename(path)] = (os.path.getsize(path), parse_samples(clean_text(content)))
+    n_synthetic = int(args.short_hours * 3600 * 220)
+    synthetic = np.concatenate(list(synthetic_blocks(n_synthetic)))
+    # Size of the same samples written as text, for a like-for-like ratio
+    text_size = sum(len(f"{a},{b},{c}\n") for a, b, c in synthetic[:10000].tolist()) * len(synthetic) // 10000
+    recordings[f"synthetic {args.short_hours:g} h"] = (text_size, synthetic)
+
+    print(f"{'recording':<60} {'codec':>5} {'text B':>10} {'npc B':>9} {'ratio':>7} {'decode Msamp/s':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (text_size, samples) in recordings.items():
+            for codec in sorted(CODECS):
+                path = os.path.join(tmp, f"{codec}.npc")
+                write_compressed_recording(path, samples, 220, codec=codec)
+                decode = time_call(lambda: list(iter_compressed_blocks(path)), repeat=args.repeat)
+                size = os.path.getsize(path)
+                print(f"{name[:60]:<60} {codec:>5} {text_size:>10} {size:>9} {text_size / size:>6.1f}x "
+                      f"{len(samples) / decode / 1e6:>15.1f}")
+
+
+def bench_decode(args) -> None:
+    """BLE notification decoding throughput for typical notification sizes."""
+    texts = load_recordings(args.files)
+    if texts:
+        payload = '\n'.join(texts.values()).encode('utf-8')
+    else:
+        samples = np.concatenate(list(synthetic_blocks(220 * 600)))
+        payload = ''.join(f"{a},{b},{c}\n" for a, b, c in samples.tolist()).encode('utf-8')
+    n_samples = len(parse_samples(payload))
+
+    def run_legacy(chunks):
+        decoder = _LegacyNotificationDecoder()
+        for chunk in chunks:
+            decoder.feed(chunk)
+
+    def run_numpy(chunks, min_batch_bytes=0):
+        decoder = SampleDecoder(min_batch_bytes=min_batch_bytes)
+        out = np.empty((n_samples + 1, 3), dtype=np.int32)
+        filled = 0
+        for chunk in chunks:
+            filled += decoder.feed_into(chunk, out, filled)
+        decoder.flush_into(out, filled)
+
+    print(f"{n_samples} samples, {len(payload)} bytes")
+    print(f"{'notification B':>14} {'legacy Msamp/s':>15} {'numpy Msamp/s':>14} "
+          f"{'batched Msamp/s':>16} {'speedup':>8}")
+    for size in (20, 64, 244, 512, 4096):
+        chunks = [payload[i:i + size] for i in range(0, len(payload), size)]
+        legacy = time_call(run_legacy, chunks, repeat=args.repeat)
+        fast = time_call(run_numpy, chunks, repeat=args.repeat)
+        batched = time_call(run_numpy, chunks, BLE_BATCH_BYTES, repeat=args.repeat)
+        print(f"{size:>14} {n_samples / legacy / 1e6:>15.2f} {n_samples / fast / 1e6:>14.2f} "
+              f"{n_samples / batched / 1e6:>16.2f} {legacy / min(fast, batched):>7.1f}x")
+
+
+def bench_fetch(args) -> None:
+    """URL loading: one-shot requests.get against the pooled, cached fetch layer."""
+    paths = sorted(glob.glob(args.files))
+    if not paths:
+        print(f"No recordings match {args.files}")
+        return
+
+    def legacy_load(url):
+        return parse_samples(clean_text(requests.get(url).text))
+
+    directory = os.path.dirname(os.path.abspath(paths[0]))
+    cwd = os.getcwd()
+    with local_http_server(directory) as base, tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # the fetch cache lives under ./files/.cache
+        try:
+            urls = [f"{base}/{requests.utils.quote(os.path.basename(p))}" for p in paths]
+            results = {}
+            for label, load, cold in (("legacy get", legacy_load, False),
+                                      ("cold cache", lambda url: load_samples(url)[0], True),
+                                      ("warm cache", lambda url: load_samples(url)[0], False)):
+                best = float('inf')
+                for _ in range(args.repeat):
+                    if cold:
+                        shutil.rmtree("files", ignore_errors=True)
+                    _RecordingRequestHandler.connections = 0
+                    start = time.perf_counter()
+                    results[label] = [load(url) for url in urls]
+                    best = min(best, time.perf_counter() - start)
+                print(f"{label:<11} {len(urls)} URLs in {best * 1e3:8.1f} ms  "
+                      f"({_RecordingRequestHandler.connections} new TCP connections)")
+        finally:
+            os.chdir(cwd)
+
+    same = all(np.array_equal(a, b) and np.array_equal(a, c)
+               for a, b, c in zip(results["legacy get"], results["cold cache"], results["warm cache"]))
+    print(f"samples identical across methods: {same}")
+
+
+def bench_batch(args) -> None:
+    """Parallel batch analysis throughput against the number of worker processes."""
+    cpus = os.cpu_count() or 1
+    counts = sorted({1, cpus} | {n for n in (2, 4, 8, 16, 32) if n < cpus})
+    n_files = max(24, 4 * cpus)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        n_samples = 0
+        for i in range(n_files):
+            path = os.path.join(tmp, f"rec{i:03d}.npb")
+            n_samples += write_synthetic_recording(path, 10 / 60)
+            paths.append(path)
+
+        print(f"{n_files} synthetic 10 min recordings, {cpus} CPU(s)")
+        print(f"{'workers':>7} {'seconds':>8} {'files/s':>8} {'Msamp/s':>8} {'speedup':>8} {'efficiency':>10}")
+        baseline = None
+        for workers in counts:
+            start = time.perf_counter()
+            rows = list(analyze_batch(paths, workers))
+            elapsed = time.perf_counter() - start
+            assert all(row['ok'] for row in rows)
+            baseline = baseline or elapsed
+            print(f"{workers:>7} {elapsed:>8.2f} {n_files / elapsed:>8.1f} {n_samples / elapsed / 1e6:>8.2f} "
+                  f"{baseline / elapsed:>7.2f}x {baseline / elapsed / workers:>9.0%}")
+
+
+def bench_filter(args) -> None:
+    """Multichannel sosfiltfilt pass against the per-column filtfilt loop."""
+    recordings = {name: parse_samples(text) for name, text in load_recordings(args.files).items()}
+    n_synthetic = int(args.short_hours * 3600 * 220)
+    recordings[f"synthetic {args.short_hours:g} h"] = np.concatenate(list(synthetic_blocks(n_synthetic)))
+
+    print(f"{'recording':<60} {'samples':>9} {'loop ms':>9} {'multi ms':>9} {'speedup':>8} {'same beats':>10}")
+    for name, samples in recordings.items():
+        samples = samples[500:-500]
+        repeat = args.repeat if len(samples) < 1_000_000 else 1
+        legacy = time_call(_legacy_channel_peaks, samples, repeat=repeat)
+        fast = time_call(_multichannel_peaks, samples, repeat=repeat)
+        same = all(np.array_equal(a, b) for a, b in zip(_legacy_channel_peaks(samples), _multichannel_peaks(samples)))
+        print(f"{name[:60]:<60} {len(samples):>9} {legacy * 1e3:>9.1f} {fast * 1e3:>9.1f} "
+              f"{legacy / fast:>7.2f}x {str(same):>10}")
+
+
+def bench_live(args) -> None:
+    """Live beat detection cost and latency against offline peaks, by block size."""
+    fs = 220
+    samples = np.concatenate(list(synthetic_blocks(fs * 120)))
+    filtered, _ = filter_channels(samples, fs)
+    reference = detect_peaks(filtered[:, 0], fs)
+    reference_bpm = float(np.mean(peaks_to_bpm(reference, fs)))
+
+    print(f"{len(samples)} synthetic samples, {len(reference)} offline beats on sensor 1 "
+          f"({reference_bpm:.1f} BPM)")
+    print(f"{'block':>5} {'us/sample':>10} {'beats':>6} {'matched':>8} {'lag ms':>7} "
+          f"{'median latency ms':>18} {'max latency ms':>15} {'live BPM':>9}")
+    for block in (1, 4, BLE_BATCH_BYTES // 15, 64):
+        live = LiveHeartRate(fs)
+        beats, latency = [], []
+        start = time.perf_counter()
+        for i in range(0, len(samples), block):
+            for beat in live.push(samples[i:i + block]):
+                latency.append(live.n - 1 - beat['index'])
+                if beat['channel'] == 0:
+                    beats.append(beat['index'])
+        elapsed = time.perf_counter() - start
+        # Causal filtering delays peaks by a few samples relative to the zero-phase reference
+        offset = np.subtract.outer(np.array(beats), reference)
+        nearest = offset[np.arange(len(beats)), np.abs(offset).argmin(axis=1)]
+        matched = np.abs(nearest) <= 0.1 * fs
+        latency = np.array(latency) / fs * 1e3
+        print(f"{block:>5} {elapsed / len(samples) * 1e6:>10.2f} {len(beats):>6} {matched.sum():>8} "
+              f"{np.median(nearest[matched]) / fs * 1e3:>7.1f} {np.median(latency):>18.0f} "
+              f"{latency.max():>15.0f} {live.bpm:>9.1f}")
+
+
+def _beat_agreement(beats: np.ndarray, reference: np.ndarray, tolerance: int) -> Tuple[float, float, float]:
+    """
+    Precision, recall and F1 of beats against reference beats.
+
+    A beat matches when a reference beat lies within tolerance samples;
+    undefined scores (nothing detected or no reference beats) are NaN.
+    """
+    if not len(reference) and not len(beats):
+        return float('nan'), float('nan'), float('nan')
+    if not len(reference) or not len(beats):
+        return (float('nan') if not len(beats) else 0.0), (float('nan') if not len(reference) else 0.0), 0.0
+    distance = np.abs(np.subtract.outer(reference, beats))
+    precision = float((distance.min(axis=0) <= tolerance).mean())
+    recall = float((distance.min(axis=1) <= tolerance).mean())
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+def _stream_beats(channel: np.ndarray, fs: float = 220, block: int = BLE_BATCH_BYTES // 15) -> List[int]:
+    """Feed one raw channel to a PanTompkinsStream in BLE-sized blocks."""
+    detector = PanTompkinsStream(fs)
+    beats = []
+    for start in range(0, len(channel), block):
+        beats.extend(detector.push(channel[start:start + block]))
+    return beats
+
+
+def bench_detect(args) -> None:
+    """Pan-Tompkins detector against find_peaks: speed and beat agreement (precision, recall, F1)."""
+    fs = 220
+    tolerance = int(0.1 * fs)
+    recordings = {name: parse_samples(text)[500:-500] for name, text in load_recordings(args.files).items()}
+    print(f"{'recording':<44} {'sensor':>6} {'find_peaks':>10} {'pan_tompkins':>12} {'prec':>5} {'recall':>6} "
+          f"{'F1':>5} {'fp ms':>7} {'pt ms':>7} {'stream ms':>9}")
+    for name, samples in recordings.items():
+        filtered, usable = filter_channels(samples, fs)
+        for i in np.flatnonzero(usable):
+            channel = np.ascontiguousarray(filtered[:, i])
+            reference = detect_peaks(channel, fs)
+            beats = pan_tompkins_peaks(channel, fs)
+            fp = time_call(detect_peaks, channel, fs, repeat=args.repeat)
+            pt = time_call(pan_tompkins_peaks, channel, fs, repeat=args.repeat)
+            stream = time_call(_stream_beats, samples[:, i], fs, repeat=args.repeat)
+            precision, recall, f1 = _beat_agreement(beats, reference, tolerance)
+            scores = ['--' if np.isnan(value) else f'{value:.0%}' for value in (precision, recall, f1)]
+            print(f"{name[:44]:<44} {i + 1:>6} {len(reference):>10} {len(beats):>12} "
+                  f"{scores[0]:>5} {scores[1]:>6} {scores[2]:>5} "
+                  f"{fp * 1e3:>7.2f} {pt * 1e3:>7.2f} {stream * 1e3:>9.1f}")
+
+    # Synthetic recordings with a known rate, including rates find_peaks cannot follow
+    minutes = 2
+    print(f"\nsynthetic {minutes} min, sensor 1: beats found / beats present")
+    print(f"{'BPM':>5} {'present':>8} {'find_peaks':>10} {'pan_tompkins':>12} {'streaming':>10}")
+    for bpm in (60, 90, 120, 150, 180):
+        samples = np.concatenate(list(synthetic_blocks(fs * 60 * minutes, bpm=bpm)))
+        filtered, _ = filter_channels(samples, fs)
+        streamed = len(_stream_beats(samples[:, 0], fs))
+        print(f"{bpm:>5} {bpm * minutes:>8} {len(detect_peaks(filtered[:, 0], fs)):>10} "
+              f"{len(pan_tompkins_peaks(filtered[:, 0], fs)):>12} {streamed:>10}")
+
+
+def bench_trend(args) -> None:
+    """Windowed HR trend cost on the beats of a long recording."""
+    fs = 220
+    n_samples = int(args.short_hours * 3600 * fs)
+    samples = np.concatenate(list(synthetic_blocks(n_samples)))
+    peaks = _multichannel_peaks(samples, fs)
+    print(f"synthetic {args.short_hours:g} h, {sum(map(len, peaks))} beats over {len(peaks)} sensors")
+    print(f"{'window s':>8} {'hop s':>6} {'windows':>8} {'ms':>8}")
+    for window, hop in ((10, 5), (30, 10), (60, 60), (5, 0.5), (2, 0.1)):
+        elapsed = time_call(hr_trend, peaks, n_samples, fs, window, hop, repeat=args.repeat)
+        n_windows = len(hr_trend(peaks, n_samples, fs, window, hop)['time'])
+        print(f"{window:>8g} {hop:>6g} {n_windows:>8} {elapsed * 1e3:>8.2f}")
+
+
+def bench_hrv(args) -> None:
+    """HRV metrics: per-recording loop against one batched pass, and windowed HRV."""
+    fs = 220
+    n_samples = int(args.short_hours * 3600 * fs)
+    samples = np.concatenate(list(synthetic_blocks(n_samples)))
+    times, rr = rr_series(_multichannel_peaks(samples, fs)[0], fs)
+
+    # Many recordings: slices of the long RR series of varying length
+    rng = np.random.default_rng(0)
+    cuts = np.sort(rng.choice(len(rr), size=min(200, len(rr) // 20), replace=False))
+    series = [(times[a:b], rr[a:b]) for a, b in zip(cuts[:-1], cuts[1:]) if b - a > 4]
+    loop = time_call(lambda: [hrv_metrics(t, r, spectrum='fft') for t, r in series], repeat=args.repeat)
+    batch = time_call(hrv_batch, series, repeat=args.repeat)
+    looped = [hrv_metrics(t, r, spectrum='fft') for t, r in series]
+    batched = hrv_batch(series)
+    # The batch spline runs across recording boundaries, so spectra differ slightly at the edges
+    with np.errstate(invalid='ignore', divide='ignore'):
+        difference = {key: np.nanmax(np.abs(np.array([m[key] for m in looped]) / batched[key] - 1))
+                      for key in HRV_FIELDS if key != 'beats'}
+    print(f"{len(series)} recordings: loop {loop * 1e3:.1f} ms, batch {batch * 1e3:.1f} ms "
+          f"({loop / batch:.1f}x); max relative difference: time domain "
+          f"{max(difference[key] for key in HRV_FIELDS[1:7]):.1e}, spectra "
+          f"{max(difference[key] for key in ('lf', 'hf', 'lf_hf')):.1e}")
+
+    for method in ('lomb', 'fft'):
+        elapsed = time_call(hrv_metrics, times, rr, method, repeat=args.repeat)
+        metrics = hrv_metrics(times, rr, method)
+        print(f"whole {args.short_hours:g} h ({len(rr)} intervals), {method:>4}: {elapsed * 1e3:7.1f} ms  "
+              f"LF {metrics['lf']:.0f} HF {metrics['hf']:.0f} ms^2")
+    print(f"{'window s':>8} {'hop s':>6} {'windows':>8} {'ms':>8}")
+    for window, hop in ((300, 60), (120, 30), (60, 10)):
+        elapsed = time_call(hrv_windows, times, rr, window, hop, repeat=args.repeat)
+        print(f"{window:>8} {hop:>6} {len(hrv_windows(times, rr, window, hop)['time']):>8} {elapsed * 1e3:>8.2f}")
+
+
+def _full_rate_respiration(samples: np.ndarray, fs: float = 220) -> List[float]:
+    """Breathing rate per channel filtered and detected at the full sample rate (no decimation)."""
+    x = np.asarray(samples, dtype=np.float64).T
+    x = (x - x.mean(axis=1, keepdims=True)) / x.std(axis=1, keepdims=True)
+    filtered = signal.sosfiltfilt(design_bandpass(fs, RESP_FILTER_ORDER, RESP_BAND), x, axis=-1)
+    rates = []
+    for channel in filtered:
+        breaths, _ = signal.find_peaks(channel, distance=MIN_BREATH_INTERVAL * fs, prominence=BREATH_PROMINENCE)
+        values = breaths_to_rate(breaths, fs)
+        rates.append(float(np.mean(values)) if values.size else 0.0)
+    return rates
+
+
+def bench_resp(args) -> None:
+    """Respiration: decimated pipeline against full-rate filtering, relative to the HR pass."""
+    fs = 220
+    recordings = {name: parse_samples(text) for name, text in load_recordings(args.files).items()}
+    for hours in (0.1, args.short_hours):
+        recordings[f"synthetic {hours:g} h (15 breaths/min)"] = \
+            np.concatenate(list(synthetic_blocks(int(hours * 3600 * fs))))
+
+    print(f"{'recording':<48} {'samples':>9} {'HR ms':>8} {'full ms':>8} {'resp ms':>8} {'of HR':>6}  breaths/min")
+    for name, samples in recordings.items():
+        samples = samples[500:-500]
+        repeat = args.repeat if len(samples) < 1_000_000 else 1
+        hr = time_call(_multichannel_peaks, samples, fs, repeat=repeat)
+        full = time_call(_full_rate_respiration, samples, fs, repeat=repeat)
+        fast = time_call(respiration_rate, samples, fs, repeat=repeat)
+        rates = respiration_rate(samples, fs)['rate']
+        print(f"{name[:48]:<48} {len(samples):>9} {hr * 1e3:>8.1f} {full * 1e3:>8.1f} {fast * 1e3:>8.1f} "
+              f"{fast / hr:>5.0%}  {' '.join(f'{rate:5.1f}' for rate in rates)}"
+              f"  (full rate: {' '.join(f'{rate:5.1f}' for rate in _full_rate_respiration(samples, fs))})")
+
+
+def _write_recording(path: str, samples: np.ndarray, fs: float = 220) -> None:
+    """Write samples as a binary recording."""
+    with open(path, 'wb') as f:
+        f.write(pack_header(samples.shape[1], fs, len(samples), "synthetic"))
+        f.write(np.clip(samples, -32768, 32767).astype(SAMPLE_DTYPE).tobytes())
+
+
+def bench_sqi(args) -> None:
+    """Signal quality masking: cost of the window scores and HR on a recording with artefacts."""
+    fs = 220
+    long_samples = np.concatenate(list(synthetic_blocks(int(args.short_hours * 3600 * fs))))
+    scoring = time_call(window_quality, long_samples, fs, repeat=args.repeat)
+    hr_pass = time_call(_multichannel_peaks, long_samples, fs, repeat=args.repeat)
+    print(f"synthetic {args.short_hours:g} h: window scores {scoring * 1e3:.1f} ms, "
+          f"filter + peaks {hr_pass * 1e3:.1f} ms ({scoring / hr_pass:.0%})")
+
+    # 10 minutes at 75 BPM (91.25 on the BPM_SCALE clock): sensor 1 disconnects
+    # for a minute, sensor 2 has motion bursts, sensor 3 is clean
+    n = 600 * fs
+    clean = np.concatenate(list(synthetic_blocks(n))).astype(np.float64)
+    rng = np.random.default_rng(1)
+    damaged = clean.copy()
+    damaged[120 * fs:180 * fs, 0] = damaged[120 * fs, 0]
+    for start in rng.choice(np.arange(30, 570, 10), size=12, replace=False):
+        damaged[start * fs:(start + 4) * fs, 1] += 600 * rng.standard_normal(4 * fs)
+    dead = damaged.copy()
+    dead[:, 2] = 3000 + 2000 * rng.standard_normal(n)   # sensor 3 replaced by noise
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'recording':<22} {'mask':>5} {'ms':>7} {'masked windows':>15}  avg HR per sensor (beats)")
+        for name, samples in (('clean', clean), ('artefacts', damaged), ('artefacts, 3 noise', dead)):
+            path = os.path.join(tmp, name.replace(' ', '_').replace(',', '') + BINARY_EXTENSION)
+            _write_recording(path, samples, fs)
+            for mask in (False, True):
+                with contextlib.redirect_stdout(None):
+                    elapsed = time_call(analyze_ecg_file, path, mask_bad_windows=mask, repeat=args.repeat)
+                    results = analyze_ecg_file(path, mask_bad_windows=mask)
+                masked = ' '.join(str(count) for count in (~results['sqi']['good']).sum(axis=0))
+                sensors = '  '.join(f"{hr['avg']:6.2f} ({len(p)})" for hr, p in zip(results['hr_results'], results['peaks']))
+                print(f"{name:<22} {str(mask):>5} {elapsed * 1e3:>7.1f} {masked:>15}  {sensors}")
+
+
+def bench_select(args) -> None:
+    """Best-channel fast mode: batch throughput and HR against analyzing every sensor."""
+    fs = 220
+    long_samples = np.concatenate(list(synthetic_blocks(int(args.short_hours * 3600 * fs))))
+    ranking = time_call(channel_scores, long_samples, fs, repeat=args.repeat)
+    hr_pass = time_call(_multichannel_peaks, long_samples, fs, repeat=args.repeat)
+    print(f"synthetic {args.short_hours:g} h: channel ranking {ranking * 1e3:.1f} ms, "
+          f"filter + peaks {hr_pass * 1e3:.1f} ms ({ranking / hr_pass:.0%})")
+
+    # Recordings where one randomly placed sensor is clean and the others carry
+    # noise of random strength, mild enough to pass the signal quality checks
+    rng = np.random.default_rng(0)
+    n_files, n = 40, 120 * fs
+    with tempfile.TemporaryDirectory() as tmp:
+        paths, clean_sensor = [], []
+        for k in range(n_files):
+            samples = np.concatenate(list(synthetic_blocks(n, seed=k))).astype(np.float64)
+            best = int(rng.integers(3))
+            for c in range(3):
+                if c != best:
+                    samples[:, c] += rng.uniform(10, 40) * rng.standard_normal(n)
+            path = os.path.join(tmp, f"rec{k:03d}{BINARY_EXTENSION}")
+            _write_recording(path, samples, fs)
+            paths.append(path)
+            clean_sensor.append(best + 1)
+
+        print(f"{n_files} recordings of {n // fs} s, true HR 91.6 BPM (BPM_SCALE clock)")
+        print(f"{'sensors':<10} {'files/s':>8} {'speedup':>8} {'mean |HR error|':>16} {'picked clean':>13}")
+        baseline = None
+        for top in (None, 2, 1):
+            start = time.perf_counter()
+            rows = list(analyze_batch(paths, workers=1, top_channels=top))
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            error = np.mean([abs(row['combined_avg'] - 91.6) for row in rows])
+            picked = np.mean([str(sensor) in row['channels'].split() for row, sensor in zip(rows, clean_sensor)])
+            print(f"{'all' if top is None else f'best {top}':<10} {n_files / elapsed:>8.1f} "
+                  f"{baseline / elapsed:>7.2f}x {error:>16.2f} {picked:>13.0%}")
+
+
+def _pooled_hr(peaks: List[np.ndarray], fs: float = 220) -> float:
+    """Previous combined HR: mean of every sensor's beat-to-beat values pooled."""
+    return float(np.mean(np.concatenate([peaks_to_bpm(p, fs) for p in peaks])))
+
+
+def _fused_hr(peaks: List[np.ndarray], fs: float = 220) -> float:
+    fusion = fuse_beats(peaks, fs)
+    bpm = fuse_values(fusion, [beat_bpm(p, fs) for p in peaks])
+    weight = beat_weights(fusion)
+    known = ~np.isnan(bpm) & (weight > 0)
+    return float(np.average(bpm[known], weights=weight[known]))
+
+
+def bench_fuse(args) -> None:
+    """Beat-level fusion cost, and combined HR against pooling when one sensor misdetects."""
+    fs = 220
+    n_samples = int(args.short_hours * 3600 * fs)
+    samples = np.concatenate(list(synthetic_blocks(n_samples)))
+    peaks = [p.astype(np.int64) for p in _multichannel_peaks(samples, fs)]
+    reference = float(np.mean(peaks_to_bpm(peaks[0], fs)))
+    pooled = time_call(_pooled_hr, peaks, fs, repeat=args.repeat)
+    fused = time_call(_fused_hr, peaks, fs, repeat=args.repeat)
+    fusion = fuse_beats(peaks, fs)
+    print(f"synthetic {args.short_hours:g} h, {sum(map(len, peaks))} beats over {len(peaks)} sensors "
+          f"-> {len(fusion['beats'])} consensus beats, {np.mean(fusion['confidence'] == 1):.1%} on all sensors")
+    print(f"pooled {pooled * 1e3:.2f} ms, fused {fused * 1e3:.2f} ms")
+
+    # Sensor 3 drops and adds a share of beats; sensor 1 alone is the reference
+    rng = np.random.default_rng(0)
+    print(f"reference HR {reference:.2f} BPM")
+    print(f"{'damaged':>8} {'pooled BPM':>11} {'fused BPM':>10} {'pooled err':>11} {'fused err':>10}")
+    for share in (0.0, 0.05, 0.1, 0.2):
+        damaged = peaks[2][rng.random(len(peaks[2])) >= share]
+        extra = rng.integers(0, n_samples, int(share * len(peaks[2])))
+        trains = peaks[:2] + [np.unique(np.concatenate([damaged, extra]))]
+        before, after = _pooled_hr(trains, fs), _fused_hr(trains, fs)
+        print(f"{share:>8.0%} {before:>11.2f} {after:>10.2f} {abs(before - reference):>11.2f} "
+              f"{abs(after - reference):>10.2f}")
+
+
+def bench_spectral(args) -> None:
+    """Spectral fast mode against beat-based analysis: batch throughput and HR agreement."""
+    fs = 220
+    n = int(args.short_hours * 3600 * fs)
+    samples = np.concatenate(list(synthetic_blocks(n)))
+    beats = time_call(_multichannel_peaks, samples, fs, repeat=args.repeat)
+    spectral = time_call(spectral_hr, samples, fs, repeat=args.repeat)
+    print(f"synthetic {args.short_hours:g} h: filter + peaks {beats * 1e3:.1f} ms, "
+          f"spectral {spectral * 1e3:.1f} ms ({beats / spectral:.1f}x)")
+
+    # A large batch of two minute recordings at random rates find_peaks can
+    # follow (beats at least 0.5 s apart), with noise of random strength
+    rng = np.random.default_rng(0)
+    n_files, n = 200, 120 * fs
+    with tempfile.TemporaryDirectory() as tmp:
+        paths, truth = [], []
+        for k in range(n_files):
+            bpm = rng.uniform(50, 110)
+            noisy = np.concatenate(list(synthetic_blocks(n, bpm=bpm, seed=k))).astype(np.float64)
+            noisy += rng.uniform(0, 40) * rng.standard_normal(noisy.shape)
+            path = os.path.join(tmp, f"rec{k:03d}{BINARY_EXTENSION}")
+            _write_recording(path, noisy, fs)
+            paths.append(path)
+            truth.append(bpm * BPM_SCALE / 60)
+
+        combined, baseline = {}, None
+        print(f"{n_files} recordings of {n // fs} s at 50-110 BPM ({BPM_SCALE} BPM scale)")
+        print(f"{'mode':<6} {'files/s':>8} {'speedup':>8} {'mean |HR error|':>16} {'within 5 BPM':>13}")
+        for mode in ('beats', 'fast'):
+            start = time.perf_counter()
+            rows = list(analyze_batch(paths, workers=1, mode=mode))
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            combined[mode] = np.array([row['combined_avg'] for row in rows])
+            error = np.abs(combined[mode] - truth)
+            print(f"{mode:<6} {n_files / elapsed:>8.1f} {baseline / elapsed:>7.2f}x "
+                  f"{error.mean():>16.2f} {np.mean(error < 5):>13.0%}")
+    difference = np.abs(combined['fast'] - combined['beats'])
+    print(f"fast vs. beats: median |difference| {np.median(difference):.2f} BPM, "
+          f"{np.mean(difference < 5):.0%} within 5 BPM")
+
+    # Agreement on the real recordings, whose sensors often disagree with each other
+    texts = load_recordings(args.files)
+    if texts:
+        print(f"{'recording':<45} {'beats':>7} {'fast':>7} {'confidence':>11}")
+    for name, text in texts.items():
+        recording = parse_samples(text)[500:-500]
+        if not len(recording):
+            continue
+        peaks = _multichannel_peaks(recording, fs)
+        beat_hr = np.mean(np.concatenate([peaks_to_bpm(p, fs) for p in peaks]))
+        estimate = spectral_hr(recording, fs)
+        print(f"{name[:45]:<45} {beat_hr:>7.1f} {estimate['combined']:>7.1f} "
+              f"{estimate['combined_confidence']:>11.2f}")
+
+
+def _peaks_drawn(index: np.ndarray, values: np.ndarray, peaks: np.ndarray, heights: np.ndarray,
+                 size: int) -> float:
+    """Share of peaks whose pixel column (size samples wide) reaches the peak height."""
+    column_max = np.full(peaks.max() // size + 1, -np.inf)
+    inside = index // size < len(column_max)
+    np.maximum.at(column_max, index[inside] // size, values[inside])
+    return float(np.mean(column_max[peaks // size] >= heights))
+
+
+def bench_chart(args) -> None:
+    """Chart payload: every sample against stride and min/max reduction, and R peaks drawn."""
+    fs = 220
+    n = int(args.short_hours * 3600 * fs)
+    samples = np.concatenate(list(synthetic_blocks(n)))
+    beats = _multichannel_peaks(samples, fs)[0]
+    # The raw R peak is the largest sample near each filtered beat
+    window = int(0.05 * fs)
+    beats = beats[(beats >= window) & (beats < n - window)]
+    around = beats[:, None] + np.arange(-window, window + 1)
+    r_peaks = around[np.arange(len(beats)), samples[around, 0].argmax(axis=1)]
+    heights = samples[r_peaks, 0]
+
+    full = time_call(lambda: json.dumps(samples.tolist()), repeat=1)
+    full_bytes = len(json.dumps(samples[:fs * 60].tolist())) * n / (fs * 60)
+    print(f"synthetic {args.short_hours:g} h, {len(r_peaks)} R peaks on sensor 1; "
+          f"every sample: {full_bytes / 1e6:.1f} MB JSON, {full * 1e3:.0f} ms")
+    print(f"{'width':>6} {'method':<8} {'points':>7} {'KB':>7} {'ms':>7} {'R peaks drawn':>14}")
+    for width in (800, 1500, 3000):
+        size = -(-n // width)
+        strided = np.arange(0, n, -(-n // (2 * width)))
+        index, values = minmax_downsample(samples, width)
+        for method, points, reduce in (
+                ('stride', strided, lambda: samples[strided].tolist()),
+                ('min/max', index, lambda: minmax_downsample(samples, width)[1].tolist())):
+            elapsed = time_call(reduce, repeat=args.repeat)
+            reduced = samples[points] if method == 'stride' else values
+            drawn = _peaks_drawn(points, reduced[:, 0], r_peaks, heights, size)
+            print(f"{width:>6} {method:<8} {len(points):>7} {len(json.dumps(reduced.tolist())) / 1e3:>7.0f} "
+                  f"{elapsed * 1e3:>7.2f} {drawn:>14.1%}")
+
+
+def bench_tiles(args) -> None:
+    """Viewport queries on a long recording: raw min/max reduction against the pyramid."""
+    fs = 220
+    n = int(args.hours * 3600 * fs)
+    samples = np.concatenate(list(synthetic_blocks(n)))
+    width = 1500
+    start = time.perf_counter()
+    pyramid = build_pyramid(samples)
+    built = time.perf_counter() - start
+    stored = sum(level[key].nbytes for level in pyramid['levels'] for key in ('low', 'high', 'low_first'))
+    print(f"synthetic {args.hours:g} h: pyramid of {len(pyramid['levels'])} levels built in "
+          f"{built * 1e3:.0f} ms, {stored / 1e6:.1f} MB")
+    print(f"{'visible':>9} {'raw ms':>8} {'pyramid ms':>11} {'points':>7}")
+    rng = np.random.default_rng(0)
+    for seconds in (10, 60, 600, 3600, 6 * 3600, n / fs):
+        span = min(int(seconds * fs), n)
+        first = int(rng.integers(0, n - span + 1))
+        raw = time_call(minmax_downsample, samples, width, first, first + span, repeat=args.repeat)
+        tiled = time_call(pyramid_range, pyramid, samples, width, first, first + span, repeat=args.repeat)
+        points = len(pyramid_range(pyramid, samples, width, first, first + span)[0])
+        print(f"{seconds:>8g}s {raw * 1e3:>8.2f} {tiled * 1e3:>11.2f} {points:>7}")
+
+
+def bench_transport(args) -> None:
+    """Chart and stream payloads: JSON number lists against binary frames and base64 blocks."""
+    fs = 220
+    n = int(args.short_hours * 3600 * fs)
+    samples = np.concatenate(list(synthetic_blocks(n)))
+    index, envelope = minmax_downsample(samples, 1500)
+
+    def as_json(index, values):
+        return json.dumps({**{f'sensor{i + 1}': values[:, i].tolist() for i in range(values.shape[1])},
+                           'labels': index.tolist()})
+
+    def as_frame(index, values):
+        values = compact_samples(values)
+        return pack_frame({}, {'index': index.astype(np.uint32),
+                               **{f'sensor{i + 1}': values[:, i] for i in range(values.shape[1])}})
+
+    print(f"synthetic {args.short_hours:g} h")
+    print(f"{'payload':<22} {'JSON KB':>8} {'binary KB':>10} {'encode ms':>16} {'decode ms':>16}")
+    for label, points, values in (('chart 1500 px', index, envelope),
+                                  ('export (all samples)', np.arange(n), samples)):
+        text, frame = as_json(points, values), as_frame(points, values)
+        encode = (time_call(as_json, points, values, repeat=args.repeat),
+                  time_call(as_frame, points, values, repeat=args.repeat))
+        decode = (time_call(json.loads, text, repeat=args.repeat),
+                  time_call(unpack_frame, frame, repeat=args.repeat))
+        print(f"{label:<22} {len(text) / 1e3:>8.0f} {len(frame) / 1e3:>10.0f} "
+              f"{encode[0] * 1e3:>7.1f} / {encode[1] * 1e3:<6.2f} {decode[0] * 1e3:>7.1f} / {decode[1] * 1e3:<6.2f}")
+
+    # One second of live samples: an event per sample against one base64 block
+    second = samples[:fs]
+    events = ''.join(f"data: {json.dumps({'type': 'data', 'values': values})}\n\n" for values in second.tolist())
+    block = f"data: {json.dumps({'type': 'block', 'start': 0, **encode_block(second)})}\n\n"
+    print(f"live stream, 1 s: {len(events)} B in {fs} JSON events, {len(block)} B in one base64 block")
+
+
+def bench_render(args) -> None:
+    """Static plot rendering: every sample through pyplot against pre-decimated templates."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from io import BytesIO
+
+    fs = 220
+    hr = {'avg': 72.0, 'min': 60.0, 'max': 90.0}
+
+    def every_sample(samples):
+        fig, axes = plt.subplots(3, 1, figsize=(16, 10), sharex=True)
+        for ax, column in zip(axes, samples.T):
+            ax.plot(column, linewidth=0.9)
+        plt.tight_layout()
+        fig.savefig(BytesIO(), format='png', dpi=100)
+        plt.close(fig)
+
+    print(f"{'length':>7} {'every sample':>13} " + ' '.join(f"{size:>10}" for size in PLOT_SIZES) + "   (ms)")
+    for minutes in (1, 60):
+        samples = np.concatenate(list(synthetic_blocks(int(minutes * 60 * fs))))
+        full = time_call(every_sample, samples, repeat=1)
+        sized = [time_call(render_ecg_png, samples, [hr] * 3, hr, fs, size, repeat=args.repeat)
+                 for size in PLOT_SIZES]
+        print(f"{minutes:>5} m {full * 1e3:>13.0f} " + ' '.join(f"{t * 1e3:>10.1f}" for t in sized))
+
+
+BENCHMARKS = {
+    'parse': (bench_parse, "Recording text parser"),
+    'stream': (bench_stream, "Streaming analysis memory"),
+    'compress': (bench_compress, "Compressed storage codec"),
+    'decode': (bench_decode, "BLE notification decoder"),
+    'fetch': (bench_fetch, "Remote recording fetch"),
+    'batch': (bench_batch, "Parallel batch analysis"),
+    'filter': (bench_filter, "Multichannel band-pass filtering"),
+    'live': (bench_live, "Live heart rate during collection"),
+    'detect': (bench_detect, "Beat detector comparison"),
+    'trend': (bench_trend, "Sliding-window HR trend"),
+    'hrv': (bench_hrv, "HRV metrics"),
+    'resp': (bench_resp, "Respiration rate"),
+    'sqi': (bench_sqi, "Signal quality masking"),
+    'select': (bench_select, "Best-channel fast mode"),
+    'fuse': (bench_fuse, "Beat-level sensor fusion"),
+    'spectral': (bench_spectral, "Spectral HR fast mode"),
+    'chart': (bench_chart, "Chart downsampling"),
+    'tiles': (bench_tiles, "Chart viewport pyramid"),
+    'transport': (bench_transport, "Binary chart transport"),
+    'render': (bench_render, "Static plot rendering"),
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="nPulse pipeline benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS), help="Benchmark to run")
+    parser.add_argument("--files", default=DEFAULT_RECORDINGS, help="Glob of recordings to use")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per timing (best is kept)")
+    parser.add_argument("--tile", type=int, default=120, help="Copies of a recording in synthetic long inputs")
+    parser.add_argument("--hours", type=float, default=24, help="Length of synthetic long recordings")
+    parser.add_argument("--short-hours", type=float, default=1, help="Length of synthetic batch-comparable recordings")
+    args = parser.parse_args(argv)
+
+    func, title = BENCHMARKS[args.benchmark]
+    print(f"== {title} ==")
+    func(args)
+
+
+if __name__ == "__main__":
+    main()
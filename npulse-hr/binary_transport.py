@@ -0,0 +1,137 @@
+"""
+Binary Transport
+Typed-array frames for sending sample arrays to the browser.
+
+JSON writes every sample as decimal text, about three times the bytes of the
+samples themselves, and both ends spend their time formatting and parsing
+numbers. A frame instead carries the arrays as raw little-endian buffers
+behind a small JSON header:
+
+    uint32 header length | JSON header | padding | array | padding | array ...
+
+The arrays start at the first multiple of FRAME_ALIGNMENT bytes after the
+header and each is padded to one, so the browser views them in place as an
+Int16Array, Uint32Array or Float32Array without copying. The header holds
+the scalar fields of the response plus 'arrays': the name, typed array
+type, byte offset (from the start of the arrays) and length of each.
+
+Inside Server-Sent Events, which only carry text, the same buffers are sent
+base64 encoded.
+"""
+
+import base64
+import json
+import struct
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+# MIME type of a frame, for content negotiation
+FRAME_MIMETYPE = 'application/octet-stream'
+
+# Byte boundary every array starts on (the largest element size)
+FRAME_ALIGNMENT = 8
+
+# Little-endian NumPy dtypes and the browser typed array viewing them
+TYPED_ARRAYS = {
+    '<i2': 'Int16Array',
+    '<i4': 'Int32Array',
+    '<u4': 'Uint32Array',
+    '<f4': 'Float32Array',
+    '<f8': 'Float64Array',
+}
+
+
+def compact_samples(values: np.ndarray) -> np.ndarray:
+    """
+    Samples as int16 when they fit, otherwise as float32.
+
+    Recordings stored in the binary formats are int16 already; text
+    recordings may hold larger integers, which float32 keeps exact up to 2**24.
+    """
+    values = np.asarray(values)
+    info = np.iinfo(np.int16)
+    if values.dtype.kind in 'iu' and (not values.size or (values.min() >= info.min and values.max() <= info.max)):
+        return values.astype('<i2', copy=False)
+    return values.astype('<f4', copy=False)
+
+
+def _padding(length: int) -> int:
+    """Bytes from length up to the next multiple of FRAME_ALIGNMENT."""
+    return -length % FRAME_ALIGNMENT
+
+
+def pack_frame(header: Dict, arrays: Dict[str, np.ndarray]) -> bytes:
+    """
+    Pack a JSON header and one-dimensional arrays into a frame.
+
+    Args:
+        header: JSON-serializable fields of the response
+        arrays: Arrays by name; their dtypes must be in TYPED_ARRAYS once
+            made little-endian
+
+    Returns:
+        Frame bytes
+    """
+    buffers = []
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values).ravel()
+        values = values.astype(values.dtype.newbyteorder('<'), copy=False)
+        if values.dtype.str not in TYPED_ARRAYS:
+            raise ValueError(f"array {name} has unsupported dtype {values.dtype}")
+        buffers.append((name, values))
+
+    layout, offset = [], 0
+    for name, values in buffers:
+        layout.append({'name': name, 'type': TYPED_ARRAYS[values.dtype.str],
+                       'offset': offset, 'length': len(values)})
+        offset += values.nbytes + _padding(values.nbytes)
+    text = json.dumps({**header, 'arrays': layout}).encode()
+    data_start = 4 + len(text) + _padding(4 + len(text))
+
+    frame = bytearray(data_start + offset)
+    frame[:4] = struct.pack('<I', len(text))
+    frame[4:4 + len(text)] = text
+    for entry, (_, values) in zip(layout, buffers):
+        position = data_start + entry['offset']
+        frame[position:position + values.nbytes] = values.tobytes()
+    return bytes(frame)
+
+
+def unpack_frame(frame: bytes) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """
+    Header and arrays of a frame (the inverse of pack_frame).
+
+    Returns:
+        Tuple of (header without 'arrays', arrays by name)
+    """
+    (length,) = struct.unpack_from('<I', frame)
+    header = json.loads(frame[4:4 + length])
+    data_start = 4 + length + _padding(4 + length)
+    dtypes = {name: dtype for dtype, name in TYPED_ARRAYS.items()}
+    arrays = {}
+    for entry in header.pop('arrays'):
+        arrays[entry['name']] = np.frombuffer(frame, dtype=dtypes[entry['type']],
+                                              count=entry['length'], offset=data_start + entry['offset'])
+    return header, arrays
+
+
+def encode_block(values: np.ndarray) -> Dict:
+    """
+    Base64 field of a block of samples for a text event.
+
+    Args:
+        values: Samples of shape (n, channels)
+
+    Returns:
+        Dictionary with 'count', 'channels', 'array' (typed array viewing the
+        decoded bytes, row-major) and 'values' (base64)
+    """
+    values = compact_samples(values)
+    return {
+        'count': values.shape[0],
+        'channels': values.shape[1] if values.ndim > 1 else 1,
+        'array': TYPED_ARRAYS[values.dtype.str],
+        'values': base64.b64encode(np.ascontiguousarray(values).tobytes()).decode('ascii'),
+    }
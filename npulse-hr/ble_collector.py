@@ -8,6 +8,7 @@ import asyncio
 import sys
 from datetime import datetime
 from ble_handler import BLEHandler
+from recording_writer import recover_partial_recordings
 
 
 async def main():
@@ -15,6 +16,7 @@ async def main():
     print("nPulse BLE Data Collector")
     print("="*50)
     
+    recover_partial_recordings("files")
     handler = BLEHandler()
     
     # Scan for devices
@@ -69,16 +71,19 @@ async def main():
     
     sample_count = [0]
     
-    def on_data(line):
-        sample_count[0] += 1
-        if sample_count[0] % 100 == 0:
-            print(f"   Samples: {sample_count[0]}", end='\r')
+    def on_data(block):
+        previous = sample_count[0]
+        sample_count[0] += len(block)
+        if sample_count[0] // 100 > previous // 100:
+            bpm = handler.live_hr.bpm
+            print(f"   Samples: {sample_count[0]}   HR: {f'{bpm:.0f} BPM' if bpm else '--'}   ", end='\r')
     
     try:
         await handler.start_data_collection(
             duration_seconds=duration,
             command="1",
-            data_callback=on_data
+            data_callback=on_data,
+            record_format="npc"
         )
     except KeyboardInterrupt:
         handler.cancel_collection()
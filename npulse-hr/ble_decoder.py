@@ -0,0 +1,142 @@
+"""
+BLE Sample Decoder
+Incremental byte-level decoder for the nPulse notification stream.
+
+The device streams ASCII lines of comma-separated sensor values, split
+arbitrarily across BLE notifications. SampleDecoder keeps the trailing partial
+line in a bytearray and converts every complete line of a notification in a
+single NumPy call, writing the values straight into preallocated integer
+storage. No str objects are created per sample or per line.
+
+Notifications carry only a handful of lines, so the per-call overhead of the
+fully vectorized parser would dominate; well-formed payloads are therefore
+read with np.fromstring after turning line breaks into separators, and only
+payloads with a malformed line (checked by counting the separators on each
+line) fall back to parse_samples. With the default
+23-byte ATT MTU a notification holds about one sample; min_batch_bytes lets
+the decoder gather a few notifications per conversion at the cost of a little
+latency.
+"""
+
+from typing import Optional, Union
+
+import numpy as np
+
+from ecg_processor import parse_samples
+
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+_LINES_TO_FIELDS = bytes.maketrans(b'\n', b',')
+_NEWLINE = ord('\n')
+_COMMA = ord(',')
+
+
+class SampleDecoder:
+    """
+    Turn a stream of notification payloads into rows of integer samples.
+
+    Rows with a zero in any channel are dropped, matching the device's use of
+    zero as a "no reading" marker.
+    """
+
+    def __init__(self, n_channels: int = 3, capacity: int = 256, drop_zero: bool = True,
+                 min_batch_bytes: int = 0):
+        self.n_channels = n_channels
+        self.drop_zero = drop_zero
+        self.min_batch_bytes = min_batch_bytes
+        self.samples_decoded = 0
+        self._pending = bytearray()
+        self._scratch = np.empty((capacity, n_channels), dtype=np.int32)
+
+    def reset(self) -> None:
+        """Forget any partial line and the decoded-sample count."""
+        self._pending.clear()
+        self.samples_decoded = 0
+
+    def max_rows(self, n_bytes: int) -> int:
+        """Upper bound on the rows the next feed of n_bytes can produce."""
+        # The shortest valid line is one digit per channel plus separators
+        return (len(self._pending) + n_bytes) // (2 * self.n_channels) + 1
+
+    def _well_formed(self, lines: bytes, n_lines: int) -> bool:
+        """Whether each of the n_lines lines has exactly n_channels - 1 separators."""
+        raw = np.frombuffer(lines, dtype=np.uint8)
+        separators = raw[(raw == _COMMA) | (raw == _NEWLINE)]
+        # Every n_channels-th separator must be the line break
+        return len(separators) == n_lines * self.n_channels \
+            and bool((separators[self.n_channels - 1::self.n_channels] == _NEWLINE).all())
+
+    def _complete_lines(self, data: BytesLike, force: bool = False) -> Optional[np.ndarray]:
+        """Append data and parse every complete line now buffered."""
+        pending = self._pending
+        pending += data
+        if len(pending) < self.min_batch_bytes and not force:
+            return None
+        cut = pending.rfind(b'\n')
+        if cut < 0:
+            return None
+        with memoryview(pending) as view:
+            lines = bytes(view[:cut + 1])
+        del pending[:cut + 1]
+
+        try:
+            values = np.fromstring(lines.translate(_LINES_TO_FIELDS), dtype=np.int32, sep=',')
+        except ValueError:
+            values = None
+        n_lines = lines.count(b'\n')
+        if values is not None and values.size == n_lines * self.n_channels and self._well_formed(lines, n_lines):
+            rows = values.reshape(-1, self.n_channels)
+        else:
+            rows = parse_samples(lines, self.n_channels)
+        if self.drop_zero and not rows.all():
+            rows = rows[rows.all(axis=1)]
+        return rows
+
+    def feed_into(self, data: BytesLike, out: np.ndarray, start: int = 0, force: bool = False) -> int:
+        """
+        Decode a notification directly into caller-owned storage.
+
+        Args:
+            data: Raw notification payload
+            out: Preallocated (capacity, n_channels) array to write into
+            start: First row of out to write
+            force: Convert buffered complete lines even below min_batch_bytes
+
+        Returns:
+            Number of rows written; raises ValueError if out is too small
+        """
+        rows = self._complete_lines(data, force)
+        if rows is None or not len(rows):
+            return 0
+        if start + len(rows) > len(out):
+            raise ValueError("output storage is full")
+        out[start:start + len(rows)] = rows
+        self.samples_decoded += len(rows)
+        return len(rows)
+
+    def flush_into(self, out: np.ndarray, start: int = 0) -> int:
+        """Write any complete lines still held back by min_batch_bytes."""
+        return self.feed_into(b'', out, start, force=True)
+
+    def feed(self, data: BytesLike, force: bool = False) -> np.ndarray:
+        """
+        Decode a notification into the decoder's own scratch storage.
+
+        Args:
+            data: Raw notification payload
+            force: Convert buffered complete lines even below min_batch_bytes
+
+        Returns:
+            View of the newly decoded (k, n_channels) rows; it is overwritten
+            by the next call, so copy it if it must outlive that
+        """
+        rows = self._complete_lines(data, force)
+        if rows is None or not len(rows):
+            return self._scratch[:0]
+        if len(rows) > len(self._scratch):
+            self._scratch = np.empty((max(len(rows), 2 * len(self._scratch)), self.n_channels),
+                                     dtype=np.int32)
+        self._scratch[:len(rows)] = rows
+        self.samples_decoded += len(rows)
+        return self._scratch[:len(rows)]
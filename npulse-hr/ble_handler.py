@@ -6,12 +6,22 @@ Uses a persistent event loop for proper async handling in Flask.
 """
 
 import asyncio
+import os
 import threading
+import time
 from datetime import datetime
 from typing import Callable, Optional, List
+
+import numpy as np
 from bleak import BleakClient, BleakScanner
 from bleak.backends.device import BLEDevice
 
+from ble_decoder import SampleDecoder
+from live_hr import LiveHeartRate
+from recording_format import BINARY_EXTENSION, COMPRESSED_EXTENSION, write_compressed_recording, write_recording
+from recording_writer import RecordingWriter
+from sample_store import SampleStore
+
 
 # Nordic UART Service UUIDs
 NORDIC_UART_SERVICE_UUID = "6e400001-b5a3-f393-e0a9-e50e24dcca9e"
@@ -25,6 +35,21 @@ BATTERY_CHAR_UUID = "00002a19-0000-1000-8000-00805f9b34fb"
 # Device names to scan for
 DEVICE_NAMES = ["nPulse001", "nPulse", "NADI_PULSE", "IMU_DUAL_CHAR"]
 
+# File extension for each recording format accepted by save_to_file
+FORMAT_EXTENSIONS = {'npc': COMPRESSED_EXTENSION, 'npb': BINARY_EXTENSION, 'txt': ".txt"}
+
+# Nominal device sampling rate in Hz
+NOMINAL_SAMPLE_RATE = 220
+
+# Sample storage for live readers: starts at one minute and grows up to one
+# hour, after which the oldest samples are overwritten (recordings made with
+# record_format stream to disk and keep everything)
+INITIAL_CAPACITY = NOMINAL_SAMPLE_RATE * 60
+MAX_CAPACITY = NOMINAL_SAMPLE_RATE * 3600
+
+# Bytes gathered before decoding (~20 samples, under 0.1 s at 220 Hz)
+BLE_BATCH_BYTES = 256
+
 
 class BLEHandler:
     """
@@ -38,18 +63,32 @@ class BLEHandler:
         self.discovered_devices: List[BLEDevice] = []
         self.is_connected: bool = False
         self.is_collecting: bool = False
-        self.collected_data: List[str] = []
-        self.sample_count: int = 0
         self.battery_level: int = 0
         self._collection_cancelled: bool = False
-        self._data_callback: Optional[Callable[[str], None]] = None
-        self._buffer: str = ""
+        self._data_callback: Optional[Callable[[np.ndarray], None]] = None
+        self._decoder = SampleDecoder(min_batch_bytes=BLE_BATCH_BYTES)
+        self.store = SampleStore(INITIAL_CAPACITY, MAX_CAPACITY)
+        self.live_hr = LiveHeartRate(NOMINAL_SAMPLE_RATE)
+        self._collection_start: Optional[datetime] = None
+        self._collection_end: Optional[datetime] = None
+        self._writer: Optional[RecordingWriter] = None
+        self.recorded_path: Optional[str] = None
         
         # Persistent event loop in background thread
         self._loop: Optional[asyncio.AbstractEventLoop] = None
         self._thread: Optional[threading.Thread] = None
         self._start_loop()
     
+    @property
+    def sample_count(self) -> int:
+        """Samples received in the current/last collection."""
+        return self.store.total
+    
+    @property
+    def collected_data(self) -> np.ndarray:
+        """Samples of the current/last collection still held in the store, oldest first."""
+        return self.store.view()
+    
     def _start_loop(self):
         """Start the background event loop thread."""
         def run_loop():
@@ -172,35 +211,21 @@ class BLEHandler:
             print(f"Could not read battery: {e}")
             return 0
     
+    def _decode(self, data: bytes, force: bool = False):
+        """Decode notification bytes into the sample store and live HR, then notify the callback."""
+        rows = self._decoder.feed(data, force)
+        if len(rows):
+            self.store.append(rows, time.time())
+            self.live_hr.push(rows)
+            if self._writer:
+                self._writer.write(rows)
+            if self._data_callback:
+                self._data_callback(rows)
+    
     def _notification_handler(self, sender, data: bytearray):
         """Handle incoming BLE notifications."""
         try:
-            decoded = data.decode('utf-8')
-            self._buffer += decoded
-            
-            # Split by newlines
-            lines = self._buffer.split('\n')
-            self._buffer = lines[-1]  # Keep partial line
-            
-            for line in lines[:-1]:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                parts = line.split(',')
-                if len(parts) >= 3:
-                    try:
-                        values = [int(p.strip()) for p in parts[:3]]
-                        # Skip samples with zero values
-                        if 0 not in values:
-                            self.collected_data.append(line)
-                            self.sample_count += 1
-                            
-                            if self._data_callback:
-                                self._data_callback(line)
-                    except ValueError:
-                        pass
-                        
+            self._decode(data)
         except Exception as e:
             print(f"Notification handler error: {e}")
     
@@ -208,29 +233,46 @@ class BLEHandler:
         self,
         duration_seconds: int = 60,
         command: str = "1",
-        data_callback: Optional[Callable[[str], None]] = None
-    ) -> List[str]:
-        """Start collecting data from the device."""
+        data_callback: Optional[Callable[[np.ndarray], None]] = None,
+        record_format: Optional[str] = None
+    ) -> np.ndarray:
+        """
+        Start collecting data from the device.
+        
+        With record_format ('npc', 'npb' or 'txt') samples are also written to
+        disk while they arrive; the finished file is left in recorded_path.
+        """
         return self._run_async(
-            self._start_data_collection_async(duration_seconds, command, data_callback)
+            self._start_data_collection_async(duration_seconds, command, data_callback, record_format)
         )
     
     async def _start_data_collection_async(
         self,
         duration_seconds: int = 60,
         command: str = "6",
-        data_callback: Optional[Callable[[str], None]] = None
-    ) -> List[str]:
+        data_callback: Optional[Callable[[np.ndarray], None]] = None,
+        record_format: Optional[str] = None
+    ) -> np.ndarray:
         """Async implementation of data collection."""
         if not self.client or not self.is_connected:
             raise Exception("Device not connected")
         
-        self.collected_data.clear()
-        self.sample_count = 0
-        self._buffer = ""
+        self.store.clear()
+        self._decoder.reset()
+        self.live_hr.reset()
         self._collection_cancelled = False
         self.is_collecting = True
         self._data_callback = data_callback
+        self._collection_start = datetime.now()
+        self._collection_end = None
+        self.recorded_path = None
+        if record_format:
+            self._writer = RecordingWriter(
+                self._default_path(record_format),
+                sample_rate=NOMINAL_SAMPLE_RATE,
+                device_name=self.connected_device.name if self.connected_device else "",
+                start_time=self._collection_start
+            )
         
         try:
             # Start notifications
@@ -253,6 +295,7 @@ class BLEHandler:
                 await self.client.stop_notify(NORDIC_UART_TX_CHAR_UUID)
             except:
                 pass
+            self._decode(b"", force=True)
             
             print(f"Collection complete. {self.sample_count} samples collected.")
             return self.collected_data
@@ -263,26 +306,69 @@ class BLEHandler:
         finally:
             self.is_collecting = False
             self._data_callback = None
+            self._collection_end = datetime.now()
+            if self._writer:
+                writer, self._writer = self._writer, None
+                self.recorded_path = writer.close(self.measured_sampling_rate())
+                if self.recorded_path and not self.sample_count:
+                    os.remove(self.recorded_path)
+                    self.recorded_path = None
+                elif self.recorded_path:
+                    print(f"Recording written to {self.recorded_path}")
     
     def cancel_collection(self):
         """Cancel ongoing data collection."""
         self._collection_cancelled = True
         self.is_collecting = False
     
-    def save_to_file(self, filepath: Optional[str] = None) -> str:
-        """Save collected data to a file."""
-        if not self.collected_data:
+    def measured_sampling_rate(self) -> float:
+        """Average sampling rate of the last collection in Hz."""
+        if not self._collection_start:
+            return 0.0
+        end = self._collection_end or datetime.now()
+        elapsed = (end - self._collection_start).total_seconds()
+        return self.sample_count / elapsed if elapsed > 0 else 0.0
+    
+    @staticmethod
+    def _default_path(fmt: str) -> str:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"files/nadi_data_{timestamp}{FORMAT_EXTENSIONS.get(fmt, '.txt')}"
+    
+    def save_to_file(self, filepath: Optional[str] = None, fmt: str = "npc") -> str:
+        """
+        Save collected data to a file.
+        
+        If the last collection was already recorded to disk in this format,
+        that file is returned instead of writing a second copy.
+        
+        Args:
+            filepath: Destination path (defaults to files/nadi_data_<timestamp>)
+            fmt: 'npc' (compressed, default), 'npb' (raw binary) or 'txt'
+        """
+        if not self.sample_count:
             raise Exception("No data to save")
+        if filepath is None and self.recorded_path and \
+                self.recorded_path.endswith(FORMAT_EXTENSIONS.get(fmt, ".txt")):
+            return self.recorded_path
+        if self.store.dropped:
+            print(f"Warning: sample store wrapped, the oldest {self.store.dropped} samples are not saved")
         
         if filepath is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filepath = f"files/nadi_data_{timestamp}.txt"
+            filepath = self._default_path(fmt)
         
-        import os
         os.makedirs(os.path.dirname(filepath) if os.path.dirname(filepath) else "files", exist_ok=True)
         
-        with open(filepath, 'w') as f:
-            f.write('\n'.join(self.collected_data))
+        if fmt == "txt":
+            np.savetxt(filepath, self.collected_data, fmt='%d', delimiter=',')
+        else:
+            writer = write_compressed_recording if fmt == "npc" else write_recording
+            writer(
+                filepath,
+                self.collected_data,
+                sample_rate=self.measured_sampling_rate(),
+                device_name=self.connected_device.name if self.connected_device else "",
+                start_time=self._collection_start
+            )
         
         print(f"Data saved to {filepath}")
         return filepath
@@ -296,6 +382,9 @@ class BLEHandler:
             "battery_level": self.battery_level,
             "is_collecting": self.is_collecting,
             "sample_count": self.sample_count,
+            "buffered_samples": len(self.store),
+            "buffer_bytes": self.store.nbytes,
+            "live_bpm": round(self.live_hr.bpm, 1),
             "discovered_devices": len(self.discovered_devices)
         }
 
@@ -0,0 +1,190 @@
+"""
+Chart Downsampling
+Reduce a recording to what a chart of a given pixel width can show.
+
+Taking every k-th sample aliases: a QRS complex only a few samples wide
+falls between the kept samples and disappears. Instead the requested range
+is cut into one bucket per pixel and each bucket is drawn by its minimum and
+its maximum, in the order they occur, so every peak and trough survives
+whatever the recording length. Buckets are reshaped views of the samples, so
+the reduction is one argmin and one argmax over the whole range.
+
+All channels share one time axis: a bucket's two points sit at its start and
+its middle, which moves each extreme by less than one bucket (one pixel).
+
+For zooming and panning, build_pyramid precomputes the envelope at bucket
+sizes PYRAMID_BASE, PYRAMID_BASE * PYRAMID_FACTOR, ... once per recording.
+A viewport is then served from the coarsest level that still has a bucket
+per pixel, merged down to the chart width, so its cost depends on the chart
+width, not on how much of the recording is visible; ranges narrower than
+PYRAMID_BASE samples per pixel are reduced from the raw samples.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+# Bucket size (samples) of the finest pyramid level and the size ratio between levels
+PYRAMID_BASE = 16
+PYRAMID_FACTOR = 4
+
+
+def _reduce_raw(x: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Min/max of consecutive buckets of size samples (the last may be shorter).
+
+    Returns:
+        Tuple of (low, high, low_first), each of shape (buckets, channels);
+        low_first tells whether the minimum comes before the maximum
+    """
+    n = len(x)
+    full = n // size
+    # Whole buckets are a reshaped view; the trailing partial one is reduced on its own
+    parts = [x[:full * size].reshape(full, size, x.shape[1])]
+    if full * size < n:
+        parts.append(x[full * size:][None])
+    lows, highs, orders = [], [], []
+    for buckets in parts:
+        lo = buckets.argmin(axis=1)
+        hi = buckets.argmax(axis=1)
+        lows.append(np.take_along_axis(buckets, lo[:, None], axis=1)[:, 0])
+        highs.append(np.take_along_axis(buckets, hi[:, None], axis=1)[:, 0])
+        orders.append(lo <= hi)
+    return np.concatenate(lows), np.concatenate(highs), np.concatenate(orders)
+
+
+def _merge(low: np.ndarray, high: np.ndarray, low_first: np.ndarray,
+           group: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Combine every group consecutive buckets (the last group may be shorter)."""
+    m = len(low)
+    full = m // group
+    spans = [(0, full * group, full)] if full else []
+    if full * group < m:
+        spans.append((full * group, m, 1))
+    lows, highs, orders = [], [], []
+    for a, b, count in spans:
+        shape = (count, (b - a) // count, low.shape[1])
+        child_low, child_high = low[a:b].reshape(shape), high[a:b].reshape(shape)
+        lo = child_low.argmin(axis=1)
+        hi = child_high.argmax(axis=1)
+        lows.append(np.take_along_axis(child_low, lo[:, None], axis=1)[:, 0])
+        highs.append(np.take_along_axis(child_high, hi[:, None], axis=1)[:, 0])
+        # Extremes from the same child keep that child's order
+        same = np.take_along_axis(low_first[a:b].reshape(shape), lo[:, None], axis=1)[:, 0]
+        orders.append((lo < hi) | ((lo == hi) & same))
+    return np.concatenate(lows), np.concatenate(highs), np.concatenate(orders)
+
+
+def _interleave(low: np.ndarray, high: np.ndarray, low_first: np.ndarray, size: int,
+                start: int, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Chart points of buckets of size samples starting at start, clipped to n samples."""
+    values = np.empty((2 * len(low), low.shape[1]), dtype=low.dtype)
+    values[0::2] = np.where(low_first, low, high)
+    values[1::2] = np.where(low_first, high, low)
+    starts = start + np.arange(len(low)) * size
+    index = np.empty(2 * len(low), dtype=np.int64)
+    index[0::2] = starts
+    index[1::2] = np.minimum(starts + size // 2, n - 1)
+    return index, values
+
+
+def minmax_downsample(samples: np.ndarray, width: int, start: int = 0,
+                      end: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Min/max envelope of samples[start:end] for a chart width pixels wide.
+
+    Args:
+        samples: Array of shape (n, channels)
+        width: Number of buckets (chart width in pixels)
+        start: First sample of the range
+        end: Sample after the range (default: the end of the recording)
+
+    Returns:
+        Tuple of (index, values): sample index of each point and values of
+        shape (points, channels), at most 2 * width points. Ranges that
+        already fit are returned unreduced.
+    """
+    if width < 1:
+        raise ValueError(f"width must be at least 1, got {width}")
+    x = np.asarray(samples)
+    if x.ndim == 1:
+        x = x[:, None]
+    end = len(x) if end is None else end
+    start, end = max(start, 0), min(end, len(x))
+    if end - start <= 2 * width:
+        return np.arange(start, max(end, start)), x[start:end]
+    size = -(-(end - start) // width)
+    low, high, low_first = _reduce_raw(x[start:end], size)
+    return _interleave(low, high, low_first, size, start, end)
+
+
+def build_pyramid(samples: np.ndarray) -> Dict:
+    """
+    Min/max envelope of a recording at every pyramid level.
+
+    Args:
+        samples: Array of shape (n, channels)
+
+    Returns:
+        Dictionary with 'n' (samples) and 'levels', coarsening lists of
+        dicts with 'size' (samples per bucket), 'low', 'high' and
+        'low_first' (each of shape (buckets, channels))
+    """
+    x = np.asarray(samples)
+    if x.ndim == 1:
+        x = x[:, None]
+    levels = []
+    size = PYRAMID_BASE
+    if len(x) > size:
+        low, high, low_first = _reduce_raw(x, size)
+        while True:
+            levels.append({'size': size, 'low': low, 'high': high, 'low_first': low_first})
+            if len(low) <= PYRAMID_FACTOR:
+                break
+            low, high, low_first = _merge(low, high, low_first, PYRAMID_FACTOR)
+            size *= PYRAMID_FACTOR
+    return {'n': len(x), 'levels': levels}
+
+
+def pyramid_range(pyramid: Dict, samples: np.ndarray, width: int, start: int = 0,
+                  end: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Min/max envelope of samples[start:end] for width pixels, from the pyramid.
+
+    The range is widened to whole buckets of the level it is served from.
+
+    Args:
+        pyramid: Result of build_pyramid for samples
+        samples: Array of shape (n, channels), used below the finest level
+        width: Chart width in pixels
+        start: First sample of the range
+        end: Sample after the range (default: the end of the recording)
+
+    Returns:
+        Tuple of (index, values, size): as minmax_downsample, but with up to
+        two buckets (4 points) per pixel, plus the samples each point pair
+        covers (1 for raw samples)
+    """
+    if width < 1:
+        raise ValueError(f"width must be at least 1, got {width}")
+    n = pyramid['n']
+    end = n if end is None else end
+    start, end = max(start, 0), min(end, n)
+    per_pixel = (end - start) / width
+    usable = [level for level in pyramid['levels'] if level['size'] <= per_pixel]
+    if not usable:
+        index, values = minmax_downsample(samples, width, start, end)
+        return index, values, max(-(-(end - start) // width), 1) if end - start > 2 * width else 1
+
+    level = usable[-1]
+    first, last = start // level['size'], -(-end // level['size'])
+    low, high, low_first = level['low'][first:last], level['high'][first:last], level['low_first'][first:last]
+    # Merge the level's buckets (fewer than PYRAMID_FACTOR per pixel) until
+    # one to two remain per pixel
+    group = max(int(per_pixel // level['size']), 1)
+    if group > 1:
+        low, high, low_first = _merge(low, high, low_first, group)
+    size = level['size'] * group
+    index, values = _interleave(low, high, low_first, size, first * level['size'], n)
+    return index, values, size
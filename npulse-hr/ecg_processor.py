@@ -12,19 +12,19 @@ from matplotlib.figure import Figure
 from matplotlib.backends.backend_agg import FigureCanvasAgg
 import re
 import requests
-from typing import Optional, Tuple, List, Dict
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, Optional, Tuple, List, Dict
 from io import BytesIO
 
-
-def fetch_url(url: str) -> Optional[str]:
-    """Fetch content from a given URL."""
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.text
-    except Exception as e:
-        print(f"Error fetching URL: {e}")
-        return None
+from beat_fusion import beat_weights, fuse_beats, fuse_values
+from chart_downsample import minmax_downsample
+from hrv import hrv_metrics
+from qrs_detector import pan_tompkins_peaks
+from recording_format import is_binary_recording, open_recording
+from respiration import empty_respiration, respiration_rate
+from signal_quality import channel_scores, empty_quality, mask_samples, sample_mask, select_channels, window_quality
+from spectral_hr import spectral_hr
+from remote_fetch import fetch_url, open_url
 
 
 def read_file_content(file_path: str) -> Optional[str]:
@@ -51,31 +51,494 @@ def clean_text(text: str) -> str:
     return ""
 
 
+# Column names used for the three sensor channels throughout the analyzer
+SENSOR_COLUMNS = ["line_1", "line_2", "line_3"]
+
+# Byte values recognised by the vectorized parser
+_NEWLINE = ord('\n')
+_COMMA = ord(',')
+_MINUS = ord('-')
+_PLUS = ord('+')
+_CR = ord('\r')
+_BLANKS = np.array([ord(' '), ord('\t'), ord('\r')], dtype=np.uint8)
+
+# Parse in newline-aligned blocks so temporaries stay bounded for long recordings
+_PARSE_CHUNK_BYTES = 1 << 22
+
+
+def _parse_block_plain(buf: np.ndarray, n_channels: int) -> Optional[np.ndarray]:
+    """
+    Fast path for blocks made only of digits, commas and line breaks.
+
+    Works on token boundaries instead of individual bytes, so temporaries scale
+    with the number of values rather than the number of characters. Returns
+    None when the block contains anything else (blanks, signs, junk).
+    """
+    is_delim = (buf == _COMMA) | (buf == _NEWLINE)
+    is_cr = buf == _CR
+    if np.any(is_cr):
+        # Carriage returns are only allowed as part of a CRLF line ending
+        cr_pos = np.flatnonzero(is_cr)
+        if cr_pos[-1] + 1 >= buf.size or np.any(buf[cr_pos + 1] != _NEWLINE):
+            return None
+        is_delim |= is_cr
+    if np.count_nonzero((buf - np.uint8(48)) < 10) + np.count_nonzero(is_delim) != buf.size:
+        return None
+
+    # Token t spans [starts[t], ends[t]); a trailing delimiter yields an empty token
+    ends = np.r_[np.flatnonzero(is_delim), buf.size]
+    starts = np.r_[0, ends[:-1] + 1]
+    lengths = ends - starts
+    max_len = int(min(lengths.max(initial=0), 9))
+
+    values = np.zeros(ends.size, dtype=np.int64)
+    for k in range(max_len):
+        take = lengths > k
+        digits = buf[np.minimum(starts + k, buf.size - 1)].astype(np.int64) - 48
+        values = np.where(take, values * 10 + digits, values)
+    valid = (lengths > 0) & (lengths <= 9)
+
+    # Group tokens into lines; '\r' tokens sit past the last field and are ignored
+    delim_chars = buf[ends[:-1]]
+    line_first = np.r_[0, np.flatnonzero(delim_chars == _NEWLINE) + 1]
+    line_tokens = np.diff(np.r_[line_first, ends.size])
+    line_first = line_first[line_tokens >= n_channels]
+    idx = line_first[:, None] + np.arange(n_channels)
+    ok = valid[idx].all(axis=1)
+    return values[idx[ok]]
+
+
+def _parse_block(buf: np.ndarray, n_channels: int) -> np.ndarray:
+    """Parse one newline-aligned block of bytes into an (n, n_channels) int64 array."""
+    plain = _parse_block_plain(buf, n_channels)
+    if plain is not None:
+        return plain
+
+    is_nl = buf == _NEWLINE
+    is_comma = buf == _COMMA
+    n_lines = int(np.count_nonzero(is_nl)) + 1
+
+    # Line and field index of every byte (delimiters count towards the preceding field)
+    line_id = np.cumsum(is_nl, dtype=np.int32) - is_nl
+    comma_cum = np.cumsum(is_comma, dtype=np.int32) - is_comma
+    line_start = np.flatnonzero(np.r_[True, is_nl[:-1]])
+    field = comma_cum - comma_cum[line_start][line_id]
+
+    in_field = (field < n_channels) & ~is_nl & ~is_comma
+    key = (line_id * n_channels + field)[in_field]
+    chars = buf[in_field]
+    n_keys = n_lines * n_channels
+
+    digit = chars - np.uint8(48)
+    is_digit = digit < 10
+    is_sign = (chars == _MINUS) | (chars == _PLUS)
+    # Neighbouring bytes only count when they belong to the same field
+    joined = np.r_[key[1:] == key[:-1], False]
+    # A sign is only valid directly in front of a digit of the same field
+    sign_ok = is_sign & joined & np.r_[is_digit[1:], False]
+    is_bad = ~(is_digit | sign_ok | np.isin(chars, _BLANKS))
+    run_start = is_digit & ~np.r_[False, is_digit[:-1] & joined[:-1]]
+
+    bad = np.bincount(key, weights=is_bad, minlength=n_keys)
+    runs = np.bincount(key, weights=run_start, minlength=n_keys)
+    negative = np.bincount(key, weights=chars == _MINUS, minlength=n_keys) > 0
+
+    # Positional weight of each digit: number of digits that follow it in its field
+    digit_key = key[is_digit]
+    n_digits = np.bincount(digit_key, minlength=n_keys).astype(np.int64)
+    digits_before = np.cumsum(n_digits) - n_digits
+    rank = np.arange(digit_key.size) - digits_before[digit_key]
+    power = np.minimum(n_digits[digit_key] - rank - 1, 18)
+    weights = digit[is_digit] * 10.0 ** power
+    values = np.bincount(digit_key, weights=weights, minlength=n_keys)
+
+    # Exactly one contiguous run of at most 9 digits per field keeps int32 exact
+    ok = (bad == 0) & (runs == 1) & (n_digits <= 9)
+    ok = ok.reshape(n_lines, n_channels).all(axis=1)
+    values = np.where(negative, -values, values).reshape(n_lines, n_channels)
+    return values[ok].astype(np.int64)
+
+
+def parse_samples(data, n_channels: int = 3, dtype=np.int32) -> np.ndarray:
+    """
+    Parse comma-separated recording text into a contiguous (n, n_channels) array.
+
+    Vectorized replacement for the per-line loop in process_lines. Rows with
+    fewer than n_channels fields, or a non-integer value in any of the first
+    n_channels fields, are dropped; extra fields are ignored.
+
+    Args:
+        data: Recording text as str, bytes, bytearray or memoryview
+        n_channels: Number of leading fields to keep per line
+        dtype: Integer dtype of the returned array
+
+    Returns:
+        Array of shape (n, n_channels)
+    """
+    if isinstance(data, str):
+        data = data.encode('ascii', errors='replace')
+    raw = np.frombuffer(data, dtype=np.uint8)
+
+    blocks = []
+    start, total = 0, raw.size
+    while start < total:
+        end = min(start + _PARSE_CHUNK_BYTES, total)
+        if end < total:
+            # Cut the block after its last complete line
+            newlines = np.flatnonzero(raw[start:end] == _NEWLINE)
+            if newlines.size:
+                end = start + int(newlines[-1]) + 1
+        blocks.append(_parse_block(raw[start:end], n_channels))
+        start = end
+
+    if not blocks:
+        return np.empty((0, n_channels), dtype=dtype)
+    return np.concatenate(blocks).astype(dtype, copy=False)
+
+
+# Bytes held back at the end of each streamed chunk so clean_text's trailing cut can be applied
+TEXT_TAIL_HOLD = 4096
+
+
+def _clean_chunk(data: bytes) -> bytes:
+    """Byte-level equivalent of clean_text's marker removal."""
+    return data.replace(b"Start nPULSE001", b"").replace(b"Start", b"")
+
+
+def parse_text_stream(chunks: Iterable[bytes], n_channels: int = 3) -> Iterator[np.ndarray]:
+    """
+    Parse a text recording arriving as byte chunks, yielding sample blocks.
+
+    Applies the same cleaning as clean_text (marker removal and the trailing
+    25-character cut), so the concatenated blocks equal
+    parse_samples(clean_text(text)) for the whole text.
+    """
+    emitted = 0
+    carry = b""
+    started = False
+
+    for chunk in chunks:
+        data = carry + chunk
+        if not started:
+            data = data.lstrip()
+            started = bool(data)
+
+        cut = data.rfind(b'\n', 0, max(len(data) - TEXT_TAIL_HOLD, 0))
+        if cut < 0:
+            carry = data
+            continue
+
+        ready = _clean_chunk(data[:cut + 1])
+        emitted += len(ready)
+        carry = data[cut + 1:]
+        samples = parse_samples(ready, n_channels)
+        if len(samples):
+            yield samples
+
+    tail = _clean_chunk(carry.rstrip())
+    if emitted + len(tail) > 25:
+        tail = tail[:-25]
+    samples = parse_samples(tail, n_channels)
+    if len(samples):
+        yield samples
+
+
 def process_lines(text: str) -> Optional[pd.DataFrame]:
     """Convert text data into a structured DataFrame."""
     if not text:
         return None
     
-    line_1, line_2, line_3 = [], [], []
-    
-    for line in text.split('\n'):
-        values = line.split(',')
-        if len(values) >= 3:  # Ensure three columns exist
-            line_1.append(values[0])
-            line_2.append(values[1])
-            line_3.append(values[2])
+    samples = parse_samples(text)
     
-    if not line_1:
+    if not len(samples):
         print("No valid data found in the file.")
         return None
 
-    df = pd.DataFrame({'line_1': line_1, 'line_2': line_2, 'line_3': line_3})
+    return pd.DataFrame(samples, columns=SENSOR_COLUMNS)
+
+
+def load_samples(file_path: str) -> Optional[Tuple[np.ndarray, Optional[Dict]]]:
+    """
+    Load recording samples from a URL, a text file or a binary recording.
+    
+    Args:
+        file_path: URL or local path (.txt or .npb)
+        
+    Returns:
+        Tuple of (samples, header) where samples has shape (n, 3) and header is
+        the binary recording header (None for text input), or None if failed
+    """
+    if not file_path.startswith("http") and is_binary_recording(file_path):
+        opened = open_recording(file_path)
+        if opened is None or not len(opened[1]):
+            print("No valid data found in the file.")
+            return None
+        header, samples = opened
+        if samples.shape[1] < len(SENSOR_COLUMNS):
+            print(f"Recording has {samples.shape[1]} channel(s); {len(SENSOR_COLUMNS)} required.")
+            return None
+        return samples, header
 
-    # Convert to numeric, coerce errors
-    for col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+    if file_path.startswith("http"):
+        # Parse while the body streams in (and into the local HTTP cache)
+        chunks = open_url(file_path)
+        if chunks is None:
+            return None
+        try:
+            blocks = list(parse_text_stream(chunks))
+        except requests.RequestException as e:
+            print(f"Error fetching URL: {e}")
+            return None
+        samples = np.concatenate(blocks) if blocks else np.empty((0, len(SENSOR_COLUMNS)), dtype=np.int32)
+    else:
+        nadi_patient_data = read_file_content(file_path)
+        if not nadi_patient_data:
+            return None
+        samples = parse_samples(clean_text(nadi_patient_data))
     
-    return df.dropna().astype('Int64')
+    if not len(samples):
+        print("No valid data found in the file.")
+        return None
+    
+    return samples, None
+
+
+# Pass band used for heart-rate analysis (Hz) and its Butterworth order
+HR_BAND = (0.5, 8.0)
+HR_FILTER_ORDER = 4
+
+# Beat-to-beat HR is BPM_SCALE / interval (s); values outside BPM_RANGE are dropped
+BPM_SCALE = 73
+BPM_RANGE = (40, 220)
+
+# Default sliding window and hop of the HR trend (seconds)
+TREND_WINDOW = 10.0
+TREND_HOP = 5.0
+
+
+@lru_cache(maxsize=32)
+def design_bandpass(fs: float, order: int = HR_FILTER_ORDER, band: Tuple[float, float] = HR_BAND) -> np.ndarray:
+    """
+    Butterworth band-pass design as second-order sections, cached per (fs, order, band).
+
+    The returned array is shared between callers; do not modify it.
+    """
+    return signal.butter(order, [band[0] / (fs / 2), band[1] / (fs / 2)], btype='bandpass', output='sos')
+
+
+def filter_channels(samples: np.ndarray, fs: float = 220) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Normalize and zero-phase band-pass filter every channel in one pass.
+
+    Args:
+        samples: Array of shape (n, channels)
+        fs: Sampling frequency in Hz
+
+    Returns:
+        Tuple of (filtered, usable): filtered has shape (n, channels) and
+        usable flags channels that are not constant (constant channels are
+        left as zeros)
+    """
+    # Work channel-major so every reduction and filter pass runs over contiguous memory
+    x = np.array(np.asarray(samples).T, dtype=np.float64, order='C')
+    x -= x.mean(axis=1, keepdims=True)
+    std = np.sqrt(np.einsum('ij,ij->i', x, x) / max(x.shape[1], 1))
+    usable = std > 0
+    x /= np.where(usable, std, 1.0)[:, None]
+    return signal.sosfiltfilt(design_bandpass(fs), x, axis=-1).T, usable
+
+
+def detect_peaks(filtered: np.ndarray, fs: float = 220) -> np.ndarray:
+    """Beat indices in one filtered, normalized channel."""
+    peaks, _ = signal.find_peaks(np.ascontiguousarray(filtered), distance=fs * 0.5, prominence=0.5)
+    return peaks
+
+
+# Beat detectors selectable in analyze_ecg_file; each maps one filtered,
+# normalized channel and fs to beat indices
+DETECTORS: Dict[str, Callable[[np.ndarray, float], np.ndarray]] = {
+    'find_peaks': detect_peaks,
+    'pan_tompkins': pan_tompkins_peaks,
+}
+
+# Detectors offered by /analyze and the batch CLI; pan_tompkins stays internal
+# until it agrees with find_peaks on the field recordings (benchmark.py detect)
+PUBLIC_DETECTORS = ('find_peaks',)
+
+# Analysis modes of analyze_ecg_file: beat detection on every sensor, or only
+# the average HR from the spectrum of a decimated copy (no beats, HRV,
+# respiration or signal quality), falling back to beats when the spectrum
+# shows no clear rhythm
+MODES = ('beats', 'fast')
+
+# Modes offered by /analyze and the batch CLI; fast mode stays internal until
+# clean field recordings reach MIN_SPECTRAL_CONFIDENCE (on files-old every one
+# falls back to beats, paying for both passes)
+PUBLIC_MODES = ('beats',)
+
+
+def beat_bpm(peaks: np.ndarray, fs: float = 220) -> np.ndarray:
+    """
+    Heart rate of the interval ending at each beat.
+
+    Returns:
+        float64 array aligned with peaks, NaN for the first beat and where
+        the HR falls outside BPM_RANGE
+    """
+    bpm_values = np.full(len(peaks), np.nan)
+    if len(peaks) < 2:
+        return bpm_values
+    bpm_values[1:] = BPM_SCALE / (np.diff(peaks) / fs)
+    bpm_values[(bpm_values <= BPM_RANGE[0]) | (bpm_values >= BPM_RANGE[1])] = np.nan  # Remove outliers
+    return bpm_values
+
+
+def combine_beats(peaks: List[np.ndarray], beat_values: List[np.ndarray], fs: float = 220) -> Tuple[Dict, Dict]:
+    """
+    Combined HR from one consensus beat train of all sensors.
+
+    Each heartbeat counts once, weighted by the share of sensors that found it.
+
+    Args:
+        peaks: Beat indices per sensor
+        beat_values: HR of the interval ending at each beat, per sensor (beat_bpm)
+        fs: Sampling frequency in Hz
+
+    Returns:
+        Tuple of (fusion, combined_hr): fusion is the fuse_beats result plus
+        'bpm' and 'weight' per consensus beat, combined_hr has 'avg', 'min'
+        and 'max' (all 0 when no beat has a known HR)
+    """
+    fusion = fuse_beats(peaks, fs)
+    fusion['bpm'] = fuse_values(fusion, beat_values)
+    fusion['weight'] = beat_weights(fusion)
+    known = ~np.isnan(fusion['bpm']) & (fusion['weight'] > 0)
+    if not known.any():
+        return fusion, {'avg': 0, 'min': 0, 'max': 0}
+    combined_bpm = fusion['bpm'][known]
+    return fusion, {
+        'avg': np.average(combined_bpm, weights=fusion['weight'][known]),
+        'min': np.min(combined_bpm),
+        'max': np.max(combined_bpm)
+    }
+
+
+def peaks_to_bpm(peaks: np.ndarray, fs: float = 220) -> np.ndarray:
+    """Beat-to-beat heart rate values, with physiologically implausible ones removed."""
+    bpm_values = beat_bpm(peaks, fs)
+    return bpm_values[~np.isnan(bpm_values)]
+
+
+def rr_series(peaks: np.ndarray, fs: float = 220,
+              bpm_values: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Beat-to-beat intervals for HRV, on the same time scale as the HR values.
+
+    HR is BPM_SCALE / interval, so intervals and times are scaled by
+    60 / BPM_SCALE; 60000 / RR then equals the reported BPM.
+
+    Args:
+        peaks: Sorted beat indices
+        fs: Sampling frequency in Hz
+        bpm_values: beat_bpm(peaks, fs), if already computed
+
+    Returns:
+        Tuple of (times, rr): time of each interval's ending beat in seconds
+        and interval length in ms, NaN where the HR falls outside BPM_RANGE
+    """
+    peaks = np.asarray(peaks, dtype=np.int64)
+    if len(peaks) < 2:
+        return np.zeros(0), np.zeros(0)
+    if bpm_values is None:
+        bpm_values = beat_bpm(peaks, fs)
+    return peaks[1:] * (60 / BPM_SCALE / fs), 60000 / bpm_values[1:]
+
+
+def hr_trend(peaks: List[np.ndarray], n_samples: int, fs: float = 220,
+             window: float = TREND_WINDOW, hop: float = TREND_HOP, fusion: Optional[Dict] = None,
+             beat_values: Optional[List[np.ndarray]] = None) -> Dict:
+    """
+    Heart rate over sliding windows from per-sensor beat indices.
+
+    A beat-to-beat interval belongs to every window containing its ending
+    beat. Window sums are differences of cumulative sums taken at the
+    searchsorted window edges, so the cost is one pass over the beats plus two
+    lookups per window, whatever the window and hop.
+
+    Args:
+        peaks: Sorted beat indices for each sensor
+        n_samples: Recording length in samples
+        fs: Sampling frequency in Hz
+        window: Window length in seconds
+        hop: Step between window starts in seconds
+        fusion: fuse_beats result with per-beat 'bpm' and 'weight' the
+            combined HR is taken from (default: the intervals of all
+            sensors pooled)
+        beat_values: beat_bpm of each sensor's peaks, if already computed
+
+    Returns:
+        Dictionary with 'fs', 'window' and 'hop' and one row per window of:
+        'time' (window start, s), 'bpm' (mean beat-to-beat HR per sensor, NaN
+        without a usable interval), 'beats' (beats per sensor), 'quality'
+        (fraction of the window covered by usable intervals, per sensor) and
+        'combined' (HR over the fused or pooled beats)
+    """
+    width = max(int(round(window * fs)), 1)
+    step = max(int(round(hop * fs)), 1)
+    starts = np.arange(0, max(n_samples - width, 0) + 1, step)
+    ends = starts + width
+    shape = (len(starts), len(peaks))
+    bpm = np.full(shape, np.nan, dtype=np.float32)
+    beats = np.zeros(shape, dtype=np.int32)
+    quality = np.zeros(shape, dtype=np.float32)
+    total_sum = np.zeros(len(starts))
+    total_count = np.zeros(len(starts))
+
+    for i, sensor_peaks in enumerate(peaks):
+        sensor_peaks = np.asarray(sensor_peaks, dtype=np.int64)
+        beats[:, i] = np.searchsorted(sensor_peaks, ends) - np.searchsorted(sensor_peaks, starts)
+        if len(sensor_peaks) < 2:
+            continue
+        values = (beat_bpm(sensor_peaks, fs) if beat_values is None else beat_values[i])[1:]
+        usable = ~np.isnan(values)
+        ibi = BPM_SCALE / values
+        cum_count = np.concatenate([[0], np.cumsum(usable)])
+        cum_bpm = np.concatenate([[0.0], np.cumsum(np.where(usable, values, 0.0))])
+        cum_ibi = np.concatenate([[0.0], np.cumsum(np.where(usable, ibi, 0.0))])
+        # Intervals are keyed by their ending beat
+        lo = np.searchsorted(sensor_peaks[1:], starts)
+        hi = np.searchsorted(sensor_peaks[1:], ends)
+        count = cum_count[hi] - cum_count[lo]
+        total = cum_bpm[hi] - cum_bpm[lo]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            bpm[:, i] = np.where(count > 0, total / count, np.nan)
+        quality[:, i] = np.minimum((cum_ibi[hi] - cum_ibi[lo]) / (width / fs), 1.0)
+        total_sum += total
+        total_count += count
+
+    if fusion is not None:
+        # One weighted value per consensus beat
+        known = ~np.isnan(fusion['bpm'])
+        weight = np.where(known, fusion['weight'], 0.0)
+        cum_weight = np.concatenate([[0.0], np.cumsum(weight)])
+        cum_bpm = np.concatenate([[0.0], np.cumsum(np.where(known, fusion['bpm'], 0.0) * weight)])
+        lo = np.searchsorted(fusion['beats'], starts)
+        hi = np.searchsorted(fusion['beats'], ends)
+        total_count = cum_weight[hi] - cum_weight[lo]
+        total_sum = cum_bpm[hi] - cum_bpm[lo]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        combined = np.where(total_count > 0, total_sum / total_count, np.nan).astype(np.float32)
+    return {
+        'fs': fs,
+        'window': window,
+        'hop': hop,
+        'time': (starts / fs).astype(np.float32),
+        'bpm': bpm,
+        'beats': beats,
+        'quality': quality,
+        'combined': combined,
+    }
 
 
 def process_ppg_signal(ppg_signal: np.ndarray, fs: int = 220) -> Tuple[np.ndarray, float, float, float, np.ndarray]:
@@ -93,114 +556,176 @@ def process_ppg_signal(ppg_signal: np.ndarray, fs: int = 220) -> Tuple[np.ndarra
         print("Insufficient data for heart rate analysis.")
         return np.array([]), 0, 0, 0, np.array([])
     
-    # 1. Preprocessing
-    ppg_signal = ppg_signal - np.mean(ppg_signal)  # Remove DC offset
-    std = np.std(ppg_signal)
-    if std == 0:
+    # 1-2. Normalization and band-pass filtering (0.5-8 Hz)
+    filtered, usable = filter_channels(np.asarray(ppg_signal)[:, None], fs)
+    if not usable[0]:
         print("Signal is constant; cannot process.")
         return np.array([]), 0, 0, 0, np.array([])
-    ppg_signal = ppg_signal / std  # Normalize
-
-    # 2. Bandpass Filtering (0.5-8 Hz)
-    b, a = signal.butter(4, [0.5 / (fs / 2), 8 / (fs / 2)], btype='bandpass')
-    filtered_ppg = signal.filtfilt(b, a, ppg_signal)
+    filtered_ppg = filtered[:, 0]
 
     # 3. Peak Detection
-    peaks, _ = signal.find_peaks(filtered_ppg, distance=fs * 0.5, prominence=0.5)
+    peaks = detect_peaks(filtered_ppg, fs)
 
     # 4. Heart Rate Calculation
-    if len(peaks) > 1:
-        ibi = np.diff(peaks) / fs
-        bpm_values = 73 / ibi
-        bpm_values = bpm_values[(bpm_values > 40) & (bpm_values < 220)]  # Remove outliers
-
-        max_bpm = np.max(bpm_values) if bpm_values.size else 0
-        avg_bpm = np.mean(bpm_values) if bpm_values.size else 0
-        min_bpm = np.min(bpm_values) if bpm_values.size else 0
+    bpm_values = peaks_to_bpm(peaks, fs)
+    if bpm_values.size:
+        avg_bpm, min_bpm, max_bpm = np.mean(bpm_values), np.min(bpm_values), np.max(bpm_values)
     else:
         avg_bpm, min_bpm, max_bpm = 0, 0, 0
 
     return peaks, avg_bpm, min_bpm, max_bpm, filtered_ppg
 
 
-def analyze_ecg_file(file_path: str) -> Optional[Dict]:
+def analyze_ecg_file(file_path: str, detector: str = 'find_peaks', mask_bad_windows: bool = True,
+                     top_channels: Optional[int] = None, mode: str = 'beats') -> Optional[Dict]:
     """
     Analyze an ECG data file and return results.
     
     Args:
-        file_path: Path to the ECG data file
+        file_path: Path or URL of the ECG data file (text or binary recording)
+        detector: Beat detector, a DETECTORS key ('find_peaks' or 'pan_tompkins')
+        mask_bad_windows: Flatten windows that fail the signal quality checks
+            before filtering, and skip sensors without a good window
+        top_channels: Analyze only this many sensors, the best ranked by a
+            cheap pre-pass on a decimated copy (None analyzes all of them)
+        mode: 'beats' for the full beat-based analysis, 'fast' for the
+            spectral average HR only (min and max then equal the average;
+            detector, mask_bad_windows and top_channels do not apply).
+            Fast mode runs the beat-based analysis instead when the combined
+            spectral estimate is below MIN_SPECTRAL_CONFIDENCE; the result's
+            'mode' tells which one ran
         
     Returns:
         Dictionary with analysis results or None if failed
     """
-    # Read file
-    if file_path.startswith("http"):
-        nadi_patient_data = fetch_url(file_path)
-    else:
-        nadi_patient_data = read_file_content(file_path)
+    if detector not in DETECTORS:
+        raise ValueError(f"unknown detector {detector!r}")
+    if top_channels is not None and top_channels < 1:
+        raise ValueError(f"top_channels must be at least 1, got {top_channels}")
+    if mode not in MODES:
+        raise ValueError(f"unknown mode {mode!r}")
+    find_beats = DETECTORS[detector]
 
-    if not nadi_patient_data:
-        return None
-    
-    cleaned_text = clean_text(nadi_patient_data)
-    df = process_lines(cleaned_text)
-    
-    if df is None or "line_1" not in df:
+    loaded = load_samples(file_path)
+    if loaded is None:
         return None
+    samples, header = loaded
+    fs = 220  # default rate the HR pipeline is tuned for
 
-    # Process all 3 sensors
-    sensor_columns = ["line_1", "line_2", "line_3"]
-    hr_results = []
-    all_bpm_values = []
+    hr_results = [{'avg': 0, 'min': 0, 'max': 0} for _ in SENSOR_COLUMNS]
+    # Beat indices per sensor, relative to the start of the recording
+    peaks = [np.array([], dtype=np.int32) for _ in SENSOR_COLUMNS]
+    # HR of the interval ending at each beat, per sensor
+    beat_values = [np.array([]) for _ in SENSOR_COLUMNS]
+    # HR values use BPM_SCALE per second of beat interval, i.e. a true rate of
+    # fs * BPM_SCALE / 60; breaths per minute are measured on the same clock
+    respiration_fs = fs * BPM_SCALE / 60
+    respiration = empty_respiration(len(SENSOR_COLUMNS), respiration_fs)
+    quality = empty_quality(len(SENSOR_COLUMNS), fs)
+    scores = None
+    spectral = None
+    active = list(range(len(SENSOR_COLUMNS)))
     
-    for i, col in enumerate(sensor_columns):
-        sensor_signal = df[col].to_numpy()
-        
-        # Trim 500 data points from start and end if there are enough points
-        if len(sensor_signal) > 1000:
-            sensor_signal = sensor_signal[500:-500]
+    # Trim 500 data points from start and end if there are enough points
+    if len(samples) > 1000 and mode == 'fast':
+        spectral = spectral_hr(samples[500:-500, :len(SENSOR_COLUMNS)], fs)
+        if spectral['combined']:
+            for i, bpm in enumerate(spectral['bpm']):
+                if bpm:
+                    hr_results[i] = {'avg': bpm, 'min': bpm, 'max': bpm}
         else:
+            mode = 'beats'
+    if len(samples) > 1000 and mode == 'beats':
+        trimmed = samples[500:-500, :len(SENSOR_COLUMNS)]
+        if top_channels is not None and top_channels < len(active):
+            scores = channel_scores(trimmed, fs)
+            active = sorted(np.argsort(-scores, kind='stable')[:top_channels].tolist())
+        selected = active
+        # Score the raw signal first; bad stretches still go through the filter
+        # and detector, but bridged by straight lines that the band-pass all but
+        # removes, so they give no beats (and an interval spanning one is too
+        # long to count)
+        quality = select_channels(window_quality(trimmed[:, active], fs, offset=500), active, len(SENSOR_COLUMNS))
+        if mask_bad_windows and not quality['good'][:, active].all():
+            good = sample_mask(quality, len(trimmed))
+            active = [i for i in active if good[:, i].any()]
+            trimmed = mask_samples(trimmed, good)
+        # All active sensors are normalized and filtered together; peaks are found per sensor
+        filtered, usable = filter_channels(trimmed[:, active], fs)
+        for i in range(len(SENSOR_COLUMNS)):
+            if i not in selected:
+                continue                # not ranked among the top_channels best
+            if i not in active:
+                print(f"Sensor {i+1} has no usable signal windows; skipped.")
+                continue
+            column = active.index(i)
+            if not usable[column]:
+                print(f"Sensor {i+1} signal is constant; cannot process.")
+                continue
+            peaks[i] = (find_beats(filtered[:, column], fs) + 500).astype(np.int32)
+            beat_values[i] = beat_bpm(peaks[i], fs)
+            bpm_values = beat_values[i][~np.isnan(beat_values[i])]
+            if bpm_values.size:
+                hr_results[i] = {
+                    'avg': np.mean(bpm_values),
+                    'min': np.min(bpm_values),
+                    'max': np.max(bpm_values)
+                }
+        # Breathing from the raw baseline of the selected sensors, decimated before it is filtered
+        breathing = respiration_rate(samples[500:-500, selected], respiration_fs)
+        for column, i in enumerate(selected):
+            respiration['rate'][i] = breathing['rate'][column]
+            respiration['breaths'][i] = (breathing['breaths'][column] + 500).astype(np.int32)
+        respiration.update(combined=breathing['combined'], fs=breathing['fs'])
+    elif len(samples) <= 1000:
+        for i in range(len(SENSOR_COLUMNS)):
             print(f"Not enough data points to trim for Sensor {i+1}.")
-            hr_results.append({'avg': 0, 'min': 0, 'max': 0})
-            continue
-        
-        # Process the signal
-        peaks, avg_bpm, min_bpm, max_bpm, filtered_signal = process_ppg_signal(sensor_signal)
-        
-        hr_results.append({
-            'avg': avg_bpm,
-            'min': min_bpm,
-            'max': max_bpm
-        })
-        
-        # Collect BPM values for combined calculation
-        if len(peaks) > 1:
-            ibi = np.diff(peaks) / 220  # Using default fs
-            bpm_values = 73 / ibi
-            bpm_values = bpm_values[(bpm_values > 40) & (bpm_values < 220)]
-            all_bpm_values.extend(bpm_values.tolist())
     
-    # Calculate combined HR from all sensors
-    if all_bpm_values:
-        combined_hr = {
-            'avg': np.mean(all_bpm_values),
-            'min': np.min(all_bpm_values),
-            'max': np.max(all_bpm_values)
-        }
-    else:
-        combined_hr = {'avg': 0, 'min': 0, 'max': 0}
+    fusion, combined_hr = combine_beats(peaks, beat_values, fs)
+    if mode == 'fast' and spectral is not None:
+        bpm = spectral['combined']
+        combined_hr = {'avg': bpm, 'min': bpm, 'max': bpm}
 
     return {
-        'dataframe': df,
+        'samples': samples,
         'hr_results': hr_results,
         'combined_hr': combined_hr,
-        'total_samples': len(df),
-        'sampling_rate': len(df) / 60  # Assuming 60 second recording
+        'peaks': peaks,
+        # Consensus beats of all sensors: index, share of sensors that found
+        # it, HR of the interval ending there and weight in the combined HR
+        'fusion': {key: fusion[key] for key in ('beats', 'confidence', 'bpm', 'weight')},
+        'hr_trend': hr_trend(peaks, len(samples), fs, fusion=fusion, beat_values=beat_values),
+        'hrv': [hrv_metrics(*rr_series(sensor_peaks, fs, values))
+                for sensor_peaks, values in zip(peaks, beat_values)],
+        'respiration': respiration,
+        'sqi': quality,
+        # Pre-pass ranking (None when every sensor was analyzed) and the sensors beats were detected on
+        'channel_scores': None if scores is None else scores.tolist(),
+        # Spectral estimate with per-sensor confidence (fast mode only) and
+        # the mode that produced the HR
+        'spectral': spectral,
+        'mode': mode,
+        'analyzed_channels': active,
+        'total_samples': len(samples),
+        # Whole-recording maximum and mean per column, for chart summaries
+        'sample_stats': {'max': samples.max(axis=0).tolist(), 'mean': samples.mean(axis=0).tolist()},
+        # Text recordings carry no rate; assume a 60 second recording
+        'sampling_rate': header['sample_rate'] if header else len(samples) / 60
     }
 
 
+def samples_dataframe(samples: np.ndarray) -> pd.DataFrame:
+    """
+    Samples of an analysis result as a DataFrame with SENSOR_COLUMNS.
+
+    Built on demand: the DataFrame copies the samples into memory, which a
+    memory-mapped recording otherwise avoids.
+    """
+    return pd.DataFrame(np.asarray(samples)[:, :len(SENSOR_COLUMNS)], columns=SENSOR_COLUMNS)
+
+
 def create_ecg_plot(df: pd.DataFrame, hr_results: List[Dict], combined_hr: Dict, 
-                    save_path: Optional[str] = None) -> Figure:
+                    save_path: Optional[str] = None, figsize: Tuple[float, float] = (16, 10)) -> Figure:
     """
     Create ECG plot with all 3 sensors.
     
@@ -209,6 +734,7 @@ def create_ecg_plot(df: pd.DataFrame, hr_results: List[Dict], combined_hr: Dict,
         hr_results: List of HR results for each sensor
         combined_hr: Combined HR results
         save_path: Optional path to save the plot
+        figsize: Figure width and height in inches
         
     Returns:
         Matplotlib Figure object
@@ -222,14 +748,17 @@ def create_ecg_plot(df: pd.DataFrame, hr_results: List[Dict], combined_hr: Dict,
     total_samples = len(sensor1)
     calculated_sampling_rate = total_samples / DURATION_SECONDS
     
-    fig, axes = plt.subplots(3, 1, figsize=(16, 10), sharex=True)
+    fig, axes = plt.subplots(3, 1, figsize=figsize, sharex=True)
     
     colors = ['#e74c3c', '#3498db', '#2ecc71']
-    sensors = [sensor1, sensor2, sensor3]
+    # Min/max envelope with a pair of points per pixel column at the 150 dpi
+    # the plot is saved at; drawing every sample gives the same image, slower
+    index, envelope = minmax_downsample(np.column_stack([sensor1, sensor2, sensor3]), int(figsize[0] * 150))
+    sensors = list(envelope.T)
     sensor_names = ['Sensor 1', 'Sensor 2', 'Sensor 3']
     
     for i, (sensor, name, color, hr) in enumerate(zip(sensors, sensor_names, colors, hr_results)):
-        axes[i].plot(sensor, linewidth=0.9, color=color)
+        axes[i].plot(index, sensor, linewidth=0.9, color=color)
         axes[i].set_ylabel(name, fontsize=12)
         axes[i].set_title(f"{name} — Avg HR: {hr['avg']:.2f} BPM | Min: {hr['min']:.2f} | Max: {hr['max']:.2f}", 
                           fontsize=12, fontweight='bold')
@@ -283,10 +812,11 @@ if __name__ == "__main__":
         print(f"Total Samples: {results['total_samples']}")
         print(f"Sampling Rate: {results['sampling_rate']:.2f} Hz")
         print("\n" + format_hr_results(results['hr_results'], results['combined_hr']))
+        print(f"Respiration: {results['respiration']['combined']:.1f} breaths/min")
         
         # Create and show plot
         fig = create_ecg_plot(
-            results['dataframe'], 
+            samples_dataframe(results['samples']),
             results['hr_results'], 
             results['combined_hr'],
             save_path="Heart Beat Plot.png"
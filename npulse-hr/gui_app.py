@@ -10,20 +10,36 @@ import base64
 import asyncio
 import threading
 import queue
-from io import BytesIO
 from datetime import datetime
-from flask import Flask, render_template_string, request, jsonify, send_file, Response
+from flask import Flask, render_template_string, request, jsonify, Response
 import matplotlib
 matplotlib.use('Agg')  # Non-GUI backend
-import matplotlib.pyplot as plt
+import numpy as np
 
 # Import our modules
-from ecg_processor import analyze_ecg_file, create_ecg_plot, format_hr_results
+from ecg_processor import PUBLIC_DETECTORS, PUBLIC_MODES, SENSOR_COLUMNS, analyze_ecg_file, format_hr_results, hr_trend
 from ble_handler import BLEHandler
+from recording_format import BINARY_EXTENSION, COMPRESSED_EXTENSION, DEFAULT_CODEC, convert_text_file
+from analysis_cache import AnalysisCache, file_cache_key
+from binary_transport import FRAME_MIMETYPE, compact_samples, encode_block, pack_frame
+from hrv import summarize_hrv
+from signal_quality import SQI_FIELDS
+from chart_downsample import PYRAMID_BASE, PYRAMID_FACTOR, build_pyramid, minmax_downsample, pyramid_range
+from plot_renderer import PLOT_SIZES, PLOT_THEMES, render_ecg_png
+from recording_writer import recover_partial_recordings
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'files'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
+app.config['RECORDING_FORMAT'] = 'npc'  # storage for new recordings: 'npc' (compressed), 'npb' or 'txt'
+app.config['ANALYSIS_CACHE_BYTES'] = 256 * 1024 * 1024  # in-memory result cache budget
+# Directory for the cache's disk tier, which survives restarts (None: memory only).
+# Entries are unpickled when read, so point it outside UPLOAD_FOLDER, where
+# anyone who can upload could place files
+app.config['ANALYSIS_CACHE_DIR'] = None
+
+# Recording formats accepted for listing, upload and analysis
+RECORDING_EXTENSIONS = ('.txt', BINARY_EXTENSION, COMPRESSED_EXTENSION)
 
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -31,6 +47,34 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 # Store last analysis results
 last_results = {}
 
+# Cache of analysis results and rendered plots shared by all clients
+analysis_cache = AnalysisCache(
+    max_bytes=app.config['ANALYSIS_CACHE_BYTES'],
+    disk_dir=app.config['ANALYSIS_CACHE_DIR']
+)
+
+# Pipeline options passed to analyze_ecg_file; part of the analysis cache key
+ANALYSIS_OPTIONS = {}
+
+# Part of the analysis cache key; bump when analyze_ecg_file adds or changes
+# result fields so results cached on disk by older versions are not reused
+ANALYSIS_VERSION = 10
+
+# Default /plot rendering options; width, height (inches) and dpi default to
+# the size's PLOT_SIZES entry. Part of the plot cache key
+PLOT_OPTIONS = {'format': 'png', 'size': 'full', 'theme': 'dark'}
+
+# Accepted /plot size (inches) and resolution
+PLOT_SIZE_RANGE = (0.25, 40)
+PLOT_DPI_RANGE = (20, 300)
+
+# Default and largest /chart-data and /chart-tiles width (pixels); each pixel is drawn by two points
+CHART_WIDTH = 1500
+MAX_CHART_WIDTH = 10000
+
+# Most windows an /hr-trend request may produce
+MAX_TREND_WINDOWS = 10000
+
 # BLE state
 ble_handler = None
 ble_data_queue = queue.Queue()
@@ -719,7 +763,7 @@ HTML_TEMPLATE = '''
         
         .chart-stats {
             display: grid;
-            grid-template-columns: repeat(4, 1fr);
+            grid-template-columns: repeat(5, 1fr);
             gap: 15px;
             margin-top: 20px;
         }
@@ -846,6 +890,10 @@ HTML_TEMPLATE = '''
                         <div class="value" id="samplingRate" style="color: #feca57;">-- Hz</div>
                         <div class="label">Sampling Rate</div>
                     </div>
+                    <div class="chart-stat">
+                        <div class="value" id="liveBpm" style="color: #ff6b9d;">--</div>
+                        <div class="label">Live HR (BPM)</div>
+                    </div>
                 </div>
             </div>
         </div>
@@ -861,7 +909,7 @@ HTML_TEMPLATE = '''
                     <button class="btn" onclick="document.getElementById('fileInput').click()">
                         Choose File
                     </button>
-                    <input type="file" id="fileInput" accept=".txt" onchange="handleFileSelect(event)">
+                    <input type="file" id="fileInput" accept=".txt,.npb,.npc" onchange="handleFileSelect(event)">
                 </div>
                 <div id="uploadStatus" class="status"></div>
             </div>
@@ -1015,6 +1063,22 @@ HTML_TEMPLATE = '''
                     </div>
                 </div>
                 
+                <!-- Heart rate over the recording -->
+                <div class="analysis-chart-container" id="trendContainer" style="display: none; min-height: 0;">
+                    <h3 style="color: #ffffff; margin-bottom: 12px;">📈 Heart Rate Trend</h3>
+                    <div style="position: relative; height: 260px;">
+                        <canvas id="trendChart"></canvas>
+                    </div>
+                </div>
+                
+                <!-- Signal quality per window and sensor -->
+                <div class="analysis-chart-container" id="sqiContainer" style="display: none; min-height: 0;">
+                    <h3 style="color: #ffffff; margin-bottom: 12px;">🩺 Signal Quality</h3>
+                    <div style="position: relative; height: 140px;">
+                        <canvas id="sqiChart"></canvas>
+                    </div>
+                </div>
+                
                 <div class="plot-container" id="plotContainer">
                 </div>
             </div>
@@ -1065,6 +1129,14 @@ HTML_TEMPLATE = '''
                         borderWidth: 1.5,
                         pointRadius: 0,
                         tension: 0.1
+                    },
+                    {
+                        label: 'Beats',
+                        data: [],
+                        borderColor: '#ffffff',
+                        backgroundColor: '#ffffff',
+                        showLine: false,
+                        pointRadius: 4
                     }
                 ]
             },
@@ -1219,6 +1291,7 @@ HTML_TEMPLATE = '''
             
             sampleStartTime = Date.now();
             totalSamples = 0;
+            document.getElementById('liveBpm').textContent = '--';
             
             document.getElementById('startBtn').disabled = true;
             document.getElementById('stopBtn').disabled = false;
@@ -1229,36 +1302,41 @@ HTML_TEMPLATE = '''
             statusDiv.innerHTML = '<span class="spinner"></span>Recording data...';
             
             // Start SSE stream
-            eventSource = new EventSource('/ble/stream?duration=' + duration);
+            // Samples arrive in base64 blocks of Int16 (see binary_transport.py)
+            eventSource = new EventSource('/ble/stream?encoding=base64&duration=' + duration);
             
             eventSource.onmessage = function(event) {
                 const data = JSON.parse(event.data);
                 
-                if (data.type === 'data') {
-                    totalSamples++;
-                    
-                    // Update chart
-                    realtimeChart.data.labels.push(totalSamples);
-                    realtimeChart.data.datasets[0].data.push(data.values[0]);
-                    realtimeChart.data.datasets[1].data.push(data.values[1]);
-                    realtimeChart.data.datasets[2].data.push(data.values[2]);
-                    
-                    // Keep only last N points
-                    if (realtimeChart.data.labels.length > maxDataPoints) {
-                        realtimeChart.data.labels.shift();
-                        realtimeChart.data.datasets.forEach(ds => ds.data.shift());
+                if (data.type === 'block') {
+                    // View the decoded bytes as rows of samples
+                    const bytes = Uint8Array.from(atob(data.values), c => c.charCodeAt(0));
+                    const values = new TYPED_ARRAYS[data.array](bytes.buffer);
+                    const labels = realtimeChart.data.labels;
+                    const datasets = realtimeChart.data.datasets;
+                    for (let row = 0; row < data.count; row++) {
+                        labels.push(data.start + row + 1);
+                        for (let ch = 0; ch < 3; ch++) {
+                            datasets[ch].data.push(values[row * data.channels + ch]);
+                        }
+                        datasets[3].data.push(null);
                     }
+                    totalSamples = data.start + data.count;
                     
-                    // Update every 10 samples for performance
-                    if (totalSamples % 10 === 0) {
-                        realtimeChart.update('none');
+                    // Keep only last N points
+                    const excess = labels.length - maxDataPoints;
+                    if (excess > 0) {
+                        labels.splice(0, excess);
+                        datasets.forEach(ds => ds.data.splice(0, excess));
                     }
+                    realtimeChart.update('none');
                     
-                    // Update stats
+                    // Update stats with the newest sample
+                    const newest = (data.count - 1) * data.channels;
                     document.getElementById('sampleCount').textContent = totalSamples;
-                    document.getElementById('sensor1Value').textContent = data.values[0];
-                    document.getElementById('sensor2Value').textContent = data.values[1];
-                    document.getElementById('sensor3Value').textContent = data.values[2];
+                    document.getElementById('sensor1Value').textContent = values[newest];
+                    document.getElementById('sensor2Value').textContent = values[newest + 1];
+                    document.getElementById('sensor3Value').textContent = values[newest + 2];
                     
                     // Calculate sampling rate
                     const elapsed = (Date.now() - sampleStartTime) / 1000;
@@ -1267,6 +1345,20 @@ HTML_TEMPLATE = '''
                         document.getElementById('samplingRate').textContent = rate + ' Hz';
                     }
                     
+                } else if (data.type === 'hr') {
+                    if (data.bpm) {
+                        document.getElementById('liveBpm').textContent = data.bpm.toFixed(0);
+                    }
+                    
+                    // Mark beats on their sensor trace (label n is sample index n - 1)
+                    const labels = realtimeChart.data.labels;
+                    data.beats.forEach(beat => {
+                        const pos = labels.length - totalSamples + beat.index;
+                        if (pos >= 0 && pos < labels.length) {
+                            realtimeChart.data.datasets[3].data[pos] = realtimeChart.data.datasets[beat.channel].data[pos];
+                        }
+                    });
+                    
                 } else if (data.type === 'complete') {
                     eventSource.close();
                     collectionComplete(data);
@@ -1431,30 +1523,52 @@ HTML_TEMPLATE = '''
                     });
                     
                     gridHtml += `
-                        <div class="result-box combined">
+                        <div class="result-box combined" title="${data.fusion.beats} fused beats, ${(100 * data.fusion.agreement).toFixed(0)}% found by every sensor">
                             <div class="value">${data.combined_hr.avg.toFixed(1)}</div>
                             <div class="label">Combined Avg HR (BPM)</div>
                         </div>
                     `;
                     
+                    // HRV per sensor (null where the recording is too short)
+                    const fmt = v => v === null || v === undefined ? '--' : v.toFixed(0);
+                    (data.hrv || []).forEach((hrv, i) => {
+                        gridHtml += `
+                            <div class="result-box ${sensorClasses[i]}" title="pNN50 ${fmt(hrv.pnn50)}%, SD1/SD2 ${fmt(hrv.sd1)}/${fmt(hrv.sd2)} ms, LF/HF ${hrv.lf_hf === null ? '--' : hrv.lf_hf.toFixed(2)}">
+                                <div class="value">${fmt(hrv.sdnn)} / ${fmt(hrv.rmssd)}</div>
+                                <div class="label">${sensors[i]} SDNN / RMSSD (ms)</div>
+                            </div>
+                        `;
+                    });
+                    
+                    // Breathing rate (0 where no breaths were found)
+                    const breaths = v => v ? v.toFixed(1) : '--';
+                    gridHtml += `
+                        <div class="result-box combined" title="${data.respiration.rate.map((rate, i) => `${sensors[i]}: ${breaths(rate)}`).join(', ')}">
+                            <div class="value">${breaths(data.respiration.combined)}</div>
+                            <div class="label">Respiration (breaths/min)</div>
+                        </div>
+                    `;
+                    
                     resultsGrid.innerHTML = gridHtml;
                     
-                    // Fetch chart data and render interactive chart
-                    fetch('/chart-data?t=' + Date.now())
-                    .then(res => res.json())
+                    loadHrTrend();
+                    loadSignalQuality();
+                    
+                    // Fetch chart data, reduced to the chart's pixel width, and render interactive chart
+                    fetchChartFrame(`/chart-data?width=${chartPixelWidth()}&t=${Date.now()}`)
                     .then(chartData => {
                         if (chartData.success) {
                             document.getElementById('analysisChartContainer').style.display = 'block';
                             plotContainer.innerHTML = '';
                             renderAnalysisChart(chartData);
                         } else {
-                            // Fallback to static image
-                            plotContainer.innerHTML = `<img src="/plot?t=${Date.now()}" alt="ECG Plot">`;
+                            // Fallback to static image; one URL per recording, revalidated by ETag
+                            plotContainer.innerHTML = `<img src="/plot?recording=${encodeURIComponent(data.filename)}" alt="ECG Plot">`;
                         }
                     })
                     .catch(() => {
                         // Fallback to static image
-                        plotContainer.innerHTML = `<img src="/plot?t=${Date.now()}" alt="ECG Plot">`;
+                        plotContainer.innerHTML = `<img src="/plot?recording=${encodeURIComponent(data.filename)}" alt="ECG Plot">`;
                     });
                     
                 } else {
@@ -1468,6 +1582,145 @@ HTML_TEMPLATE = '''
             });
         }
         
+        // HR trend chart for the analyzed recording
+        let trendChart = null;
+        
+        function loadHrTrend() {
+            fetch('/hr-trend?t=' + Date.now())
+            .then(res => res.json())
+            .then(trend => {
+                const container = document.getElementById('trendContainer');
+                if (!trend.success || trend.time.length < 2) {
+                    container.style.display = 'none';
+                    return;
+                }
+                container.style.display = 'block';
+                
+                // Label each window by its center as m:ss
+                const labels = trend.time.map(t => {
+                    const center = Math.round(t + trend.window / 2);
+                    return Math.floor(center / 60) + ':' + String(center % 60).padStart(2, '0');
+                });
+                const colors = ['#e74c3c', '#3498db', '#2ecc71'];
+                const datasets = [{
+                    label: 'Combined',
+                    data: trend.combined,
+                    borderColor: '#ffffff',
+                    borderWidth: 2.5,
+                    pointRadius: 0,
+                    tension: 0.3
+                }];
+                trend.bpm.forEach((series, i) => {
+                    datasets.push({
+                        label: 'Sensor ' + (i + 1),
+                        data: series,
+                        borderColor: colors[i],
+                        borderWidth: 1,
+                        pointRadius: 0,
+                        tension: 0.3
+                    });
+                });
+                
+                if (trendChart) {
+                    trendChart.destroy();
+                }
+                trendChart = new Chart(document.getElementById('trendChart').getContext('2d'), {
+                    type: 'line',
+                    data: {labels: labels, datasets: datasets},
+                    options: {
+                        responsive: true,
+                        maintainAspectRatio: false,
+                        animation: false,
+                        scales: {
+                            x: {ticks: {color: '#888', maxTicksLimit: 12}, grid: {color: 'rgba(255,255,255,0.05)'}},
+                            y: {title: {display: true, text: 'BPM', color: '#888'}, ticks: {color: '#888'},
+                                grid: {color: 'rgba(255,255,255,0.1)'}}
+                        },
+                        plugins: {
+                            legend: {labels: {color: '#eaeaea'}},
+                            tooltip: {
+                                callbacks: {
+                                    afterLabel: ctx => ctx.datasetIndex > 0
+                                        ? 'Beats: ' + trend.beats[ctx.datasetIndex - 1][ctx.dataIndex] +
+                                          ', quality: ' + Math.round(100 * trend.quality[ctx.datasetIndex - 1][ctx.dataIndex]) + '%'
+                                        : ''
+                                }
+                            }
+                        }
+                    }
+                });
+            })
+            .catch(() => {
+                document.getElementById('trendContainer').style.display = 'none';
+            });
+        }
+        
+        let sqiChart = null;
+        
+        function loadSignalQuality() {
+            fetch('/sqi?t=' + Date.now())
+            .then(res => res.json())
+            .then(sqi => {
+                const container = document.getElementById('sqiContainer');
+                if (!sqi.success || !sqi.time.length) {
+                    container.style.display = 'none';
+                    return;
+                }
+                container.style.display = 'block';
+                
+                const labels = sqi.time.map(t => {
+                    const start = Math.round(t);
+                    return Math.floor(start / 60) + ':' + String(start % 60).padStart(2, '0');
+                });
+                // One stacked segment per sensor: its colour when usable, grey when masked
+                const colors = ['#e74c3c', '#3498db', '#2ecc71'];
+                const datasets = sqi.good.map((good, i) => ({
+                    label: 'Sensor ' + (i + 1),
+                    data: good.map(() => 1),
+                    backgroundColor: good.map(ok => ok ? colors[i] : '#444'),
+                    barPercentage: 1.0,
+                    categoryPercentage: 1.0
+                }));
+                
+                if (sqiChart) {
+                    sqiChart.destroy();
+                }
+                sqiChart = new Chart(document.getElementById('sqiChart').getContext('2d'), {
+                    type: 'bar',
+                    data: {labels: labels, datasets: datasets},
+                    options: {
+                        responsive: true,
+                        maintainAspectRatio: false,
+                        animation: false,
+                        scales: {
+                            x: {stacked: true, ticks: {color: '#888', maxTicksLimit: 12}, grid: {display: false}},
+                            y: {stacked: true, display: false}
+                        },
+                        plugins: {
+                            legend: {labels: {color: '#eaeaea'}},
+                            tooltip: {
+                                callbacks: {
+                                    label: ctx => {
+                                        const i = ctx.datasetIndex, j = ctx.dataIndex;
+                                        if (!sqi.analyzed.includes(i)) {
+                                            return 'Sensor ' + (i + 1) + ' not analyzed';
+                                        }
+                                        return 'Sensor ' + (i + 1) + (sqi.good[i][j] ? ' usable' : ' masked') +
+                                            ': spread ' + sqi.flatline[i][j] + 'x, clipped ' +
+                                            Math.round(100 * sqi.clipping[i][j]) + '%, kurtosis ' + sqi.kurtosis[i][j] +
+                                            ', in HR band ' + Math.round(100 * sqi.concentration[i][j]) + '%';
+                                    }
+                                }
+                            }
+                        }
+                    }
+                });
+            })
+            .catch(() => {
+                document.getElementById('sqiContainer').style.display = 'none';
+            });
+        }
+        
         // Analysis Chart instance and ECG state
         let analysisChart = null;
         let ecgState = {
@@ -1479,9 +1732,17 @@ HTML_TEMPLATE = '''
             gain: 1,
             visibleSensors: [true, true, true],
             currentPosition: 0,
-            zoomLevel: 100
+            zoomLevel: 100,
+            viewData: null  // envelope currently plotted (whole recording or viewport)
         };
         
+        // Pixels the analysis chart spans; the server sends a min/max pair per pixel
+        function chartPixelWidth() {
+            const canvas = document.getElementById('analysisChart');
+            const width = canvas.parentElement ? canvas.parentElement.clientWidth : 0;
+            return Math.max(200, Math.round((width || 1500) * (window.devicePixelRatio || 1)));
+        }
+        
         function renderAnalysisChart(chartData) {
             const ctx = document.getElementById('analysisChart').getContext('2d');
             
@@ -1493,40 +1754,20 @@ HTML_TEMPLATE = '''
             // Store raw data for controls
             ecgState.rawData = chartData;
             ecgState.samplingRate = chartData.sampling_rate || 100;
-            ecgState.totalSamples = chartData.labels.length;
+            ecgState.totalSamples = chartData.total_samples;
             ecgState.duration = ecgState.totalSamples / ecgState.samplingRate;
             
             // Update ECG info display
             updateECGInfo();
             updateMeasurements(chartData);
             
-            // Downsample data for better performance if too many points
-            const maxPoints = 3000;
-            let sensor1 = chartData.sensor1;
-            let sensor2 = chartData.sensor2;
-            let sensor3 = chartData.sensor3;
-            let labels = chartData.labels;
-            
-            // Convert labels to time in seconds
-            let timeLabels = labels.map((_, i) => (i / ecgState.samplingRate).toFixed(2));
-            
-            if (labels.length > maxPoints) {
-                const step = Math.ceil(labels.length / maxPoints);
-                sensor1 = sensor1.filter((_, i) => i % step === 0);
-                sensor2 = sensor2.filter((_, i) => i % step === 0);
-                sensor3 = sensor3.filter((_, i) => i % step === 0);
-                timeLabels = timeLabels.filter((_, i) => i % step === 0);
-            }
-            
-            // Apply gain
-            sensor1 = sensor1.map(v => v * ecgState.gain);
-            sensor2 = sensor2.map(v => v * ecgState.gain);
-            sensor3 = sensor3.map(v => v * ecgState.gain);
+            // Already reduced server-side to a min/max envelope of the chart width
+            ecgState.viewData = chartData;
+            const [sensor1, sensor2, sensor3] = [0, 1, 2].map(i => chartPoints(chartData, i));
             
             analysisChart = new Chart(ctx, {
                 type: 'line',
                 data: {
-                    labels: timeLabels,
                     datasets: [
                         {
                             label: 'Sensor 1 (Lead I)',
@@ -1575,6 +1816,7 @@ HTML_TEMPLATE = '''
                     },
                     scales: {
                         x: {
+                            type: 'linear',
                             display: true,
                             title: {
                                 display: true,
@@ -1589,8 +1831,8 @@ HTML_TEMPLATE = '''
                             ticks: {
                                 color: '#aaa',
                                 maxTicksLimit: 15,
-                                callback: function(value, index) {
-                                    return this.getLabelForValue(value) + 's';
+                                callback: function(value) {
+                                    return Number(value).toFixed(2) + 's';
                                 }
                             }
                         },
@@ -1632,11 +1874,11 @@ HTML_TEMPLATE = '''
                             titleFont: { weight: 'bold' },
                             callbacks: {
                                 title: function(context) {
-                                    return '⏱️ Time: ' + context[0].label + 's';
+                                    return '⏱️ Time: ' + context[0].parsed.x.toFixed(2) + 's';
                                 },
                                 label: function(context) {
                                     const sensorNames = ['🔴 Sensor 1', '🔵 Sensor 2', '🟢 Sensor 3'];
-                                    return sensorNames[context.datasetIndex] + ': ' + context.raw.toFixed(1) + ' mV';
+                                    return sensorNames[context.datasetIndex] + ': ' + context.parsed.y.toFixed(1) + ' mV';
                                 }
                             }
                         },
@@ -1673,6 +1915,77 @@ HTML_TEMPLATE = '''
             document.getElementById('analysisChart').addEventListener('dblclick', resetAnalysisZoom);
         }
         
+        // Chart points come as a binary frame (see binary_transport.py): a
+        // uint32 header length, a JSON header and 8-byte aligned arrays that
+        // are viewed in place as typed arrays; errors still come as JSON
+        const TYPED_ARRAYS = {Int16Array, Int32Array, Uint32Array, Float32Array, Float64Array};
+        function fetchChartFrame(url) {
+            return fetch(url, {headers: {'Accept': 'application/octet-stream'}})
+            .then(res => {
+                if (!(res.headers.get('Content-Type') || '').startsWith('application/octet-stream')) {
+                    return res.json();
+                }
+                return res.arrayBuffer().then(decodeChartFrame);
+            });
+        }
+        
+        // Same fields as the JSON response, with typed arrays for the lists
+        function decodeChartFrame(buffer) {
+            const length = new DataView(buffer).getUint32(0, true);
+            const data = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, length)));
+            const arraysStart = Math.ceil((4 + length) / 8) * 8;
+            data.arrays.forEach(entry => {
+                data[entry.name] = new TYPED_ARRAYS[entry.type](buffer, arraysStart + entry.offset, entry.length);
+            });
+            delete data.arrays;
+            data.labels = data.index;
+            data.time = Float64Array.from(data.index, i => i / data.sampling_rate);
+            return data;
+        }
+        
+        // Chart points of one sensor, with the gain applied
+        function chartPoints(data, index) {
+            const values = data['sensor' + (index + 1)];
+            return Array.from(data.time, (t, j) => ({x: t, y: values[j] * ecgState.gain}));
+        }
+        
+        // Replace the plotted envelope without rebuilding the chart
+        function setChartSeries(data) {
+            ecgState.viewData = data;
+            if (!analysisChart) return;
+            analysisChart.data.datasets.forEach((dataset, i) => {
+                dataset.data = chartPoints(data, i);
+            });
+            analysisChart.update('none');
+        }
+        
+        // Fetch the envelope of the visible range at the chart's resolution once
+        // zooming or panning pauses; half a viewport either side is included so
+        // a pan shows data before the next response arrives
+        let viewportTimer = null;
+        let viewportRequest = 0;
+        function refreshViewport() {
+            clearTimeout(viewportTimer);
+            viewportTimer = setTimeout(() => {
+                if (!analysisChart) return;
+                const xScale = analysisChart.scales.x;
+                const span = parseFloat(xScale.max) - parseFloat(xScale.min);
+                if (!(span > 0)) return;
+                const start = Math.max(0, parseFloat(xScale.min) - span / 2);
+                const end = Math.min(ecgState.duration, parseFloat(xScale.max) + span / 2);
+                const width = Math.min(Math.round(chartPixelWidth() * (end - start) / span), 10000);  // MAX_CHART_WIDTH
+                const request = ++viewportRequest;
+                fetchChartFrame(`/chart-tiles?start=${start}&end=${end}&width=${width}`)
+                .then(data => {
+                    // A later zoom or pan has superseded this request
+                    if (data.success && request === viewportRequest) {
+                        setChartSeries(data);
+                    }
+                })
+                .catch(() => {});
+            }, 100);
+        }
+        
         // Update ECG info display
         function updateECGInfo() {
             document.getElementById('ecgTotalSamples').textContent = ecgState.totalSamples.toLocaleString();
@@ -1687,13 +2000,9 @@ HTML_TEMPLATE = '''
         function updateMeasurements(data) {
             if (!data) return;
             
-            const s1Max = Math.max(...data.sensor1);
-            const s2Max = Math.max(...data.sensor2);
-            const s3Max = Math.max(...data.sensor3);
-            
-            const s1Avg = data.sensor1.reduce((a, b) => a + b, 0) / data.sensor1.length;
-            const s2Avg = data.sensor2.reduce((a, b) => a + b, 0) / data.sensor2.length;
-            const s3Avg = data.sensor3.reduce((a, b) => a + b, 0) / data.sensor3.length;
+            // Whole-recording statistics from the server
+            const [s1Max, s2Max, s3Max] = data.stats.max;
+            const [s1Avg, s2Avg, s3Avg] = data.stats.mean;
             
             document.getElementById('ecgS1Peak').innerHTML = s1Max.toFixed(0) + '<span class="ecg-measurement-unit">mV</span>';
             document.getElementById('ecgS2Peak').innerHTML = s2Max.toFixed(0) + '<span class="ecg-measurement-unit">mV</span>';
@@ -1720,6 +2029,8 @@ HTML_TEMPLATE = '''
             // Update slider
             const sliderPos = (parseFloat(xScale.min) / fullRange) * 100;
             document.getElementById('ecgTimeSlider').value = Math.max(0, Math.min(100, sliderPos));
+            
+            refreshViewport();
         }
         
         // Paper Speed Control
@@ -1752,9 +2063,9 @@ HTML_TEMPLATE = '''
                 btn.classList.toggle('active', parseFloat(btn.dataset.gain) === gain);
             });
             
-            // Re-render chart with new gain if data exists
-            if (ecgState.rawData) {
-                renderAnalysisChart(ecgState.rawData);
+            // Rescale the plotted envelope if data exists
+            if (ecgState.viewData) {
+                setChartSeries(ecgState.viewData);
             }
         }
         
@@ -1871,14 +2182,23 @@ HTML_TEMPLATE = '''
                 return;
             }
             
-            const data = ecgState.rawData;
-            let csv = 'Time(s),Sensor1,Sensor2,Sensor3\\n';
-            
-            for (let i = 0; i < data.labels.length; i++) {
-                const time = (i / ecgState.samplingRate).toFixed(4);
-                csv += `${time},${data.sensor1[i]},${data.sensor2[i]},${data.sensor3[i]}\\n`;
-            }
-            
+            // The chart holds a reduced envelope; export every sample
+            fetchChartFrame('/chart-data?width=0&t=' + Date.now())
+            .then(data => {
+                if (!data.success) {
+                    alert('Export failed: ' + data.error);
+                    return;
+                }
+                let csv = 'Time(s),Sensor1,Sensor2,Sensor3\\n';
+                for (let i = 0; i < data.labels.length; i++) {
+                    const time = (data.labels[i] / data.sampling_rate).toFixed(4);
+                    csv += `${time},${data.sensor1[i]},${data.sensor2[i]},${data.sensor3[i]}\\n`;
+                }
+                saveCsv(csv);
+            });
+        }
+        
+        function saveCsv(csv) {
             const blob = new Blob([csv], { type: 'text/csv' });
             const url = URL.createObjectURL(blob);
             const a = document.createElement('a');
@@ -1916,7 +2236,7 @@ def list_files():
     
     if os.path.exists(files_dir):
         for filename in sorted(os.listdir(files_dir), reverse=True):
-            if filename.endswith('.txt'):
+            if filename.endswith(RECORDING_EXTENSIONS):
                 filepath = os.path.join(files_dir, filename)
                 files.append({
                     'name': filename,
@@ -1937,18 +2257,48 @@ def upload_file():
     if file.filename == '':
         return jsonify({'success': False, 'error': 'No file selected'})
     
-    if file and file.filename.endswith('.txt'):
+    if file and file.filename.endswith(RECORDING_EXTENSIONS):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"uploaded_{timestamp}_{file.filename}"
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
+        
+        # Store text uploads in the configured binary format
+        storage = app.config['RECORDING_FORMAT']
+        if filename.endswith('.txt') and storage != 'txt':
+            try:
+                converted = convert_text_file(filepath, codec=DEFAULT_CODEC if storage == 'npc' else None)
+            except ValueError as e:
+                # Values beyond int16 only fit the text format: keep the upload as it is
+                print(f"Keeping {filename} as text: {e}")
+                converted = None
+            if converted:
+                os.remove(filepath)
+                filepath = converted
+                filename = os.path.basename(converted)
+        
         return jsonify({
             'success': True, 
             'filename': filename,
             'filepath': filepath
         })
     
-    return jsonify({'success': False, 'error': 'Invalid file type. Only .txt files allowed.'})
+    return jsonify({'success': False, 'error': 'Invalid file type. Only .txt, .npb and .npc files allowed.'})
+
+
+def render_plot_png(results: dict, options: dict) -> bytes:
+    """Render the static ECG plot for analysis results to PNG bytes."""
+    return render_ecg_png(
+        results['samples'],
+        results['hr_results'],
+        results['combined_hr'],
+        results['sampling_rate'],
+        size=options['size'],
+        theme=options['theme'],
+        width=options['width'],
+        height=options['height'],
+        dpi=options['dpi']
+    )
 
 
 @app.route('/analyze', methods=['POST'])
@@ -1962,28 +2312,37 @@ def analyze():
     if not filepath or not os.path.exists(filepath):
         return jsonify({'success': False, 'error': 'File not found'})
     
+    options = dict(ANALYSIS_OPTIONS)
+    if data.get('detector'):
+        if data['detector'] not in PUBLIC_DETECTORS:
+            return jsonify({'success': False, 'error': f"Unknown detector: {data['detector']}"})
+        options['detector'] = data['detector']
+    if data.get('mode'):
+        if data['mode'] not in PUBLIC_MODES:
+            return jsonify({'success': False, 'error': f"Unknown mode: {data['mode']}"})
+        options['mode'] = data['mode']
+    if data.get('top_channels'):
+        try:
+            options['top_channels'] = int(data['top_channels'])
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'top_channels must be a whole number'})
+        if options['top_channels'] < 1:
+            return jsonify({'success': False, 'error': 'top_channels must be at least 1'})
+    
     try:
-        results = analyze_ecg_file(filepath)
+        results = analysis_cache.get_or_compute(
+            file_cache_key(filepath, 'analysis', version=ANALYSIS_VERSION, **options),
+            lambda: analyze_ecg_file(filepath, **options)
+        )
         
         if not results:
             return jsonify({'success': False, 'error': 'Could not analyze file. Check data format.'})
         
-        fig = create_ecg_plot(
-            results['dataframe'],
-            results['hr_results'],
-            results['combined_hr']
-        )
-        
-        buf = BytesIO()
-        fig.savefig(buf, format='png', dpi=100, bbox_inches='tight', 
-                   facecolor='#1a1a2e', edgecolor='none')
-        buf.seek(0)
-        plt.close(fig)
-        
+        # The static plot is rendered by /plot when first requested
         last_results = {
-            'plot_data': buf.getvalue(),
             'results': results,
-            'df': results['dataframe']
+            'filepath': filepath,
+            'options': options
         }
         
         return jsonify({
@@ -1992,58 +2351,294 @@ def analyze():
             'total_samples': results['total_samples'],
             'sampling_rate': results['sampling_rate'],
             'hr_results': results['hr_results'],
-            'combined_hr': results['combined_hr']
+            'combined_hr': results['combined_hr'],
+            'hrv': [summarize_hrv(metrics) for metrics in results.get('hrv', [])],
+            'analyzed_channels': results['analyzed_channels'],
+            # Fast mode falls back to beats on recordings without a clear rhythm
+            'mode': results.get('mode', options.get('mode', 'beats')),
+            'fusion': {
+                'beats': len(results['fusion']['beats']),
+                # Share of consensus beats every analyzed sensor found
+                'agreement': round(float(np.mean(results['fusion']['confidence'] == 1)), 3)
+                if len(results['fusion']['beats']) else 0.0
+            },
+            'respiration': {
+                'rate': [round(rate, 1) for rate in results['respiration']['rate']],
+                'combined': round(results['respiration']['combined'], 1)
+            },
+            'cache': analysis_cache.stats()
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
 
+@app.route('/cache/stats')
+def cache_stats():
+    """Return analysis cache hit/miss counters."""
+    return jsonify({'success': True, 'cache': analysis_cache.stats()})
+
+
 @app.route('/plot')
 def get_plot():
-    """Return the last generated plot."""
+    """
+    Return the static plot of the last analysis as PNG, rendered on demand.
+    
+    Query parameters size ('full', 'thumbnail' or 'sparkline'), theme (a
+    key of PLOT_THEMES) and width, height (inches) and dpi override
+    PLOT_OPTIONS and the size's dimensions. Renders are kept in the analysis
+    cache under the recording, its analysis options and the render options;
+    that key is also the ETag, so a request whose If-None-Match matches gets
+    304 Not Modified without rendering or reading the cache.
+    """
     global last_results
     
-    if 'plot_data' not in last_results:
+    if 'results' not in last_results:
         return "No plot available", 404
     
-    return send_file(
-        BytesIO(last_results['plot_data']),
-        mimetype='image/png'
-    )
+    options = dict(PLOT_OPTIONS)
+    options['size'] = request.args.get('size', options['size'])
+    if options['size'] not in PLOT_SIZES:
+        return f"Unknown size: {options['size']}", 400
+    options.update(PLOT_SIZES[options['size']])
+    try:
+        for name in ('width', 'height'):
+            options[name] = float(request.args.get(name, options[name]))
+        options['dpi'] = int(request.args.get('dpi', options['dpi']))
+    except ValueError:
+        return "width, height and dpi must be numbers", 400
+    options['theme'] = request.args.get('theme', options['theme'])
+    if not all(PLOT_SIZE_RANGE[0] <= options[name] <= PLOT_SIZE_RANGE[1] for name in ('width', 'height')):
+        return f"width and height must be between {PLOT_SIZE_RANGE[0]} and {PLOT_SIZE_RANGE[1]} inches", 400
+    if not PLOT_DPI_RANGE[0] <= options['dpi'] <= PLOT_DPI_RANGE[1]:
+        return f"dpi must be between {PLOT_DPI_RANGE[0]} and {PLOT_DPI_RANGE[1]}", 400
+    if options['theme'] not in PLOT_THEMES:
+        return f"Unknown theme: {options['theme']}", 400
+    
+    key = file_cache_key(last_results['filepath'], 'plot', version=ANALYSIS_VERSION,
+                         analysis=sorted(last_results['options'].items()), **options)
+    if key and key in request.if_none_match:
+        response = Response(status=304)
+    else:
+        results = last_results['results']
+        try:
+            png = analysis_cache.get_or_compute(key, lambda: render_plot_png(results, options))
+        except ValueError as e:
+            return f"No plot available: {e}", 404
+        response = Response(png, mimetype='image/png')
+    if key:
+        response.set_etag(key)
+        # Revalidate on every use; a matching ETag costs a 304 and no bytes
+        response.cache_control.no_cache = True
+    return response
 
 
 @app.route('/chart-data')
 def get_chart_data():
-    """Return the chart data as JSON for interactive plotting."""
+    """
+    Return the chart data of the last analysis as JSON for interactive plotting.
+    
+    Query parameters start and end (seconds) select a time range (default:
+    the whole recording) and width the chart width in pixels; ranges with
+    more than two samples per pixel are reduced to a per-pixel min/max
+    envelope, so peaks survive and the payload stays at 2 * width points.
+    width=0 returns every sample of the range.
+    """
     global last_results
     
-    if 'df' not in last_results:
+    if 'results' not in last_results:
         return jsonify({'success': False, 'error': 'No data available'})
     
+    results = last_results['results']
+    samples = results['samples']
+    sampling_rate = results.get('sampling_rate') or 100
     try:
-        df = last_results['df']
-        
-        # Convert dataframe columns to lists for JSON serialization
-        # Column names from ecg_processor.py are: line_1, line_2, line_3
-        sensor1 = df['line_1'].tolist() if 'line_1' in df.columns else []
-        sensor2 = df['line_2'].tolist() if 'line_2' in df.columns else []
-        sensor3 = df['line_3'].tolist() if 'line_3' in df.columns else []
-        
-        # Create sample index labels
-        labels = list(range(len(sensor1)))
-        
-        return jsonify({
+        width = int(request.args.get('width', CHART_WIDTH))
+        start = float(request.args.get('start', 0))
+        end = float(request.args.get('end', len(samples) / sampling_rate))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'width, start and end must be numbers'})
+    if not 0 <= width <= MAX_CHART_WIDTH:
+        return jsonify({'success': False, 'error': f'width must be between 0 and {MAX_CHART_WIDTH}'})
+    if not (np.isfinite(start) and np.isfinite(end)):
+        return jsonify({'success': False, 'error': 'start and end must be finite'})
+    if not end > start:
+        return jsonify({'success': False, 'error': 'end must be after start'})
+    
+    first = max(int(np.floor(start * sampling_rate)), 0)
+    last = min(int(np.ceil(end * sampling_rate)) + 1, len(samples))
+    if width:
+        index, values = minmax_downsample(samples, width, first, last)
+    else:
+        index, values = np.arange(first, last), samples[first:last]
+    
+    return _chart_response(index, values, {
+        'downsampled': len(index) < last - first,
+        'total_samples': len(samples),
+        # Whole-recording statistics, computed once during analysis; the
+        # envelope keeps the peaks but not the mean
+        'stats': results['sample_stats'],
+        'sampling_rate': sampling_rate
+    })
+
+
+@app.route('/chart-tiles')
+def get_chart_tiles():
+    """
+    Return the min/max envelope of a viewport of the last analysis.
+    
+    Query parameters start and end (seconds) and width (pixels) as for
+    /chart-data. The envelope is served from a min/max pyramid built once
+    per recording and kept in the analysis cache, so a zoom or pan costs
+    time in proportion to the width, not to the visible range; the range is
+    widened to whole buckets of the pyramid level it comes from.
+    """
+    # /analyze may replace last_results while the pyramid is built; bind this
+    # recording's state once so its pyramid is never stored on another one
+    state = last_results
+    if 'results' not in state:
+        return jsonify({'success': False, 'error': 'No data available'})
+    
+    results = state['results']
+    samples = results['samples']
+    sampling_rate = results.get('sampling_rate') or 100
+    try:
+        width = int(request.args.get('width', CHART_WIDTH))
+        start = float(request.args.get('start', 0))
+        end = float(request.args.get('end', len(samples) / sampling_rate))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'width, start and end must be numbers'})
+    if not 1 <= width <= MAX_CHART_WIDTH:
+        return jsonify({'success': False, 'error': f'width must be between 1 and {MAX_CHART_WIDTH}'})
+    if not (np.isfinite(start) and np.isfinite(end)):
+        return jsonify({'success': False, 'error': 'start and end must be finite'})
+    if not end > start:
+        return jsonify({'success': False, 'error': 'end must be after start'})
+    
+    if 'pyramid' not in state:
+        state['pyramid'] = analysis_cache.get_or_compute(
+            file_cache_key(state['filepath'], 'pyramid', base=PYRAMID_BASE, factor=PYRAMID_FACTOR),
+            lambda: build_pyramid(samples)
+        )
+    first = max(int(np.floor(start * sampling_rate)), 0)
+    last = min(int(np.ceil(end * sampling_rate)) + 1, len(samples))
+    index, values, size = pyramid_range(state['pyramid'], samples, width, first, last)
+    
+    return _chart_response(index, values, {
+        'bucket': size,
+        'start': first / sampling_rate,
+        'end': last / sampling_rate,
+        'total_samples': len(samples),
+        'sampling_rate': sampling_rate
+    })
+
+
+def _chart_response(index: np.ndarray, values: np.ndarray, fields: dict) -> Response:
+    """
+    Chart points as JSON or, when the client accepts it, as a binary frame.
+    
+    JSON carries 'sensor1'.. 'sensor3' and the sample index and time of each
+    point as number lists. The frame (binary_transport) carries the index as
+    a Uint32Array and each sensor as an Int16Array (Float32Array for values
+    beyond int16) behind the same scalar fields; the client derives the time
+    from the index and sampling_rate.
+    """
+    negotiated = request.accept_mimetypes.best_match(['application/json', FRAME_MIMETYPE])
+    if negotiated == FRAME_MIMETYPE:
+        values = compact_samples(values)
+        arrays = {'index': index.astype(np.uint32)}
+        arrays.update({f'sensor{i + 1}': values[:, i] for i in range(len(SENSOR_COLUMNS))})
+        response = Response(pack_frame({'success': True, **fields}, arrays), mimetype=FRAME_MIMETYPE)
+    else:
+        response = jsonify({
             'success': True,
-            'sensor1': sensor1,
-            'sensor2': sensor2,
-            'sensor3': sensor3,
-            'labels': labels,
-            'sampling_rate': last_results['results'].get('sampling_rate', 100) if 'results' in last_results else 100
+            **{f'sensor{i + 1}': values[:, i].tolist() for i in range(len(SENSOR_COLUMNS))},
+            'labels': index.tolist(),
+            'time': _json_series(index / fields['sampling_rate'], 4),
+            **fields
         })
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+    response.vary.add('Accept')
+    return response
+
+
+def _json_series(values: np.ndarray, decimals: int = 2) -> list:
+    """Round an array for JSON, with NaN as null."""
+    rounded = np.round(values.astype(np.float64), decimals)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
+
+
+@app.route('/hr-trend')
+def get_hr_trend():
+    """
+    Return the windowed HR trend of the last analysis.
+    
+    Query parameters window and hop (seconds) override the defaults computed
+    during analysis; the trend is recomputed from the cached beat indices.
+    """
+    global last_results
+    
+    if 'results' not in last_results:
+        return jsonify({'success': False, 'error': 'No data available'})
+    
+    results = last_results['results']
+    if 'hr_trend' not in results:
+        # Result cached on disk by a version without trends
+        return jsonify({'success': False, 'error': 'No HR trend for this analysis'})
+    trend = results['hr_trend']
+    try:
+        window = float(request.args.get('window', trend['window']))
+        hop = float(request.args.get('hop', trend['hop']))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'window and hop must be numbers'})
+    fs = trend['fs']
+    if not (np.isfinite(window) and np.isfinite(hop)):
+        return jsonify({'success': False, 'error': 'window and hop must be finite'})
+    if not hop * fs >= 1:
+        return jsonify({'success': False, 'error': 'hop must be at least one sample'})
+    if not hop <= window <= max(results['total_samples'], 1) / fs:
+        return jsonify({'success': False, 'error': 'window must be between hop and the recording length'})
+    n_windows = max(results['total_samples'] - int(round(window * fs)), 0) // int(round(hop * fs)) + 1
+    if n_windows > MAX_TREND_WINDOWS:
+        return jsonify({'success': False, 'error': f'window and hop give {n_windows} windows; '
+                                                   f'at most {MAX_TREND_WINDOWS} are allowed'})
+    
+    if (window, hop) != (trend['window'], trend['hop']):
+        trend = hr_trend(results['peaks'], results['total_samples'], fs, window, hop,
+                         fusion=results.get('fusion'))
+    
+    return jsonify({
+        'success': True,
+        'window': trend['window'],
+        'hop': trend['hop'],
+        'time': _json_series(trend['time']),
+        'bpm': [_json_series(column) for column in trend['bpm'].T],
+        'beats': trend['beats'].T.tolist(),
+        'quality': [_json_series(column) for column in trend['quality'].T],
+        'combined': _json_series(trend['combined'])
+    })
+
+
+@app.route('/sqi')
+def get_signal_quality():
+    """Return the per-window signal quality indices of the last analysis."""
+    global last_results
+    
+    if 'results' not in last_results:
+        return jsonify({'success': False, 'error': 'No data available'})
+    
+    quality = last_results['results'].get('sqi')
+    if quality is None:
+        return jsonify({'success': False, 'error': 'No signal quality for this analysis'})
+    
+    return jsonify({
+        'success': True,
+        'window': quality['window'],
+        'hop': quality['hop'],
+        'time': _json_series(quality['time']),
+        'good': quality['good'].T.tolist(),
+        'analyzed': last_results['results'].get('analyzed_channels', list(range(quality['good'].shape[1]))),
+        **{key: [_json_series(column) for column in quality[key].T] for key in SQI_FIELDS}
+    })
 
 
 # ==================== BLE Endpoints ====================
@@ -2142,36 +2737,35 @@ def ble_stop():
 
 @app.route('/ble/stream')
 def ble_stream():
-    """Server-Sent Events stream for real-time data."""
+    """
+    Server-Sent Events stream for real-time data.
+    
+    Samples are sent as one 'data' event per sample with a JSON values list,
+    or with encoding=base64 as 'block' events carrying every sample read
+    since the previous event as a base64 Int16Array (binary_transport).
+    """
     global ble_handler, ble_status
     
     duration = int(request.args.get('duration', 60))
+    encoding = request.args.get('encoding', 'json')
+    if encoding not in ('json', 'base64'):
+        return jsonify({'success': False, 'error': f'Unknown encoding: {encoding}'})
     
     def generate():
         if not ble_handler or not ble_handler.is_connected:
             yield f"data: {json.dumps({'type': 'error', 'message': 'Not connected'})}\n\n"
             return
         
-        data_buffer = []
         collection_done = threading.Event()
         collection_error = [None]
         
-        def on_data(line):
-            try:
-                parts = line.split(',')
-                if len(parts) >= 3:
-                    values = [int(p.strip()) for p in parts[:3]]
-                    data_buffer.append(values)
-            except:
-                pass
-        
         def collect_thread():
             try:
                 # This now uses the handler's internal event loop
                 ble_handler.start_data_collection(
                     duration_seconds=duration,
                     command="1",
-                    data_callback=on_data
+                    record_format=app.config['RECORDING_FORMAT']
                 )
             except Exception as e:
                 collection_error[0] = str(e)
@@ -2179,25 +2773,34 @@ def ble_stream():
             finally:
                 collection_done.set()
         
+        # Drop the previous session so the cursors below only see new samples and beats
+        ble_handler.store.clear()
+        ble_handler.live_hr.reset()
         thread = threading.Thread(target=collect_thread)
         thread.start()
         
-        last_sent = 0
-        while not collection_done.is_set():
-            # Send any new data
-            while last_sent < len(data_buffer):
-                values = data_buffer[last_sent]
-                yield f"data: {json.dumps({'type': 'data', 'values': values})}\n\n"
-                last_sent += 1
-            
+        # Read new samples straight from the handler's store, followed by the
+        # beats the live detector has confirmed (taken first, so every beat
+        # refers to a sample already sent)
+        cursor = beat_cursor = 0
+        while True:
+            done = collection_done.is_set()
+            beats, beat_cursor = ble_handler.live_hr.beats_since(beat_cursor)
+            samples, _, cursor = ble_handler.store.snapshot(cursor)
+            if encoding == 'base64':
+                if len(samples):
+                    # Samples overwritten by the ring were skipped
+                    block = {'type': 'block', 'start': cursor - len(samples), **encode_block(samples)}
+                    yield f"data: {json.dumps(block)}\n\n"
+            else:
+                for values in samples.tolist():
+                    yield f"data: {json.dumps({'type': 'data', 'values': values})}\n\n"
+            if beats:
+                yield f"data: {json.dumps({'type': 'hr', 'bpm': round(ble_handler.live_hr.bpm, 1), 'beats': beats})}\n\n"
+            if done:
+                break
             collection_done.wait(timeout=0.05)
         
-        # Send remaining data
-        while last_sent < len(data_buffer):
-            values = data_buffer[last_sent]
-            yield f"data: {json.dumps({'type': 'data', 'values': values})}\n\n"
-            last_sent += 1
-        
         # Check for errors
         if collection_error[0]:
             yield f"data: {json.dumps({'type': 'error', 'message': collection_error[0]})}\n\n"
@@ -2209,7 +2812,7 @@ def ble_stream():
         
         if sample_count > 0:
             try:
-                filepath = ble_handler.save_to_file()
+                filepath = ble_handler.save_to_file(fmt=app.config['RECORDING_FORMAT'])
             except Exception as e:
                 print(f"Save error: {e}")
         
@@ -2225,6 +2828,8 @@ def main():
     print("="*50)
     print("\n📍 Open your browser to: http://127.0.0.1:5000")
     print("\n💡 Press Ctrl+C to stop the server\n")
+    # Finish recordings left half-written by a crash or power loss
+    recover_partial_recordings(app.config['UPLOAD_FOLDER'])
     app.run(debug=False, port=5000, host='127.0.0.1', threaded=True)
 
 
@@ -2,19 +2,9 @@ import numpy as np
 import pandas as pd
 import scipy.signal as signal
 import matplotlib.pyplot as plt
-import requests
 import re
 
-
-def fetch_url(url):
-    """Fetch content from a given URL."""
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.text
-    except Exception as e:
-        print(f"Error fetching URL: {e}")
-        return None
+from remote_fetch import fetch_url
 
 
 def read_file_content(file_path):
@@ -0,0 +1,281 @@
+"""
+Heart Rate Variability
+Time and frequency domain HRV metrics from RR interval series.
+
+RR series come from the beat detector (see ecg_processor.rr_series): interval
+lengths in milliseconds with the time of each interval's ending beat, and NaN
+for intervals rejected as implausible. Successive differences are only taken
+between two valid intervals.
+
+Every statistic is computed from cumulative sums read at segment edges, so
+one code path serves a whole recording, sliding windows across a long
+recording (edges from searchsorted) and a batch of recordings (edges at the
+recording boundaries) without a Python loop per window or per recording.
+Spectra are either a Lomb-Scargle periodogram of the unevenly spaced
+intervals, or a Hann-windowed FFT of the series spline-resampled at 4 Hz;
+the FFT variant runs on all windows or recordings at once as one 2-D array.
+"""
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.signal as signal
+from scipy.interpolate import CubicSpline
+
+
+# Frequency bands (Hz) and the rate the RR series is resampled at for FFT spectra
+VLF_LOW = 0.0033
+LF_BAND = (0.04, 0.15)
+HF_BAND = (0.15, 0.4)
+RESAMPLE_FS = 4.0
+# Shortest FFT (samples at RESAMPLE_FS); 256 gives a 1/64 Hz frequency step
+MIN_FFT_LENGTH = 256
+LOMB_MIN_STEP = 0.002
+
+# spectrum='auto' uses Lomb-Scargle up to this many intervals and the FFT beyond
+LOMB_MAX_INTERVALS = 1000
+
+# Spectra need at least one full cycle at the bottom of the LF band
+MIN_SPECTRUM_SECONDS = 1 / LF_BAND[0]
+
+# Default sliding window for windowed HRV (seconds)
+HRV_WINDOW = 300.0
+HRV_HOP = 60.0
+
+TIME_FIELDS = ('beats', 'mean_rr', 'sdnn', 'rmssd', 'pnn50', 'sd1', 'sd2')
+FREQUENCY_FIELDS = ('lf', 'hf', 'lf_hf')
+HRV_FIELDS = TIME_FIELDS + FREQUENCY_FIELDS
+
+
+def _cumulative(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Cumulative count, sum and sum of squares of the non-NaN values, with a leading 0."""
+    valid = ~np.isnan(values)
+    x = np.where(valid, values, 0.0)
+    zero = np.zeros(1)
+    return (np.concatenate([zero, np.cumsum(valid)]), np.concatenate([zero, np.cumsum(x)]),
+            np.concatenate([zero, np.cumsum(x * x)]))
+
+
+def _segment_time_domain(rr: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Time domain metrics of the interval ranges rr[lo:hi], vectorized over ranges.
+
+    Differences between ranges are never used, so ranges may be windows of
+    one recording or whole recordings laid end to end.
+    """
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.maximum(np.asarray(hi, dtype=np.int64), lo)
+    # Center on the overall mean so the sums of squares do not cancel
+    center = np.nanmean(rr) if np.any(~np.isnan(rr)) else 0.0
+    count, total, squares = _cumulative(rr - center)
+    n = count[hi] - count[lo]
+    s1 = total[hi] - total[lo]
+    s2 = squares[hi] - squares[lo]
+
+    # diff[j] pairs rr[j] and rr[j + 1]; range [lo, hi) owns diffs [lo, hi - 1)
+    diff = np.diff(rr)
+    d_count, d_total, d_squares = _cumulative(diff)
+    _, nn50, _ = _cumulative(np.where(np.isnan(diff), np.nan, np.abs(diff) > 50))
+    d_lo = np.minimum(lo, len(diff))
+    d_hi = np.maximum(np.minimum(hi - 1, len(diff)), d_lo)
+    nd = d_count[d_hi] - d_count[d_lo]
+    d1 = d_total[d_hi] - d_total[d_lo]
+    d2 = d_squares[d_hi] - d_squares[d_lo]
+    n50 = nn50[d_hi] - nn50[d_lo]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_rr = np.where(n > 0, center + s1 / n, np.nan)
+        sdnn = np.sqrt(np.maximum(s2 - s1 * s1 / n, 0) / (n - 1))
+        sdnn = np.where(n > 1, sdnn, np.nan)
+        rmssd = np.where(nd > 0, np.sqrt(d2 / nd), np.nan)
+        pnn50 = np.where(nd > 0, 100 * n50 / nd, np.nan)
+        sdsd = np.where(nd > 1, np.sqrt(np.maximum(d2 - d1 * d1 / nd, 0) / (nd - 1)), np.nan)
+    # Poincare descriptors from the SDNN/SDSD identities
+    sd1 = np.sqrt(0.5) * sdsd
+    sd2 = np.sqrt(np.maximum(2 * sdnn * sdnn - sd1 * sd1, 0))
+    return {'beats': n.astype(np.int64), 'mean_rr': mean_rr, 'sdnn': sdnn, 'rmssd': rmssd,
+            'pnn50': pnn50, 'sd1': sd1, 'sd2': sd2}
+
+
+def _band_powers(freqs: np.ndarray, psd: np.ndarray) -> Dict[str, np.ndarray]:
+    """LF and HF power (ms^2) and their ratio from one-sided PSDs along the last axis."""
+    df = freqs[1] - freqs[0] if len(freqs) > 1 else 0.0
+    lf_mask = (freqs >= LF_BAND[0]) & (freqs < LF_BAND[1])
+    hf_mask = (freqs >= HF_BAND[0]) & (freqs < HF_BAND[1])
+    lf = psd[..., lf_mask].sum(axis=-1) * df
+    hf = psd[..., hf_mask].sum(axis=-1) * df
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = np.where(hf > 0, lf / hf, np.nan)
+    return {'lf': lf, 'hf': hf, 'lf_hf': ratio}
+
+
+def _resampled_spectra(times: np.ndarray, rr: np.ndarray, starts: np.ndarray,
+                       stops: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    FFT band powers of the RR series resampled at RESAMPLE_FS, for each
+    [start, stop) time span at once.
+
+    Spans are laid out as rows of one zero-padded 2-D array; each row is
+    linearly detrended and Hann windowed over its own length.
+    """
+    valid = ~np.isnan(rr)
+    t, y = times[valid], rr[valid]
+    m = len(starts)
+    empty = {key: np.full(m, np.nan) for key in FREQUENCY_FIELDS}
+    if len(t) < 4 or not m:
+        return empty
+
+    lengths = np.floor((stops - starts) * RESAMPLE_FS).astype(np.int64)
+    lengths = np.where(stops - starts >= MIN_SPECTRUM_SECONDS, lengths, 0)
+    width = int(lengths.max()) if m else 0
+    if width < 4:
+        return empty
+    k = np.arange(width)
+    inside = k < lengths[:, None]
+    grid = starts[:, None] + k / RESAMPLE_FS
+    rows = np.where(inside, CubicSpline(t, y, extrapolate=False)(np.clip(grid, t[0], t[-1])), 0.0)
+
+    # Per-row least-squares line over the row's own samples
+    n = np.maximum(lengths, 1)[:, None]
+    kk = np.where(inside, k, 0.0)
+    k_mean = kk.sum(axis=1, keepdims=True) / n
+    y_mean = rows.sum(axis=1, keepdims=True) / n
+    kc = np.where(inside, k - k_mean, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (kc * rows).sum(axis=1, keepdims=True) / (kc * kc).sum(axis=1, keepdims=True)
+    rows = np.where(inside, rows - y_mean - np.nan_to_num(slope) * kc, 0.0)
+
+    window = np.where(inside, 0.5 - 0.5 * np.cos(2 * np.pi * k / np.maximum(n - 1, 1)), 0.0)
+    scale = RESAMPLE_FS * (window * window).sum(axis=1)
+    rows = rows * window
+
+    # Each row is zero-padded to its own power-of-two FFT length, so a span's
+    # frequency grid (and its band powers) do not depend on the other spans;
+    # rows sharing a length are transformed together
+    n_fft = np.maximum(2 ** np.ceil(np.log2(np.maximum(lengths, 1))).astype(np.int64), MIN_FFT_LENGTH)
+    powers = {key: np.full(m, np.nan) for key in FREQUENCY_FIELDS}
+    for size in np.unique(n_fft[lengths >= 4]).tolist():
+        group = np.flatnonzero((n_fft == size) & (lengths >= 4))
+        spectrum = np.fft.rfft(rows[group, :min(width, size)], n=size, axis=-1)
+        psd = 2 * np.abs(spectrum) ** 2 / scale[group, None]
+        for key, value in _band_powers(np.fft.rfftfreq(size, 1 / RESAMPLE_FS), psd).items():
+            powers[key][group] = value
+    return powers
+
+
+def _lomb_spectrum(times: np.ndarray, rr: np.ndarray) -> Dict[str, float]:
+    """Lomb-Scargle band powers of the valid intervals of one series."""
+    valid = ~np.isnan(rr)
+    t, y = times[valid], rr[valid]
+    if len(t) < 4 or t[-1] - t[0] < MIN_SPECTRUM_SECONDS:
+        return {key: np.nan for key in FREQUENCY_FIELDS}
+    # Oversample short series 4x; the cap keeps long recordings to a few hundred frequencies
+    freqs = np.arange(VLF_LOW, HF_BAND[1], max(1 / (4 * (t[-1] - t[0])), LOMB_MIN_STEP))
+    power = signal.lombscargle(t, y - y.mean(), 2 * np.pi * freqs)
+    # Scale the periodogram to a one-sided PSD in ms^2/Hz
+    psd = power * 2 * (t[-1] - t[0]) / len(t)
+    return {key: float(value) for key, value in _band_powers(freqs, psd).items()}
+
+
+def hrv_metrics(times: np.ndarray, rr: np.ndarray, spectrum: str = 'auto') -> Dict[str, float]:
+    """
+    HRV of one RR series.
+
+    Args:
+        times: Time of each interval's ending beat in seconds
+        rr: Interval lengths in ms (NaN for rejected intervals)
+        spectrum: 'lomb' (Lomb-Scargle), 'fft' (resampled FFT) or 'auto'
+            (Lomb-Scargle for up to LOMB_MAX_INTERVALS intervals)
+
+    Returns:
+        Dictionary with the HRV_FIELDS keys: beats (valid intervals), mean_rr,
+        sdnn, rmssd (ms), pnn50 (%), sd1, sd2 (ms), lf, hf (ms^2) and lf_hf;
+        NaN where the series is too short
+    """
+    times = np.asarray(times, dtype=np.float64)
+    rr = np.asarray(rr, dtype=np.float64)
+    metrics = {key: value[0].item() for key, value in
+               _segment_time_domain(rr, np.array([0]), np.array([len(rr)])).items()}
+    if spectrum == 'auto':
+        spectrum = 'lomb' if len(rr) <= LOMB_MAX_INTERVALS else 'fft'
+    if spectrum == 'lomb':
+        metrics.update(_lomb_spectrum(times, rr))
+    elif spectrum == 'fft':
+        span = (np.array([times[0]]), np.array([times[-1]])) if len(times) else (np.zeros(0), np.zeros(0))
+        metrics.update({key: float(value[0]) if len(value) else np.nan
+                        for key, value in _resampled_spectra(times, rr, *span).items()})
+    else:
+        raise ValueError(f"unknown spectrum method {spectrum!r}")
+    return metrics
+
+
+def hrv_windows(times: np.ndarray, rr: np.ndarray, window: float = HRV_WINDOW,
+                hop: float = HRV_HOP, duration: Optional[float] = None) -> Dict[str, np.ndarray]:
+    """
+    HRV over sliding windows of a long recording.
+
+    Intervals belong to the window containing their ending beat. Spectra use
+    the resampled FFT.
+
+    Args:
+        times: Time of each interval's ending beat in seconds
+        rr: Interval lengths in ms (NaN for rejected intervals)
+        window: Window length in seconds
+        hop: Step between window starts in seconds
+        duration: Recording length in seconds (default: the last beat time)
+
+    Returns:
+        Dictionary with 'time' (window starts, s) and one array per HRV_FIELDS key
+    """
+    times = np.asarray(times, dtype=np.float64)
+    rr = np.asarray(rr, dtype=np.float64)
+    if duration is None:
+        duration = float(times[-1]) if len(times) else 0.0
+    starts = np.arange(0, max(duration - window, 0) + hop / 2, hop) if hop > 0 else np.zeros(1)
+    stops = starts + window
+    lo = np.searchsorted(times, starts)
+    hi = np.searchsorted(times, stops)
+    metrics = _segment_time_domain(rr, lo, hi)
+    metrics.update(_resampled_spectra(times, rr, starts, np.minimum(stops, max(duration, window))))
+    metrics['time'] = starts
+    return metrics
+
+
+def hrv_batch(series: Sequence[Tuple[np.ndarray, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    HRV of many recordings at once.
+
+    Args:
+        series: (times, rr) pairs, one per recording
+
+    Returns:
+        Dictionary with one array per HRV_FIELDS key, one entry per recording
+        (resampled FFT spectra)
+    """
+    lengths = np.array([len(rr) for _, rr in series], dtype=np.int64)
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    if not len(series):
+        return {key: np.zeros(0) for key in HRV_FIELDS}
+    rr = np.concatenate([np.asarray(rr, dtype=np.float64) for _, rr in series])
+    metrics = _segment_time_domain(rr, bounds[:-1], bounds[1:])
+
+    # Lay the recordings end to end on one time axis, a gap apart, so a
+    # single spline serves all of them
+    spans = np.array([(t[0], t[-1]) if len(t) else (0.0, 0.0) for t, _ in series], dtype=np.float64)
+    offsets = np.concatenate([[0.0], np.cumsum(spans[:, 1] - spans[:, 0] + 2 * MIN_SPECTRUM_SECONDS)])[:-1]
+    shift = offsets - spans[:, 0]
+    times = np.concatenate([np.asarray(t, dtype=np.float64) + s for (t, _), s in zip(series, shift)])
+    metrics.update(_resampled_spectra(times, rr, spans[:, 0] + shift, spans[:, 1] + shift))
+    return metrics
+
+
+def summarize_hrv(metrics: Dict, decimals: int = 2) -> Dict[str, Optional[float]]:
+    """Round scalar HRV metrics for JSON output, with NaN as None."""
+    out = {}
+    for key, value in metrics.items():
+        if isinstance(value, (int, np.integer)):
+            out[key] = int(value)
+            continue
+        value = float(value)
+        out[key] = None if np.isnan(value) else round(value, decimals)
+    return out
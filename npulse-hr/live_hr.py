@@ -0,0 +1,158 @@
+"""
+Live Heart Rate
+Causal beat detection and running heart rate for samples arriving over BLE.
+
+Blocks of raw samples are band-passed with the same Butterworth design as the
+offline analysis, but causally: sosfilt carries its state (zi) from block to
+block, so every sample is filtered exactly once. Beats are local maxima above
+an adaptive per-channel threshold that are the largest value within
++-confirm seconds and at least refractory seconds after the previous beat.
+A beat is therefore reported confirm seconds after its peak arrived. The
+running rate is the median of the last few beat-to-beat intervals per
+channel, combined across channels by the median.
+"""
+
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+import numpy as np
+import scipy.signal as signal
+
+from ecg_processor import BPM_RANGE, BPM_SCALE, design_bandpass
+
+
+class LiveHeartRate:
+    """
+    Incremental beat detector with bounded work per sample.
+
+    push() is called from a single producer thread; beats_since() and bpm may
+    be read from other threads.
+
+    Args:
+        fs: Sampling frequency in Hz
+        n_channels: Channels per sample
+        refractory: Minimum time between beats in seconds
+        confirm: Look-ahead before a peak is accepted, in seconds (adds latency)
+        settle: Initial filter settling time during which no beats are reported
+        learn: Time after settling used to learn each channel's peak amplitude
+        rr_history: Intervals in the running median
+        max_beats: Beats kept for readers
+    """
+
+    def __init__(self, fs: float = 220, n_channels: int = 3, refractory: float = 0.5,
+                 confirm: float = 0.1, settle: float = 1.0, learn: float = 2.0,
+                 rr_history: int = 8, max_beats: int = 1024):
+        self.fs = fs
+        self.n_channels = n_channels
+        self.sos = design_bandpass(fs)
+        self.refractory = max(int(refractory * fs), 1)
+        self.confirm = max(int(confirm * fs), 1)
+        self.settle = int(settle * fs)
+        self.learn_until = self.settle + int(learn * fs)
+        self.rr_history = rr_history
+        self.beats: Deque[Dict] = deque(maxlen=max_beats)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Start over for a new collection."""
+        c = self.n_channels
+        with self._lock:
+            self.beat_total = 0
+            self.beats.clear()
+        self.n = 0
+        self._zi = None
+        self._tail = np.empty((0, c))
+        self._amp = np.zeros(c)
+        self._last_beat = np.full(c, -1, dtype=np.int64)
+        self._last_decay = np.zeros(c, dtype=np.int64)
+        self._decided = np.full(c, -1, dtype=np.int64)
+        self._rr = [deque(maxlen=self.rr_history) for _ in range(c)]
+
+    def channel_bpm(self) -> List[float]:
+        """Current rate per channel (0 until two beats have been seen)."""
+        return [BPM_SCALE / float(np.median(rr)) if rr else 0.0 for rr in self._rr]
+
+    @property
+    def bpm(self) -> float:
+        """Current rate combined across channels."""
+        rates = [rate for rate in self.channel_bpm() if rate]
+        return float(np.median(rates)) if rates else 0.0
+
+    def push(self, block: np.ndarray) -> List[Dict]:
+        """
+        Consume a (k, n_channels) block of raw samples.
+
+        Returns:
+            New beats as dicts with the absolute sample 'index', 'channel' and
+            the channel's running 'bpm'
+        """
+        x = np.asarray(block, dtype=np.float64)
+        if not len(x):
+            return []
+        if self._zi is None:
+            # Start from steady state at the first sample to avoid a step transient
+            self._zi = signal.sosfilt_zi(self.sos)[:, :, None] * x[0]
+        y, self._zi = signal.sosfilt(self.sos, x, axis=0, zi=self._zi)
+
+        window = np.concatenate([self._tail, y])
+        origin = self.n - len(self._tail)     # absolute index of window[0]
+        self.n += len(x)
+        self._tail = window[-(2 * self.confirm + 1):]
+        if self.n <= self.settle:
+            return []
+
+        found = []
+        for c in range(self.n_channels):
+            trace = window[:, c]
+            if self.n <= self.learn_until or not self._amp[c]:
+                # Learn the amplitude scale from the settled part of the signal
+                settled = trace[max(self.settle - origin, 0):]
+                if settled.size:
+                    self._amp[c] = max(self._amp[c], settled.max())
+                if self.n <= self.learn_until:
+                    self._decided[c] = origin + len(trace) - self.confirm - 1
+                    continue
+
+            quiet_since = max(self._last_beat[c], self._last_decay[c])
+            if self.n - quiet_since > 3 * self.fs:
+                self._amp[c] *= 0.5   # lost the rhythm: lower the threshold
+                self._last_decay[c] = self.n
+
+            peaks, props = signal.find_peaks(trace, height=0.5 * self._amp[c])
+            for p, height in zip(peaks, props['peak_heights']):
+                index = origin + p
+                if p + self.confirm >= len(trace):
+                    break               # not confirmed yet; seen again next block
+                if index <= self._decided[c] or index - self._last_beat[c] < self.refractory:
+                    continue
+                if height < trace[max(p - self.confirm, 0):p + self.confirm + 1].max():
+                    continue
+                if self._last_beat[c] >= 0:
+                    rr = (index - self._last_beat[c]) / self.fs
+                    if BPM_RANGE[0] < BPM_SCALE / rr < BPM_RANGE[1]:
+                        self._rr[c].append(rr)
+                self._last_beat[c] = index
+                self._amp[c] = 0.875 * self._amp[c] + 0.125 * height
+                found.append({'index': int(index), 'channel': c, 'bpm': round(self.channel_bpm()[c], 1)})
+            # Peaks up to here are final, whatever the threshold does later
+            self._decided[c] = origin + len(trace) - self.confirm - 1
+
+        found.sort(key=lambda beat: beat['index'])
+        with self._lock:
+            self.beats.extend(found)
+            self.beat_total += len(found)
+        return found
+
+    def beats_since(self, cursor: int = 0) -> Tuple[List[Dict], int]:
+        """
+        Beats reported after the first cursor beats.
+
+        Returns:
+            (beats, cursor) where cursor is passed back on the next call
+        """
+        with self._lock:
+            kept_from = self.beat_total - len(self.beats)
+            beats = list(self.beats)[max(cursor - kept_from, 0):]
+            return beats, self.beat_total
@@ -2,19 +2,11 @@ import numpy as np
 import pandas as pd
 import scipy.signal as signal
 import matplotlib.pyplot as plt
-import requests
 import re
 
+from chart_downsample import minmax_downsample
+from remote_fetch import fetch_url
 
-def fetch_url(url):
-    """Fetch content from a given URL."""
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.text
-    except Exception as e:
-        print(f"Error fetching URL: {e}")
-        return None
 
 def read_file_content(file_path):
     """Read text file from local storage."""
@@ -109,11 +101,14 @@ def plot_3_sensors(df, hr_results, combined_hr):
     fig, axes = plt.subplots(3, 1, figsize=(24, 12), sharex=True)
     
     colors = ['#e74c3c', '#3498db', '#2ecc71']
-    sensors = [sensor1, sensor2, sensor3]
+    # Plot a min/max envelope with a pair of points per pixel column of the figure
+    pixels = int(fig.get_size_inches()[0] * fig.dpi)
+    index, envelope = minmax_downsample(np.column_stack([sensor1, sensor2, sensor3]).astype(np.int64), pixels)
+    sensors = list(envelope.T)
     sensor_names = ['Sensor 1', 'Sensor 2', 'Sensor 3']
     
     for i, (sensor, name, color, hr) in enumerate(zip(sensors, sensor_names, colors, hr_results)):
-        axes[i].plot(sensor, linewidth=0.9, color=color)
+        axes[i].plot(index, sensor, linewidth=0.9, color=color)
         axes[i].set_ylabel(name, fontsize=12)
         axes[i].set_title(f"{name} — Avg HR: {hr['avg']:.2f} BPM | Min: {hr['min']:.2f} | Max: {hr['max']:.2f}", 
                           fontsize=12, fontweight='bold')
@@ -0,0 +1,200 @@
+"""
+Plot Renderer
+Static ECG plots at full, thumbnail and sparkline size, drawn from a min/max
+envelope per pixel column into reusable figure templates.
+"""
+
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from chart_downsample import minmax_downsample
+
+
+# Figure size (inches) and resolution of each plot size
+PLOT_SIZES = {
+    'full': {'width': 16, 'height': 10, 'dpi': 100},
+    'thumbnail': {'width': 4, 'height': 2.5, 'dpi': 100},
+    'sparkline': {'width': 2, 'height': 0.6, 'dpi': 100},
+}
+
+# Figure background, text and grid colours of each theme
+PLOT_THEMES = {
+    'dark': {'face': '#1a1a2e', 'text': '#eaeaea', 'grid': '#3a3a5a'},
+    'light': {'face': '#ffffff', 'text': '#222222', 'grid': '#cccccc'},
+}
+
+SENSOR_COLORS = ['#e74c3c', '#3498db', '#2ecc71']
+SENSOR_NAMES = ['Sensor 1', 'Sensor 2', 'Sensor 3']
+
+# Subplot margins (fractions of the figure) of each plot size
+_LAYOUTS = {
+    'full': {'left': 0.06, 'right': 0.99, 'bottom': 0.06, 'top': 0.88, 'hspace': 0.35},
+    'thumbnail': {'left': 0.02, 'right': 0.98, 'bottom': 0.02, 'top': 0.9, 'hspace': 0.45},
+    'sparkline': {'left': 0.0, 'right': 1.0, 'bottom': 0.0, 'top': 1.0, 'hspace': 0.0},
+}
+
+# Templates kept; each holds a figure of a few hundred kilobytes
+MAX_TEMPLATES = 8
+
+
+class PlotTemplate:
+    """
+    Reusable figure with one axes and envelope band per sensor.
+
+    Each trace is drawn as a band from each pixel column's minimum to its
+    maximum, so drawing cost does not grow with the recording length. The
+    figure is built outside pyplot and renders are serialized by a lock.
+
+    Args:
+        size: Key of PLOT_SIZES, which decides the decoration
+        theme: Key of PLOT_THEMES
+        width: Figure width in inches
+        height: Figure height in inches
+        dpi: Resolution in dots per inch
+        channels: Number of sensors
+    """
+
+    def __init__(self, size: str, theme: str, width: float, height: float, dpi: int, channels: int = 3):
+        self.size = size
+        self.colors = PLOT_THEMES[theme]
+        self.lock = threading.Lock()
+        layout = _LAYOUTS[size]
+        self.figure = Figure(figsize=(width, height), dpi=dpi, facecolor=self.colors['face'])
+        FigureCanvasAgg(self.figure)
+        self.figure.subplots_adjust(**layout)
+        axes = self.figure.subplots(channels, 1, sharex=True, squeeze=False)[:, 0]
+        # Pixel columns of the axes: the envelope resolution
+        self.pixels = max(int(width * dpi * (layout['right'] - layout['left'])), 1)
+
+        self.axes, self.bands = list(axes), []
+        for i, ax in enumerate(self.axes):
+            color = SENSOR_COLORS[i % len(SENSOR_COLORS)]
+            band = ax.fill_between([0, 1], [0, 0], [0, 0], facecolor=color, edgecolor=color,
+                                   linewidth=0.9 if size == 'full' else 0.6)
+            self.bands.append(band)
+            ax.set_facecolor(self.colors['face'])
+            for spine in ax.spines.values():
+                spine.set_color(self.colors['grid'])
+            if size == 'full':
+                ax.set_ylabel(SENSOR_NAMES[i % len(SENSOR_NAMES)], fontsize=12, color=self.colors['text'])
+                ax.tick_params(colors=self.colors['text'])
+                ax.grid(True, color=self.colors['grid'], alpha=0.6)
+                ax.set_title('', fontsize=12, fontweight='bold', color=self.colors['text'])
+            elif size == 'thumbnail':
+                ax.set_xticks([])
+                ax.set_yticks([])
+                ax.set_title('', fontsize=7, color=self.colors['text'], pad=2)
+            else:
+                ax.set_axis_off()
+        if size == 'full':
+            self.axes[-1].set_xlabel("Sample Index", fontsize=12, color=self.colors['text'])
+        self.suptitle = self.figure.suptitle('', fontsize=14, fontweight='bold', color=self.colors['text'])
+
+    def render(self, samples: np.ndarray, titles: List[str], suptitle: str = '') -> bytes:
+        """
+        Draw samples into the template and return PNG bytes.
+
+        Args:
+            samples: Array of shape (n, channels)
+            titles: Title of each sensor's axes (unused for sparklines)
+            suptitle: Figure title (full size only)
+        """
+        samples = np.asarray(samples)
+        n = len(samples)
+        if not n:
+            raise ValueError("no samples to plot")
+        index, values = minmax_downsample(samples, self.pixels)
+        if len(index) < n:
+            # Pairs of points per column: the band spans each pair
+            x = index[0::2]
+            lows = np.minimum(values[0::2], values[1::2])
+            highs = np.maximum(values[0::2], values[1::2])
+        else:
+            # Unreduced: a band of zero height, drawn as its outline
+            x, lows, highs = index, values, values
+        with self.lock:
+            for i, (ax, band) in enumerate(zip(self.axes, self.bands)):
+                low, high = lows[:, i].astype(np.float64), highs[:, i].astype(np.float64)
+                band.set_verts([np.column_stack([np.r_[x, x[::-1]], np.r_[high, low[::-1]]])])
+                ax.set_xlim(0, max(n - 1, 1))
+                bottom, top = float(low.min()), float(high.max())
+                margin = 0.05 * (top - bottom) or 1.0
+                ax.set_ylim(bottom - margin, top + margin)
+                if self.size != 'sparkline':
+                    ax.title.set_text(titles[i] if i < len(titles) else '')
+            self.suptitle.set_text(suptitle if self.size == 'full' else '')
+            buf = BytesIO()
+            self.figure.savefig(buf, format='png', facecolor=self.colors['face'], edgecolor='none')
+        return buf.getvalue()
+
+
+_templates: 'OrderedDict[Tuple, PlotTemplate]' = OrderedDict()
+_templates_lock = threading.Lock()
+
+
+def plot_template(size: str, theme: str, width: float, height: float, dpi: int,
+                  channels: int = 3) -> PlotTemplate:
+    """Template for the given options, built on first use (least recently used dropped)."""
+    key = (size, theme, width, height, dpi, channels)
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+            return template
+    template = PlotTemplate(size, theme, width, height, dpi, channels)
+    with _templates_lock:
+        template = _templates.setdefault(key, template)
+        _templates.move_to_end(key)
+        while len(_templates) > MAX_TEMPLATES:
+            _templates.popitem(last=False)
+    return template
+
+
+def render_ecg_png(samples: np.ndarray, hr_results: List[Dict], combined_hr: Dict,
+                   sampling_rate: float, size: str = 'full', theme: str = 'dark',
+                   width: Optional[float] = None, height: Optional[float] = None,
+                   dpi: Optional[int] = None) -> bytes:
+    """
+    Render the ECG plot of a recording to PNG bytes.
+
+    Args:
+        samples: Raw samples of shape (n, channels)
+        hr_results: HR result of each sensor
+        combined_hr: Combined HR result
+        sampling_rate: Sampling frequency in Hz
+        size: Key of PLOT_SIZES: 'full' has titles, labels and grid,
+            'thumbnail' short titles only and 'sparkline' the traces only
+        theme: Key of PLOT_THEMES
+        width, height, dpi: Override the size's dimensions
+
+    Returns:
+        PNG bytes
+    """
+    if size not in PLOT_SIZES:
+        raise ValueError(f"unknown plot size: {size}")
+    if theme not in PLOT_THEMES:
+        raise ValueError(f"unknown plot theme: {theme}")
+    preset = PLOT_SIZES[size]
+    samples = np.asarray(samples)
+    template = plot_template(size, theme, width or preset['width'], height or preset['height'],
+                             dpi or preset['dpi'], samples.shape[1])
+
+    names = SENSOR_NAMES[:samples.shape[1]]
+    if size == 'full':
+        titles = [f"{name} — Avg HR: {hr['avg']:.2f} BPM | Min: {hr['min']:.2f} | Max: {hr['max']:.2f}"
+                  for name, hr in zip(names, hr_results)]
+        duration = len(samples) / sampling_rate if sampling_rate else 0
+        suptitle = (f"ECG Signal — Sampling Rate: {sampling_rate:.2f} Hz | Samples: {len(samples)} | "
+                    f"Duration: {duration:.0f}s\n"
+                    f"COMBINED HR — Avg: {combined_hr['avg']:.2f} BPM | Min: {combined_hr['min']:.2f} | "
+                    f"Max: {combined_hr['max']:.2f}")
+    else:
+        titles = [f"{name} — {hr['avg']:.0f} BPM" for name, hr in zip(names, hr_results)]
+        suptitle = ''
+    return template.render(samples, titles, suptitle)
@@ -0,0 +1,283 @@
+"""
+QRS Detector
+Pan-Tompkins style beat detection, batch and streaming.
+
+The band-passed signal is differentiated, squared and smoothed with a moving
+window integrator (MWI); peaks of the integrated slope energy are classified
+as beats or noise by adaptive thresholds that track running signal (SPKI)
+and noise (NPKI) peak levels. Missed beats are recovered by searching back
+with a halved threshold when an interval runs past 1.66x the average RR.
+Candidates soon after a beat (within T_WAVE_INTERVAL or 60% of the average
+RR, whichever is longer) are rejected as T-waves unless they match the
+beat's slope and energy: the band-pass passes the broad T-wave almost
+whole but not the sharp QRS, so a T-wave can carry over half the QRS slope.
+Each beat is placed on the highest filtered sample near its MWI peak.
+
+Windows whose filtered level shows no signal in the HR band (a disconnected
+or dead sensor) give no beats: the adaptive thresholds would otherwise
+settle on the noise.
+
+The signal stages are vectorized; only the per-candidate classification
+loops, which runs a few times per beat. Unlike the find_peaks detector there
+is no 0.5 s minimum spacing, only a refractory period just below the
+shortest interval the HR range accepts.
+"""
+
+from collections import deque
+from typing import List, Optional, Tuple
+
+import numpy as np
+import scipy.signal as signal
+from numpy.lib.stride_tricks import sliding_window_view
+
+from signal_quality import SQI_WINDOW
+
+
+# Moving window integrator width, refractory period and T-wave check interval
+# (seconds); REFRACTORY stays below the shortest interval BPM_RANGE accepts
+# (BPM_SCALE / 220 = 0.33 s)
+MWI_WINDOW = 0.15
+REFRACTORY = 0.3
+T_WAVE_INTERVAL = 0.36
+
+# Share of the last beat's slope and MWI height a candidate inside the T-wave
+# interval needs to count as a beat
+T_WAVE_SLOPE = 0.6
+T_WAVE_HEIGHT = 0.5
+
+# Filtered RMS of a SQI_WINDOW below which the window gives no beats; inputs
+# are normalized to unit variance before filtering, so this is the share of
+# the channel's amplitude in the HR band (dead sensors stay near 0.05, worn
+# ones above 0.1 on the test recordings)
+MIN_BAND_LEVEL = 0.1
+
+# Initial threshold learning period (seconds)
+LEARNING_PERIOD = 2.0
+
+
+class _AdaptiveThreshold:
+    """Pan-Tompkins signal/noise peak levels and beat classification."""
+
+    def __init__(self, fs: float, signal_peak: float, noise_peak: float):
+        self.fs = fs
+        self.spki = signal_peak
+        self.npki = noise_peak
+        self.refractory = int(REFRACTORY * fs)
+        self.t_wave = int(T_WAVE_INTERVAL * fs)
+        self.last: Optional[int] = None
+        self.last_slope = 0.0
+        self.last_height = 0.0
+        self.rr = deque(maxlen=8)
+        self._missed: Optional[Tuple[int, float, float]] = None
+
+    @property
+    def threshold(self) -> float:
+        return self.npki + 0.25 * (self.spki - self.npki)
+
+    def _accept(self, index: int, height: float, slope: float) -> None:
+        if self.last is not None:
+            self.rr.append(index - self.last)
+        self.last = index
+        self.last_slope = slope
+        self.last_height = height
+        self._missed = None
+
+    def _t_wave(self, index: int, height: float, slope: float) -> bool:
+        """Whether a candidate is too soon and too weak after the last beat to be one."""
+        if self.last is None:
+            return False
+        interval = max(self.t_wave, 0.6 * np.mean(self.rr)) if self.rr else self.t_wave
+        return index - self.last < interval and (
+            slope < T_WAVE_SLOPE * self.last_slope or height < T_WAVE_HEIGHT * self.last_height)
+
+    def classify(self, index: int, height: float, slope: float) -> List[int]:
+        """
+        Classify one MWI peak.
+
+        Returns:
+            Beat indices accepted by this candidate: a searched-back beat
+            and/or the candidate itself, in order
+        """
+        beats = []
+        if self.rr and self._missed and index - self.last > 1.66 * np.mean(self.rr) \
+                and self._missed[1] > 0.5 * self.threshold:
+            missed, missed_height, missed_slope = self._missed
+            self.spki = 0.25 * missed_height + 0.75 * self.spki
+            self._accept(missed, missed_height, missed_slope)
+            beats.append(missed)
+
+        if self.last is not None and index - self.last < self.refractory:
+            return beats
+        t_wave = self._t_wave(index, height, slope)
+        if height > self.threshold and not t_wave:
+            self.spki = 0.125 * height + 0.875 * self.spki
+            self._accept(index, height, slope)
+            beats.append(index)
+        else:
+            self.npki = 0.125 * height + 0.875 * self.npki
+            # T-waves are not searched back
+            if self.last is not None and not t_wave \
+                    and (self._missed is None or height > self._missed[1]):
+                self._missed = (index, height, slope)
+        return beats
+
+
+def slope_energy(filtered: np.ndarray, fs: float = 220) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Five-point derivative and its squared, window-integrated energy.
+
+    Returns:
+        Tuple of (derivative, integrated), both the length of filtered and
+        centered on it (zero-phase)
+    """
+    x = np.asarray(filtered, dtype=np.float64)
+    derivative = np.zeros_like(x)
+    derivative[2:-2] = (2 * x[4:] + x[3:-1] - x[1:-3] - 2 * x[:-4]) * (fs / 8)
+    width = max(int(MWI_WINDOW * fs), 1)
+    integrated = np.convolve(derivative * derivative, np.full(width, 1.0 / width), mode='same')
+    return derivative, integrated
+
+
+def _fiducials(x: np.ndarray, centers: np.ndarray, before: int, after: int) -> np.ndarray:
+    """Index of the largest x within [center - before, center + after] for each center."""
+    if not len(centers):
+        return centers
+    padded = np.pad(x, (before, after), mode='constant', constant_values=-np.inf)
+    windows = sliding_window_view(padded, before + after + 1)[centers]
+    return centers - before + windows.argmax(axis=1)
+
+
+def band_level(filtered: np.ndarray, fs: float = 220) -> np.ndarray:
+    """
+    Per-sample filtered RMS of the SQI_WINDOW window covering each sample.
+
+    Samples after the last full window are scored with it.
+    """
+    x = np.asarray(filtered, dtype=np.float64)
+    width = max(int(SQI_WINDOW * fs), 1)
+    starts = np.arange(max(len(x) // width, 1)) * width
+    lengths = np.diff(np.r_[starts, len(x)])
+    level = np.sqrt(np.add.reduceat(x * x, starts) / lengths)
+    return np.repeat(level, lengths)
+
+
+def pan_tompkins_peaks(filtered: np.ndarray, fs: float = 220) -> np.ndarray:
+    """
+    Beat indices in one filtered, normalized channel.
+
+    Drop-in alternative to ecg_processor.detect_peaks. Candidates in windows
+    below MIN_BAND_LEVEL are dropped before classification, so dead stretches
+    neither give beats nor pull the noise level down.
+    """
+    x = np.asarray(filtered, dtype=np.float64)
+    if len(x) < 5:
+        return np.array([], dtype=np.int64)
+    derivative, integrated = slope_energy(x, fs)
+    candidates, _ = signal.find_peaks(integrated, distance=max(int(REFRACTORY * fs), 1))
+    candidates = candidates[band_level(x, fs)[candidates] >= MIN_BAND_LEVEL]
+    if not len(candidates):
+        return candidates
+
+    learning = integrated[:max(int(LEARNING_PERIOD * fs), 1)]
+    state = _AdaptiveThreshold(fs, learning.max() / 3, learning.mean() / 2)
+    width = max(int(MWI_WINDOW * fs), 1)
+    # Classify on the beat positions so RR intervals are measured between fiducials
+    fiducials = _fiducials(x, candidates, width, width)
+    slopes = np.abs(derivative)[_fiducials(np.abs(derivative), candidates, width, width)]
+    beats = []
+    for index, height, slope in zip(fiducials.tolist(), integrated[candidates].tolist(), slopes.tolist()):
+        beats.extend(state.classify(index, height, slope))
+    return np.unique(np.array(beats, dtype=np.int64))
+
+
+class PanTompkinsStream:
+    """
+    Causal Pan-Tompkins detector for one channel of raw samples.
+
+    Blocks are band-passed with sosfilt (state carried in zi), differentiated
+    and integrated causally, so each sample is processed once. An MWI peak is
+    classified once the integrator has fallen for refractory seconds after
+    it; beats are reported at most about refractory + MWI window seconds
+    after they occur.
+
+    Args:
+        fs: Sampling frequency in Hz
+        sos: Band-pass filter as second-order sections (default: the HR band)
+    """
+
+    def __init__(self, fs: float = 220, sos: Optional[np.ndarray] = None):
+        if sos is None:
+            from ecg_processor import design_bandpass
+            sos = design_bandpass(fs)
+        self.fs = fs
+        self.sos = sos
+        self.width = max(int(MWI_WINDOW * fs), 1)
+        self.refractory = max(int(REFRACTORY * fs), 1)
+        self.learn = max(int(LEARNING_PERIOD * fs), 1)
+        self.reset()
+
+    def reset(self) -> None:
+        self.n = 0
+        self._zi = None
+        # Filtered history: 4 samples for the derivative plus room to place
+        # beats and measure slopes back past the MWI delay
+        self._history = 4 + 2 * self.width + self.refractory
+        self._filtered = np.empty(0)
+        self._energy_tail = np.empty(0)
+        self._integrated = np.empty(0)
+        self._decided = -1
+        self._learning: List[np.ndarray] = []
+        self._state: Optional[_AdaptiveThreshold] = None
+
+    def push(self, block: np.ndarray) -> List[int]:
+        """Consume raw samples; returns absolute indices of newly detected beats."""
+        x = np.asarray(block, dtype=np.float64).ravel()
+        if not len(x):
+            return []
+        if self._zi is None:
+            self._zi = signal.sosfilt_zi(self.sos) * x[0]
+        y, self._zi = signal.sosfilt(self.sos, x, zi=self._zi)
+
+        filtered = np.concatenate([self._filtered, y])
+        origin = self.n - len(self._filtered)      # absolute index of filtered[0]
+        self.n += len(x)
+        # Causal five-point derivative (the first 4 history samples have none)
+        derivative = np.zeros(len(filtered))
+        derivative[4:] = (2 * filtered[4:] + filtered[3:-1] - filtered[1:-3] - 2 * filtered[:-4]) * (self.fs / 8)
+        # Moving window integration over the new samples: integrated[i] is the
+        # mean energy of the width samples ending at i
+        energy = np.concatenate([self._energy_tail, derivative[-len(y):] ** 2])
+        cumulative = np.concatenate([[0.0], np.cumsum(energy)])
+        integrated_new = (cumulative[self.width:] - cumulative[:-self.width]) / self.width
+        self._energy_tail = energy[len(energy) - self.width + 1:]
+        integrated = np.concatenate([self._integrated, integrated_new])
+        integrated_origin = self.n - len(integrated)
+
+        beats: List[int] = []
+        if self._state is None:
+            self._learning.append(integrated_new)
+            if self.n >= self.learn:
+                learned = np.concatenate(self._learning)
+                self._state = _AdaptiveThreshold(self.fs, learned.max() / 3, learned.mean() / 2)
+                self._learning = []
+                self._decided = self.n - 1
+        else:
+            candidates, _ = signal.find_peaks(integrated, distance=self.refractory)
+            for p in candidates.tolist():
+                index = integrated_origin + p
+                if p + self.refractory >= len(integrated):
+                    break                   # integrator may still rise; decide next block
+                if index <= self._decided:
+                    continue
+                self._decided = index
+                # The causal MWI peak trails the upstroke; the beat is the
+                # filtered maximum just before it
+                local = index - origin
+                lo = max(local - 2 * self.width, 0)
+                fiducial = origin + lo + int(np.argmax(filtered[lo:local + 1]))
+                slope = float(np.abs(derivative[lo:local + 1]).max())
+                beats.extend(self._state.classify(fiducial, float(integrated[p]), slope))
+
+        self._filtered = filtered[-self._history:]
+        self._integrated = integrated[-(self.refractory + 2):]
+        return beats
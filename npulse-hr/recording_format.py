@@ -0,0 +1,384 @@
+"""
+nPulse Binary Recording Format
+Compact columnar storage for ECG recordings with memory-mapped reads.
+
+Layout (little-endian):
+    128-byte header  magic, version, channel count, flags, codec, sample rate,
+                     start time (Unix ms), sample count, device name
+    samples          int16, interleaved row-major as (n_samples, channels)
+
+Opening a recording only reads the header; samples are paged in by the OS
+when they are first touched through the returned np.memmap.
+
+Compressed recordings (.npc) share the header (with their own magic) and
+store the samples as a sequence of independently decodable frames:
+    frame header     row count (u32), payload length (u32)
+    payload          zlib/lzma of the zigzag-encoded sample deltas, laid out
+                     channel-major with low and high bytes in separate planes
+Deltas carry over from the previous frame, so the streams can be encoded and
+decoded frame by frame without holding the whole recording.
+"""
+
+import lzma
+import os
+import struct
+import zlib
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+
+BINARY_EXTENSION = ".npb"
+COMPRESSED_EXTENSION = ".npc"
+MAGIC = b"NPLS"
+COMPRESSED_MAGIC = b"NPLC"
+FORMAT_VERSION = 1
+HEADER_SIZE = 128
+SAMPLE_DTYPE = np.dtype('<i2')
+
+# Codec ids stored in the header of compressed recordings
+CODECS = {'zlib': 1, 'lzma': 2}
+DEFAULT_CODEC = 'zlib'
+FRAME_ROWS = 65536
+
+# Header flag bits
+FLAG_PARTIAL = 0x1  # still being recorded, or interrupted before it was finalized
+
+# magic, version, channels, flags, codec, sample_rate, start_time_ms, n_samples, device_name
+_HEADER_STRUCT = struct.Struct('<4sHHHHdqQ32s')
+_FRAME_STRUCT = struct.Struct('<II')
+
+
+def pack_header(channels: int, sample_rate: float, n_samples: int,
+                device_name: str = "", start_time: Optional[datetime] = None,
+                flags: int = 0, codec: Optional[str] = None) -> bytes:
+    """Build the fixed-size binary header (compressed when a codec is given)."""
+    start_ms = int((start_time or datetime.now()).timestamp() * 1000)
+    name = (device_name or "").encode('utf-8')[:32]
+    magic = COMPRESSED_MAGIC if codec else MAGIC
+    packed = _HEADER_STRUCT.pack(magic, FORMAT_VERSION, channels, flags, CODECS[codec] if codec else 0,
+                                 float(sample_rate), start_ms, n_samples, name)
+    return packed.ljust(HEADER_SIZE, b'\0')
+
+
+def unpack_header(raw: bytes) -> Optional[Dict]:
+    """Decode a header; returns None if the bytes are not an nPulse recording."""
+    if len(raw) < _HEADER_STRUCT.size or raw[:4] not in (MAGIC, COMPRESSED_MAGIC):
+        return None
+    magic, version, channels, flags, codec_id, sample_rate, start_ms, n_samples, name = \
+        _HEADER_STRUCT.unpack_from(raw)
+    codec = next((name for name, cid in CODECS.items() if cid == codec_id), None)
+    return {
+        'version': version,
+        'channels': channels,
+        'flags': flags,
+        'codec': codec if magic == COMPRESSED_MAGIC else None,
+        'sample_rate': sample_rate,
+        'start_time': datetime.fromtimestamp(start_ms / 1000),
+        'n_samples': n_samples,
+        'device_name': name.rstrip(b'\0').decode('utf-8', errors='replace'),
+    }
+
+
+def is_binary_recording(file_path: str) -> bool:
+    """Check whether a file is a binary recording, raw (.npb) or compressed (.npc)."""
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(len(MAGIC)) in (MAGIC, COMPRESSED_MAGIC)
+    except OSError:
+        return False
+
+
+def read_header(file_path: str) -> Optional[Dict]:
+    """Read only the header of a binary recording."""
+    try:
+        with open(file_path, 'rb') as f:
+            return unpack_header(f.read(HEADER_SIZE))
+    except OSError as e:
+        print(f"Error reading recording header: {e}")
+        return None
+
+
+def write_recording(file_path: str, samples: np.ndarray, sample_rate: float,
+                    device_name: str = "", start_time: Optional[datetime] = None) -> str:
+    """
+    Write samples to a binary recording.
+
+    Args:
+        file_path: Destination path
+        samples: Integer array of shape (n, channels)
+        sample_rate: Sampling frequency in Hz
+        device_name: Name of the recording device
+        start_time: Recording start time (defaults to now)
+
+    Returns:
+        The path that was written
+    """
+    samples = np.asarray(samples)
+    if samples.ndim != 2:
+        raise ValueError("samples must have shape (n, channels)")
+    info = np.iinfo(SAMPLE_DTYPE)
+    if samples.size and (samples.min() < info.min or samples.max() > info.max):
+        raise ValueError("sample values do not fit in int16")
+
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    with open(file_path, 'wb') as f:
+        f.write(pack_header(samples.shape[1], sample_rate, len(samples), device_name, start_time))
+        f.write(np.ascontiguousarray(samples, dtype=SAMPLE_DTYPE).tobytes())
+    return file_path
+
+
+def open_recording(file_path: str) -> Optional[Tuple[Dict, np.ndarray]]:
+    """
+    Memory-map a binary recording.
+
+    Compressed recordings cannot be mapped and are decoded into memory instead.
+
+    Returns:
+        Tuple of (header, samples) where samples is a read-only np.memmap of
+        shape (n_samples, channels), or None if the file is not a recording
+    """
+    header = read_header(file_path)
+    if header is None:
+        return None
+    if header['codec']:
+        blocks = list(iter_compressed_blocks(file_path))
+        channels = max(header['channels'], 1)
+        samples = np.concatenate(blocks) if blocks else np.empty((0, channels), dtype=SAMPLE_DTYPE)
+        return header, samples
+
+    channels = max(header['channels'], 1)
+    payload = os.path.getsize(file_path) - HEADER_SIZE
+    n_samples = payload // (channels * SAMPLE_DTYPE.itemsize)
+    if header['n_samples']:
+        n_samples = min(n_samples, header['n_samples'])
+
+    if n_samples == 0:
+        return header, np.empty((0, channels), dtype=SAMPLE_DTYPE)
+
+    samples = np.memmap(file_path, dtype=SAMPLE_DTYPE, mode='r',
+                        offset=HEADER_SIZE, shape=(n_samples, channels))
+    return header, samples
+
+
+def _encode_frame(block: np.ndarray, previous: np.ndarray, codec: str) -> bytes:
+    """Delta + zigzag encode one frame and compress its byte planes."""
+    rows = block.astype(np.int32)
+    # Deltas wrap modulo 2**16 so any int16 step fits the 16-bit zigzag code
+    delta = np.diff(rows, axis=0, prepend=previous[None, :]).astype(np.int16)
+    zigzag = ((delta << 1) ^ (delta >> 15)).view(np.uint16).astype('<u2')
+    planes = zigzag.T.copy().view(np.uint8).reshape(-1, 2).T.tobytes()
+    if codec == 'lzma':
+        return lzma.compress(planes, preset=6)
+    return zlib.compress(planes, 6)
+
+
+def _decode_frame(payload: bytes, n_rows: int, channels: int, previous: np.ndarray,
+                  codec: str) -> np.ndarray:
+    """Inverse of _encode_frame."""
+    raw = lzma.decompress(payload) if codec == 'lzma' else zlib.decompress(payload)
+    planes = np.frombuffer(raw, dtype=np.uint8).reshape(2, -1)
+    zigzag = (planes[0].astype(np.int32) | (planes[1].astype(np.int32) << 8)).reshape(channels, n_rows).T
+    delta = (zigzag >> 1) ^ -(zigzag & 1)
+    # astype wraps modulo 2**16, undoing the wrapped deltas
+    return (np.cumsum(delta, axis=0, dtype=np.int64) + previous).astype(SAMPLE_DTYPE)
+
+
+class CompressedWriter:
+    """
+    Streaming encoder for compressed recordings.
+
+    Samples are buffered into frames of frame_rows rows; each full frame is
+    compressed and written immediately. close() flushes the last partial
+    frame and records the final sample count in the header.
+    """
+
+    def __init__(self, file_path: str, channels: int, sample_rate: float,
+                 device_name: str = "", start_time: Optional[datetime] = None,
+                 codec: str = DEFAULT_CODEC, frame_rows: int = FRAME_ROWS):
+        if codec not in CODECS:
+            raise ValueError(f"unknown codec {codec!r}")
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        self.file_path = file_path
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.device_name = device_name
+        self.start_time = start_time or datetime.now()
+        self.codec = codec
+        self.frame_rows = frame_rows
+        self.n_samples = 0
+        self._previous = np.zeros(channels, dtype=np.int32)
+        self._pending = []
+        self._pending_rows = 0
+        self._file = open(file_path, 'wb')
+        self._file.write(self._header())
+
+    def _header(self) -> bytes:
+        return pack_header(self.channels, self.sample_rate, self.n_samples,
+                           self.device_name, self.start_time, codec=self.codec)
+
+    def _write_frame(self, frame: np.ndarray) -> None:
+        payload = _encode_frame(frame, self._previous, self.codec)
+        self._file.write(_FRAME_STRUCT.pack(len(frame), len(payload)))
+        self._file.write(payload)
+        self._previous = frame[-1].astype(np.int32)
+        self.n_samples += len(frame)
+
+    def write(self, samples: np.ndarray) -> None:
+        """Append an (n, channels) block of samples."""
+        samples = np.asarray(samples)
+        if samples.ndim != 2 or samples.shape[1] != self.channels:
+            raise ValueError(f"samples must have shape (n, {self.channels})")
+        info = np.iinfo(SAMPLE_DTYPE)
+        if samples.size and (samples.min() < info.min or samples.max() > info.max):
+            raise ValueError("sample values do not fit in int16")
+        self._pending.append(samples)
+        self._pending_rows += len(samples)
+        if self._pending_rows < self.frame_rows:
+            return
+        buffered = np.concatenate(self._pending)
+        n_full = len(buffered) // self.frame_rows * self.frame_rows
+        for start in range(0, n_full, self.frame_rows):
+            self._write_frame(buffered[start:start + self.frame_rows])
+        rest = buffered[n_full:]
+        self._pending = [rest] if len(rest) else []
+        self._pending_rows = len(rest)
+
+    def close(self) -> str:
+        """Flush the last frame, finalize the header and close the file."""
+        if self._file.closed:
+            return self.file_path
+        if self._pending_rows:
+            self._write_frame(np.concatenate(self._pending))
+            self._pending, self._pending_rows = [], 0
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+        return self.file_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_compressed_blocks(file_path: str) -> Iterator[np.ndarray]:
+    """Decode a compressed recording frame by frame, yielding (n, channels) blocks."""
+    with open(file_path, 'rb') as f:
+        header = unpack_header(f.read(HEADER_SIZE))
+        if header is None or not header['codec']:
+            raise ValueError(f"{file_path} is not a compressed recording")
+        channels = header['channels']
+        previous = np.zeros(channels, dtype=np.int32)
+        while True:
+            frame_header = f.read(_FRAME_STRUCT.size)
+            if len(frame_header) < _FRAME_STRUCT.size:
+                break
+            n_rows, length = _FRAME_STRUCT.unpack(frame_header)
+            payload = f.read(length)
+            if len(payload) < length:
+                print(f"Truncated frame in {file_path}; stopping early.")
+                break
+            block = _decode_frame(payload, n_rows, channels, previous, header['codec'])
+            previous = block[-1].astype(np.int32)
+            yield block
+
+
+def write_compressed_recording(file_path: str, samples: np.ndarray, sample_rate: float,
+                               device_name: str = "", start_time: Optional[datetime] = None,
+                               codec: str = DEFAULT_CODEC) -> str:
+    """Write samples to a compressed recording in one call."""
+    samples = np.asarray(samples)
+    if samples.ndim != 2:
+        raise ValueError("samples must have shape (n, channels)")
+    # Checked up front so a failed write leaves no partial file
+    info = np.iinfo(SAMPLE_DTYPE)
+    if samples.size and (samples.min() < info.min or samples.max() > info.max):
+        raise ValueError("sample values do not fit in int16")
+    with CompressedWriter(file_path, samples.shape[1], sample_rate, device_name,
+                          start_time, codec) as writer:
+        writer.write(samples)
+    return file_path
+
+
+def convert_text_file(txt_path: str, out_path: Optional[str] = None,
+                      sample_rate: Optional[float] = None, device_name: str = "",
+                      codec: Optional[str] = None) -> Optional[str]:
+    """
+    Convert a comma-separated text recording to the binary format.
+
+    Args:
+        txt_path: Source .txt recording
+        out_path: Destination (defaults to txt_path with a .npb or .npc extension)
+        sample_rate: Sampling rate to store (defaults to samples / 60 s,
+            matching the analyzer's 60-second recording assumption)
+        device_name: Device name to store in the header
+        codec: Compression codec ('zlib' or 'lzma'); None writes raw .npb
+
+    Returns:
+        Path of the binary recording, or None if the source had no data;
+        raises ValueError (writing nothing) if a value does not fit in int16
+    """
+    from ecg_processor import clean_text, parse_samples, read_file_content
+
+    content = read_file_content(txt_path)
+    if not content:
+        return None
+    samples = parse_samples(clean_text(content))
+    if not len(samples):
+        print(f"No valid data found in {txt_path}.")
+        return None
+
+    if out_path is None:
+        extension = COMPRESSED_EXTENSION if codec else BINARY_EXTENSION
+        out_path = os.path.splitext(txt_path)[0] + extension
+    if sample_rate is None:
+        sample_rate = len(samples) / 60
+    start_time = datetime.fromtimestamp(os.path.getmtime(txt_path))
+
+    if codec:
+        return write_compressed_recording(out_path, samples, sample_rate, device_name, start_time, codec)
+    return write_recording(out_path, samples, sample_rate, device_name, start_time)
+
+
+def export_text_file(file_path: str, out_path: Optional[str] = None) -> Optional[str]:
+    """
+    Write a binary (.npb or .npc) recording back out as comma-separated text.
+
+    Returns:
+        Path of the text recording, or None if the source is not a recording
+    """
+    header = read_header(file_path)
+    if header is None:
+        return None
+    if out_path is None:
+        out_path = os.path.splitext(file_path)[0] + ".txt"
+
+    if header['codec']:
+        blocks = iter_compressed_blocks(file_path)
+    else:
+        blocks = [open_recording(file_path)[1]]
+    with open(out_path, 'w') as f:
+        for block in blocks:
+            np.savetxt(f, block, fmt='%d', delimiter=',')
+    return out_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert between text and binary recordings")
+    parser.add_argument("files", nargs="+", help="Recordings to convert")
+    parser.add_argument("--compress", choices=sorted(CODECS), help="Write compressed .npc with this codec")
+    parser.add_argument("--to-text", action="store_true", help="Convert binary recordings back to .txt")
+    args = parser.parse_args()
+
+    for path in args.files:
+        if args.to_text:
+            out = export_text_file(path)
+        else:
+            out = convert_text_file(path, codec=args.compress)
+        if out:
+            print(f"{path} -> {out} ({os.path.getsize(path)} -> {os.path.getsize(out)} bytes)")
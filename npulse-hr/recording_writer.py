@@ -0,0 +1,271 @@
+"""
+Incremental Recording Writer
+Append-only writer that puts BLE samples on disk while they are collected.
+
+Samples are journaled to "<destination>.part", a raw .npb recording whose
+header carries FLAG_PARTIAL. A background thread appends batched samples every
+flush_interval seconds (or sooner once flush_samples are waiting) and fsyncs
+according to the chosen policy:
+    'flush'     fsync after every batch (safest, most disk activity)
+    'interval'  fsync at most every fsync_interval seconds
+    'close'     fsync only when the recording is finalized
+
+close() fixes the header (sample count, measured sample rate, flag cleared)
+and moves the journal to its destination, compressing it or exporting it as
+text when the destination is a .npc or .txt file. A journal left behind by a
+crash is still a readable recording up to its last complete sample;
+recover_partial_recordings() finalizes such files. The writer holds an
+exclusive flock on its journal, so recovery skips journals another process
+is still writing (where flock is unavailable, journals modified within
+STALE_JOURNAL_AGE seconds are skipped instead).
+"""
+
+import glob
+import os
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from recording_format import (COMPRESSED_EXTENSION, FLAG_PARTIAL, FRAME_ROWS, HEADER_SIZE, SAMPLE_DTYPE,
+                              CompressedWriter, export_text_file, open_recording, pack_header, read_header)
+
+
+PARTIAL_SUFFIX = ".part"
+FSYNC_POLICIES = ('flush', 'interval', 'close')
+
+# Seconds without a write after which a journal counts as abandoned when it
+# cannot be locked; a live writer appends every flush_interval while samples arrive
+STALE_JOURNAL_AGE = 60.0
+
+
+class RecordingWriter:
+    """
+    Journal samples to disk from a background thread.
+
+    write() only queues the block and is cheap enough to call from the BLE
+    notification handler.
+    """
+
+    def __init__(self, file_path: str, channels: int = 3, sample_rate: float = 220,
+                 device_name: str = "", start_time: Optional[datetime] = None,
+                 flush_interval: float = 1.0, flush_samples: int = 4096,
+                 fsync: str = 'interval', fsync_interval: float = 10.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"unknown fsync policy {fsync!r}")
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        self.file_path = file_path
+        self.part_path = file_path + PARTIAL_SUFFIX
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.device_name = device_name
+        self.start_time = start_time or datetime.now()
+        self.flush_interval = flush_interval
+        self.flush_samples = flush_samples
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.n_written = 0
+        self.error: Optional[Exception] = None
+
+        self._pending: List[np.ndarray] = []
+        self._pending_rows = 0
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._last_fsync = 0.0
+
+        self._file = open(self.part_path, 'wb')
+        if fcntl is not None:
+            # Held until the journal is closed: marks it as live for recovery
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._file.write(self._header(FLAG_PARTIAL))
+        self._file.flush()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _header(self, flags: int = 0) -> bytes:
+        return pack_header(self.channels, self.sample_rate, self.n_written,
+                           self.device_name, self.start_time, flags=flags)
+
+    def write(self, samples: np.ndarray) -> None:
+        """Queue an (n, channels) block for the next flush."""
+        if not len(samples):
+            return
+        info = np.iinfo(SAMPLE_DTYPE)
+        if samples.min() < info.min or samples.max() > info.max:
+            raise ValueError("sample values do not fit in int16")
+        block = np.asarray(samples, dtype=SAMPLE_DTYPE)  # always a copy for the int32 device samples
+        with self._lock:
+            self._pending.append(block)
+            self._pending_rows += len(block)
+            if self._pending_rows >= self.flush_samples:
+                self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Append queued samples to the journal; returns the rows written."""
+        with self._lock:
+            blocks, self._pending, self._pending_rows = self._pending, [], 0
+        with self._io_lock:
+            if self._file.closed:
+                return 0
+            try:
+                for block in blocks:
+                    self._file.write(block.tobytes())
+                    self.n_written += len(block)
+                self._file.flush()
+                now = time.monotonic()
+                if self.fsync == 'flush' or (self.fsync == 'interval' and
+                                             now - self._last_fsync >= self.fsync_interval):
+                    os.fsync(self._file.fileno())
+                    self._last_fsync = now
+            except OSError as e:
+                self.error = e
+                print(f"Recording write error: {e}")
+        return sum(len(block) for block in blocks)
+
+    def close(self, sample_rate: Optional[float] = None) -> Optional[str]:
+        """
+        Flush everything, finalize the header and move the file into place.
+
+        Args:
+            sample_rate: Measured sampling rate to store (default: as opened)
+
+        Returns:
+            Path of the finished recording, or None if finalizing failed
+        """
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        if sample_rate:
+            self.sample_rate = sample_rate
+        with self._io_lock:
+            if self._file.closed:
+                return None
+            self._file.seek(0)
+            self._file.write(self._header())
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        return finalize_partial(self.part_path, self.file_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _estimate_sample_rate(part_path: str, header: dict, n_samples: int) -> float:
+    """Sample rate of an interrupted journal from its start time and last write."""
+    elapsed = os.path.getmtime(part_path) - header['start_time'].timestamp()
+    if n_samples and elapsed > 1:
+        return n_samples / elapsed
+    return header['sample_rate']
+
+
+def finalize_partial(part_path: str, out_path: Optional[str] = None) -> Optional[str]:
+    """
+    Turn a journal into a finished recording.
+
+    Trailing bytes of an incomplete sample are dropped and, if the journal was
+    interrupted, the sample count and rate are reconstructed from the file.
+
+    Args:
+        part_path: Journal written by RecordingWriter
+        out_path: Destination (defaults to part_path without the .part suffix);
+            .npc is compressed, .txt is exported as text, anything else is
+            kept as a raw .npb recording
+
+    Returns:
+        Path of the finished recording, or None if part_path is not a recording
+    """
+    header = read_header(part_path)
+    if header is None:
+        return None
+    if out_path is None:
+        out_path = part_path[:-len(PARTIAL_SUFFIX)] if part_path.endswith(PARTIAL_SUFFIX) else part_path
+
+    row_bytes = max(header['channels'], 1) * SAMPLE_DTYPE.itemsize
+    n_samples = (os.path.getsize(part_path) - HEADER_SIZE) // row_bytes
+    if header['flags'] & FLAG_PARTIAL:
+        sample_rate = _estimate_sample_rate(part_path, header, n_samples)
+        with open(part_path, 'r+b') as f:
+            f.truncate(HEADER_SIZE + n_samples * row_bytes)
+            f.write(pack_header(header['channels'], sample_rate, n_samples, header['device_name'],
+                                header['start_time'], flags=header['flags'] & ~FLAG_PARTIAL))
+
+    extension = os.path.splitext(out_path)[1].lower()
+    if extension == COMPRESSED_EXTENSION:
+        header, samples = open_recording(part_path)
+        with CompressedWriter(out_path, header['channels'], header['sample_rate'],
+                              header['device_name'], header['start_time']) as writer:
+            for start in range(0, len(samples), FRAME_ROWS):
+                writer.write(samples[start:start + FRAME_ROWS])
+        del samples
+        os.remove(part_path)
+    elif extension == ".txt":
+        export_text_file(part_path, out_path)
+        os.remove(part_path)
+    else:
+        os.replace(part_path, out_path)
+    return out_path
+
+
+def journal_in_use(part_path: str) -> bool:
+    """
+    Whether a RecordingWriter (in any process) may still be writing a journal.
+
+    Tries the writer's flock; without flock, falls back to the journal's age.
+    """
+    if fcntl is None:
+        return time.time() - os.path.getmtime(part_path) < STALE_JOURNAL_AGE
+    with open(part_path, 'rb') as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    return False
+
+
+def recover_partial_recordings(directory: str) -> List[str]:
+    """Finalize every journal left in directory by an interrupted collection."""
+    recovered = []
+    for part_path in sorted(glob.glob(os.path.join(directory, f"*{PARTIAL_SUFFIX}"))):
+        try:
+            if journal_in_use(part_path):
+                print(f"Skipping {part_path}: still being recorded")
+                continue
+            path = finalize_partial(part_path)
+        except (OSError, ValueError) as e:
+            print(f"Could not recover {part_path}: {e}")
+            continue
+        if path:
+            print(f"Recovered interrupted recording: {path}")
+            recovered.append(path)
+    return recovered
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Finalize recordings interrupted during collection")
+    parser.add_argument("directory", nargs="?", default="files", help="Directory holding .part journals")
+    args = parser.parse_args()
+    if not recover_partial_recordings(args.directory):
+        print("No interrupted recordings found.")
@@ -0,0 +1,154 @@
+"""
+Remote Recording Fetch
+HTTP layer for recordings given as URLs.
+
+All requests go through one shared requests.Session, so connections to the
+same host are pooled and reused, and every request has a timeout. Bodies are
+streamed in chunks: callers can parse while the download is still running, and
+each chunk is written to an on-disk cache as it passes through. Cached bodies
+keep the server's ETag/Last-Modified validators; the next fetch of the same
+URL is a conditional request, and a 304 answer is served from disk without
+downloading the recording again. If the server cannot be reached, a cached
+copy is used instead.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+DEFAULT_CACHE_DIR = os.path.join("files", ".cache", "http")
+DEFAULT_TIMEOUT = (5, 30)       # connect, read (seconds)
+CHUNK_SIZE = 64 * 1024
+POOL_SIZE = 8
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Shared session with a connection pool and retries on transient errors."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                          allowed_methods=frozenset(['GET', 'HEAD']))
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def _cache_paths(url: str, cache_dir: str) -> Tuple[str, str]:
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f"{key}.body"), os.path.join(cache_dir, f"{key}.json")
+
+
+def _read_meta(meta_path: str) -> Optional[Dict]:
+    try:
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _iter_file(path: str) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _stream_to_cache(response: requests.Response, body_path: str, meta_path: str,
+                     meta: Dict) -> Iterator[bytes]:
+    """Yield response chunks while writing them to the cache; commit only when complete."""
+    tmp_path = f"{body_path}.tmp{threading.get_ident()}"
+    complete = False
+    try:
+        with response, open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                yield chunk
+        complete = True
+    finally:
+        if complete:
+            os.replace(tmp_path, body_path)
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def open_url(url: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+             session: Optional[requests.Session] = None,
+             timeout=DEFAULT_TIMEOUT) -> Optional[Iterator[bytes]]:
+    """
+    Open a URL as an iterator of body chunks.
+
+    Args:
+        url: http(s) URL of the recording
+        cache_dir: Directory for cached bodies and validators (None disables caching)
+        session: Session to use (defaults to the shared pooled session)
+        timeout: requests timeout, (connect, read) in seconds
+
+    Returns:
+        Iterator of bytes chunks, or None if the URL cannot be fetched. Network
+        errors while iterating raise requests.RequestException.
+    """
+    session = session or get_session()
+    body_path = meta_path = None
+    meta = None
+    headers = {}
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        body_path, meta_path = _cache_paths(url, cache_dir)
+        meta = _read_meta(meta_path) if os.path.exists(body_path) else None
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+    try:
+        response = session.get(url, headers=headers, stream=True, timeout=timeout)
+        if response.status_code == 304 and meta:
+            response.content  # drain so the connection returns to the pool
+            return _iter_file(body_path)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if meta:
+            print(f"Error fetching URL ({e}); using cached copy.")
+            return _iter_file(body_path)
+        print(f"Error fetching URL: {e}")
+        return None
+
+    validators = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+    if not cache_dir or not (validators['etag'] or validators['last_modified']):
+        return response.iter_content(CHUNK_SIZE)
+    return _stream_to_cache(response, body_path, meta_path, validators)
+
+
+def fetch_url(url: str, **kwargs) -> Optional[str]:
+    """Fetch a URL's body as text (see open_url for the options)."""
+    chunks = open_url(url, **kwargs)
+    if chunks is None:
+        return None
+    try:
+        return b"".join(chunks).decode('utf-8', errors='replace')
+    except requests.RequestException as e:
+        print(f"Error fetching URL: {e}")
+        return None
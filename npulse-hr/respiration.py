@@ -0,0 +1,152 @@
+"""
+Respiration
+Breathing rate from the slow baseline modulation of the sensor signals.
+
+Breathing moves the baseline of every channel at 0.1-0.5 Hz (6-30 breaths
+per minute). A band that low is a poor fit for the full sample rate: the
+IIR poles sit very close to the unit circle and every sample is filtered
+only to be thrown away by the 0.5 Hz pass band. The raw channels are
+therefore first decimated by an integer factor to about RESP_FS with a
+polyphase anti-alias FIR (resample_poly, which only computes the samples it
+keeps), then band-passed zero-phase and searched for breaths at the low
+rate. All channels go through each stage together.
+"""
+
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import numpy as np
+import scipy.signal as signal
+
+
+# Breathing pass band (Hz), its Butterworth order and the rate it is filtered at
+RESP_BAND = (0.1, 0.5)
+RESP_FILTER_ORDER = 2
+RESP_FS = 10.0
+
+# Breaths are at least MIN_BREATH_INTERVAL seconds apart and rise at least
+# BREATH_PROMINENCE standard deviations above their surroundings
+MIN_BREATH_INTERVAL = 1 / RESP_BAND[1]
+BREATH_PROMINENCE = 0.5
+
+# Anti-alias FIR length per unit of decimation factor. Only the breathing band
+# has to survive, so the filter passes up to a quarter of the output rate and
+# only needs to stop what would alias onto RESP_BAND; short filters do that
+ANTIALIAS_TAPS_PER_FACTOR = 4
+
+# Breath-to-breath rates outside this range (breaths per minute) are dropped
+BREATH_RANGE = (4, 40)
+
+
+def decimation_factor(fs: float, target: float = RESP_FS) -> int:
+    """Largest integer factor that keeps the decimated rate at or above target."""
+    return max(int(fs // target), 1)
+
+
+@lru_cache(maxsize=8)
+def antialias_filter(factor: int) -> np.ndarray:
+    """
+    Low-pass FIR for decimation by factor, cached per factor.
+
+    The returned array is shared between callers; do not modify it.
+    """
+    return signal.firwin(ANTIALIAS_TAPS_PER_FACTOR * factor + 1, 0.5 / factor, window=('kaiser', 6.0))
+
+
+def decimate_channels(samples: np.ndarray, fs: float, target: float = RESP_FS) -> Tuple[np.ndarray, float]:
+    """
+    Anti-alias filter and downsample every channel in one polyphase pass.
+
+    Args:
+        samples: Array of shape (n, channels)
+        fs: Sampling frequency in Hz
+        target: Lowest acceptable output rate in Hz
+
+    Returns:
+        Tuple of (decimated, rate): decimated has shape (channels, m) with the
+        channel mean removed, rate is its sampling frequency
+    """
+    x = np.array(np.asarray(samples).T, dtype=np.float64, order='C')
+    factor = decimation_factor(fs, target)
+    if not x.shape[1]:
+        return x, fs / factor
+    if factor == 1:
+        return x - x.mean(axis=1, keepdims=True), float(fs)
+    # Line padding keeps baseline drift from ringing in at the edges
+    x = signal.resample_poly(x, 1, factor, axis=-1, window=antialias_filter(factor), padtype='line')
+    return x - x.mean(axis=1, keepdims=True), fs / factor
+
+
+def respiration_signal(samples: np.ndarray, fs: float) -> Tuple[np.ndarray, float, np.ndarray]:
+    """
+    Decimated, normalized and breathing-band filtered channels.
+
+    Returns:
+        Tuple of (filtered, rate, usable): filtered has shape (channels, m),
+        usable flags channels that are not constant (left as zeros)
+    """
+    from ecg_processor import design_bandpass
+
+    x, rate = decimate_channels(samples, fs)
+    std = x.std(axis=1) if x.shape[1] else np.zeros(len(x))
+    usable = std > 0
+    x /= np.where(usable, std, 1.0)[:, None]
+    sos = design_bandpass(rate, RESP_FILTER_ORDER, RESP_BAND)
+    # sosfiltfilt pads by 3x the filter length; very short inputs are left unfiltered
+    if x.shape[1] <= 3 * (2 * len(sos) + 1):
+        return np.zeros_like(x), rate, np.zeros(len(x), dtype=bool)
+    return signal.sosfiltfilt(sos, x, axis=-1), rate, usable
+
+
+def breaths_to_rate(breaths: np.ndarray, rate: float) -> np.ndarray:
+    """Breath-to-breath rates (breaths per minute), with implausible ones removed."""
+    if len(breaths) < 2:
+        return np.array([])
+    values = 60 * rate / np.diff(breaths)
+    return values[(values > BREATH_RANGE[0]) & (values < BREATH_RANGE[1])]
+
+
+def empty_respiration(n_channels: int, fs: float) -> Dict:
+    """Result of respiration_rate for channels with no breaths detected (see there)."""
+    return {
+        'rate': [0.0] * n_channels,
+        'combined': 0.0,
+        'breaths': [np.zeros(0, dtype=np.int64) for _ in range(n_channels)],
+        'fs': fs / decimation_factor(fs),
+    }
+
+
+def respiration_rate(samples: np.ndarray, fs: float) -> Dict:
+    """
+    Breathing rate of each channel and of all channels together.
+
+    Args:
+        samples: Raw samples of shape (n, channels)
+        fs: Sampling frequency in Hz
+
+    Returns:
+        Dictionary with 'rate' (mean breaths per minute per channel, 0
+        without two usable breaths), 'combined' (mean over the
+        breath-to-breath rates of all channels), 'breaths' (breath indices
+        per channel, in input samples) and 'fs' (rate the breaths were
+        detected at)
+    """
+    filtered, rate, usable = respiration_signal(samples, fs)
+    factor = fs / rate
+    rates, breaths, all_values = [], [], []
+    for i, channel in enumerate(filtered):
+        found = np.array([], dtype=np.int64)
+        if usable[i]:
+            found, _ = signal.find_peaks(channel, distance=max(MIN_BREATH_INTERVAL * rate, 1),
+                                         prominence=BREATH_PROMINENCE)
+        values = breaths_to_rate(found, rate)
+        rates.append(float(np.mean(values)) if values.size else 0.0)
+        breaths.append(np.round(found * factor).astype(np.int64))
+        all_values.append(values)
+    pooled = np.concatenate(all_values) if all_values else np.array([])
+    return {
+        'rate': rates,
+        'combined': float(np.mean(pooled)) if pooled.size else 0.0,
+        'breaths': breaths,
+        'fs': rate,
+    }
@@ -0,0 +1,143 @@
+"""
+Sample Store
+Preallocated NumPy storage for samples arriving from the device.
+
+SampleStore keeps an (capacity, n_channels) int32 array plus a float64 arrival
+timestamp per sample. It doubles its capacity as samples arrive until
+max_capacity is reached and from then on behaves as a ring buffer, keeping the
+most recent max_capacity samples, so memory stays fixed however long a session
+runs. Samples are addressed by their absolute index since the last clear(),
+which lets readers poll for new data with a cursor.
+"""
+
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class SampleStore:
+    """
+    Growable ring buffer of integer samples with arrival timestamps.
+
+    Appends are amortized O(1) per sample. Reads return views into the
+    buffer whenever the requested range is contiguous; views are only valid
+    until the ring wraps over them, so copy data that must be kept.
+    """
+
+    def __init__(self, capacity: int = 4096, max_capacity: Optional[int] = None, n_channels: int = 3):
+        self.n_channels = n_channels
+        self.max_capacity = max_capacity
+        if max_capacity is not None:
+            capacity = min(capacity, max_capacity)
+        self._samples = np.empty((capacity, n_channels), dtype=np.int32)
+        self._times = np.empty(capacity, dtype=np.float64)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return len(self._samples)
+
+    @property
+    def total(self) -> int:
+        """Samples appended since the last clear(), including overwritten ones."""
+        return self._total
+
+    @property
+    def start(self) -> int:
+        """Absolute index of the oldest sample still held."""
+        return self._total - len(self)
+
+    @property
+    def dropped(self) -> int:
+        """Samples overwritten by the ring."""
+        return self.start
+
+    @property
+    def nbytes(self) -> int:
+        return self._samples.nbytes + self._times.nbytes
+
+    def __len__(self) -> int:
+        return min(self._total, self.capacity)
+
+    def clear(self) -> None:
+        """Forget all samples; the allocated capacity is kept."""
+        with self._lock:
+            self._total = 0
+
+    def _grow(self, needed: int) -> None:
+        """Enlarge the buffer to hold needed samples (lock held, ring not yet wrapped)."""
+        capacity = max(needed, 2 * self.capacity)
+        if self.max_capacity is not None:
+            capacity = min(capacity, self.max_capacity)
+        samples = np.empty((capacity, self.n_channels), dtype=np.int32)
+        times = np.empty(capacity, dtype=np.float64)
+        samples[:self._total] = self._samples[:self._total]
+        times[:self._total] = self._times[:self._total]
+        self._samples, self._times = samples, times
+
+    def append(self, rows: np.ndarray, timestamp: Optional[float] = None) -> int:
+        """
+        Append a block of samples that arrived together.
+
+        Args:
+            rows: (k, n_channels) array of samples
+            timestamp: Arrival time in seconds since the epoch (default now)
+
+        Returns:
+            Total number of samples appended so far
+        """
+        k = len(rows)
+        if not k:
+            return self._total
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            if self._total + k > self.capacity and self._total == len(self) \
+                    and (self.max_capacity is None or self.capacity < self.max_capacity):
+                self._grow(self._total + k)
+
+            capacity = self.capacity
+            if k > capacity:
+                rows = rows[-capacity:]
+                self._total += k - capacity
+                k = capacity
+            pos = self._total % capacity
+            first = min(k, capacity - pos)
+            self._samples[pos:pos + first] = rows[:first]
+            self._times[pos:pos + first] = timestamp
+            if first < k:
+                self._samples[:k - first] = rows[first:]
+                self._times[:k - first] = timestamp
+            self._total += k
+            return self._total
+
+    def snapshot(self, since: int = 0) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Samples appended at or after absolute index since.
+
+        Samples already overwritten by the ring are skipped.
+
+        Returns:
+            (samples, timestamps, cursor) where cursor is the index to pass as
+            since on the next call
+        """
+        with self._lock:
+            total, capacity = self._total, self.capacity
+            samples, times = self._samples, self._times
+        first = max(since, total - min(total, capacity))
+        if first >= total:
+            return samples[:0], times[:0], total
+
+        lo, hi = first % capacity, (total - 1) % capacity + 1
+        if lo < hi:
+            return samples[lo:hi], times[lo:hi], total
+        return (np.concatenate([samples[lo:], samples[:hi]]),
+                np.concatenate([times[lo:], times[:hi]]), total)
+
+    def view(self) -> np.ndarray:
+        """All samples held, oldest first."""
+        return self.snapshot()[0]
@@ -0,0 +1,235 @@
+"""
+Signal Quality
+Per-window signal quality indices (SQI) used to mask unusable stretches.
+
+Each channel is cut into strided windows and scored on four indices computed
+from the raw samples, before any filtering:
+
+- flatline: window standard deviation relative to the channel's median
+  window (a disconnected or stuck sensor drops to a small fraction; motion
+  bursts rise far above it)
+- clipping: fraction of samples sitting on the channel's extreme values
+- kurtosis: spikes from motion and electrode pops give much heavier tails
+  than the channel's typical window (clean ECG is already heavy-tailed, so
+  the limit is relative to the channel's median)
+- concentration: share of the window's power (above the bottom of the HR
+  band) that lies in the HR band
+
+A window is good when all four indices are within limits. Samples no good
+window covers are masked: replaced by a straight line between the nearest
+good samples, so they produce no beats and no filter transients. Windows
+are at least as long as the longest interval the HR range accepts, so an
+interval spanning a masked window is always rejected as implausible.
+"""
+
+from typing import Dict, Sequence
+
+import numpy as np
+import scipy.fft
+from numpy.lib.stride_tricks import sliding_window_view
+
+from respiration import decimate_channels
+
+
+# Window length and hop (seconds); SQI_WINDOW must not fall below the longest
+# accepted beat interval (BPM_SCALE / BPM_RANGE[0] = 1.83 s)
+SQI_WINDOW = 2.0
+SQI_HOP = 2.0
+
+# Band the heart rate lies in (Hz) for the spectral concentration index
+SQI_BAND = (0.5, 3.5)
+
+# Limits for a good window
+FLATLINE_RATIO = 0.1
+BURST_RATIO = 10.0
+CLIPPING_FRACTION = 0.05
+KURTOSIS_RATIO = 3.0
+CONCENTRATION_MIN = 0.15
+
+SQI_FIELDS = ('flatline', 'clipping', 'kurtosis', 'concentration')
+
+# Rate (Hz) of the decimated copy channels are ranked on; its anti-alias
+# filter passes up to a quarter of that, above the top of SQI_BAND
+SELECTION_FS = 25.0
+
+
+def empty_quality(n_channels: int, fs: float = 220, window: float = SQI_WINDOW,
+                  hop: float = SQI_HOP) -> Dict:
+    """Result of window_quality for a recording too short to score (see there)."""
+    shape = (0, n_channels)
+    quality = {'fs': fs, 'window': window, 'hop': hop, 'start': np.zeros(0, dtype=np.int64),
+               'time': np.zeros(0, dtype=np.float32)}
+    quality.update({key: np.zeros(shape, dtype=np.float32) for key in SQI_FIELDS})
+    quality['good'] = np.ones(shape, dtype=bool)
+    return quality
+
+
+def window_quality(samples: np.ndarray, fs: float = 220, window: float = SQI_WINDOW,
+                   hop: float = SQI_HOP, offset: int = 0) -> Dict:
+    """
+    Signal quality indices of every channel over strided windows.
+
+    Samples after the last full window are scored with it.
+
+    Args:
+        samples: Raw samples of shape (n, channels)
+        fs: Sampling frequency in Hz
+        window: Window length in seconds
+        hop: Step between window starts in seconds
+        offset: Recording index of samples[0], added to the window positions
+
+    Returns:
+        Dictionary with 'fs', 'window', 'hop', 'start' (window start
+        indices in samples), 'time' (window starts in the recording, s) and one (windows, channels) array
+        per SQI_FIELDS key, plus the boolean 'good'
+    """
+    # Channel-major float32 so every window is a contiguous row
+    x = np.ascontiguousarray(np.asarray(samples).T, dtype=np.float32)
+    n_channels, n = x.shape
+    width = min(max(int(round(window * fs)), 4), n)
+    step = max(int(round(hop * fs)), 1)
+    starts = np.arange(0, n - width + 1, step) if width >= 4 else np.zeros(0, dtype=np.int64)
+    if not len(starts):
+        # Too short to score
+        return empty_quality(n_channels, fs, window, hop)
+    quality = {'fs': fs, 'window': window, 'hop': hop, 'start': starts,
+               'time': ((starts + offset) / fs).astype(np.float32)}
+
+    # (channels, windows, width) views: no copies of the signal
+    views = sliding_window_view(x, width, axis=-1)[:, starts]
+    rails = (x == x.min(axis=1, keepdims=True)) | (x == x.max(axis=1, keepdims=True))
+    clipping = np.count_nonzero(sliding_window_view(rails, width, axis=-1)[:, starts], axis=-1) / width
+
+    centered = views - views.mean(axis=-1, keepdims=True)
+    squared = centered * centered
+    variance = squared.mean(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        kurtosis = np.where(variance > 0, np.einsum('ijk,ijk->ij', squared, squared) / width / (variance * variance), 0.0)
+    typical_kurtosis = np.median(kurtosis, axis=1, keepdims=True)
+
+    # Spread and spectrum are measured about each window's least-squares line
+    # so baseline drift scores as neither; the line is removed algebraically
+    t = np.arange(width, dtype=np.float32) - (width - 1) / 2
+    slope = (centered @ t) / (t @ t)
+    std = np.sqrt(np.maximum(variance - slope * slope * (t @ t) / width, 0))
+    typical_std = np.median(std, axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        flatline = np.where(typical_std > 0, std / typical_std, 0.0)
+
+    taper = np.hanning(width).astype(np.float32)
+    spectrum = scipy.fft.rfft(centered * taper, axis=-1) - slope[..., None] * scipy.fft.rfft(t * taper)
+    power = spectrum.real ** 2 + spectrum.imag ** 2
+    freqs = np.fft.rfftfreq(width, 1 / fs)
+    above = freqs >= SQI_BAND[0]
+    in_band = above & (freqs <= SQI_BAND[1])
+    total = power[..., above].sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        concentration = np.where(total > 0, power[..., in_band].sum(axis=-1) / total, 0.0)
+
+    good = ((flatline >= FLATLINE_RATIO) & (flatline <= BURST_RATIO) & (clipping <= CLIPPING_FRACTION)
+            & (kurtosis <= KURTOSIS_RATIO * typical_kurtosis) & (concentration >= CONCENTRATION_MIN))
+    quality.update({
+        'flatline': flatline.T.astype(np.float32),
+        'clipping': clipping.T.astype(np.float32),
+        'kurtosis': kurtosis.T.astype(np.float32),
+        'concentration': concentration.T.astype(np.float32),
+        'good': good.T.copy(),
+    })
+    return quality
+
+
+def select_channels(quality: Dict, channels: Sequence[int], n_channels: int) -> Dict:
+    """
+    Widen quality scored on some channels to all n_channels.
+
+    Channels that were not scored get zero indices and no good windows.
+    """
+    widened = dict(quality)
+    for key in SQI_FIELDS + ('good',):
+        scored = quality[key]
+        full = np.zeros((len(scored), n_channels), dtype=scored.dtype)
+        full[:, list(channels)] = scored
+        widened[key] = full
+    return widened
+
+
+def channel_scores(samples: np.ndarray, fs: float = 220) -> np.ndarray:
+    """
+    Rank channels for beat detection from a decimated copy of the recording.
+
+    The score is the periodicity of the HR band: the highest normalized
+    autocorrelation at lags between the shortest and longest beat interval
+    SQI_BAND allows, with the autocorrelation taken by FFT of the band-limited
+    power spectrum. A channel with regular pulses scores close to 1, noise
+    close to 0. At SELECTION_FS this costs a small fraction of filtering the
+    channels at the full rate.
+
+    Args:
+        samples: Raw samples of shape (n, channels)
+        fs: Sampling frequency in Hz
+
+    Returns:
+        Score per channel between 0 and 1 (higher is better)
+    """
+    decimated, rate = decimate_channels(samples, fs, SELECTION_FS)
+    n = decimated.shape[1]
+    lags = np.arange(n) / rate
+    in_range = (lags >= 1 / SQI_BAND[1]) & (lags <= 1 / SQI_BAND[0])
+    if not in_range.any():
+        return np.zeros(decimated.shape[0])
+    # Zero padding to 2n makes the circular autocorrelation linear
+    size = scipy.fft.next_fast_len(2 * n, real=True)
+    spectrum = scipy.fft.rfft(decimated, size, axis=-1)
+    freqs = np.fft.rfftfreq(size, 1 / rate)
+    in_band = (freqs >= SQI_BAND[0]) & (freqs <= SQI_BAND[1])
+    power = np.where(in_band, spectrum.real ** 2 + spectrum.imag ** 2, 0.0)
+    autocorrelation = scipy.fft.irfft(power, size, axis=-1)[:, :n]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = autocorrelation[:, in_range].max(axis=-1) / autocorrelation[:, 0]
+    return np.clip(np.nan_to_num(scores), 0.0, 1.0)
+
+
+def sample_mask(quality: Dict, n_samples: int) -> np.ndarray:
+    """
+    Per-sample goodness from window quality.
+
+    Args:
+        quality: Result of window_quality
+        n_samples: Number of samples that were scored
+
+    Returns:
+        Boolean array of shape (n_samples, channels), True where at least one
+        good window covers the sample (samples past the last window take its
+        verdict; all True when nothing could be scored)
+    """
+    starts, good = quality['start'], quality['good']
+    if not len(starts):
+        return np.ones((n_samples, good.shape[1]), dtype=bool)
+    width = int(round(quality['window'] * quality['fs']))
+    ends = np.minimum(starts + width, n_samples)
+    ends[-1] = n_samples
+    # Count good windows covering each sample with a difference array
+    coverage = np.zeros((n_samples + 1, good.shape[1]), dtype=np.int32)
+    np.add.at(coverage, np.minimum(starts, n_samples), good.astype(np.int32))
+    np.add.at(coverage, ends, -good.astype(np.int32))
+    return np.cumsum(coverage[:-1], axis=0) > 0
+
+
+def mask_samples(samples: np.ndarray, good: np.ndarray) -> np.ndarray:
+    """
+    Replace the samples of bad stretches by straight lines between the
+    surrounding good samples.
+
+    Channels without any good sample are returned unchanged.
+
+    Returns:
+        float64 array shaped like samples
+    """
+    x = np.array(samples, dtype=np.float64)
+    index = np.arange(len(x))
+    for c in range(x.shape[1]):
+        keep = good[:, c]
+        if keep.all() or not keep.any():
+            continue
+        x[~keep, c] = np.interp(index[~keep], index[keep], x[keep, c])
+    return x
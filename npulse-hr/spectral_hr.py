@@ -0,0 +1,175 @@
+"""
+Spectral HR
+Average heart rate from the dominant HR-band peak of a Welch power spectrum.
+
+For triage only the average rate of a recording matters, not its beats. The
+raw channels are decimated to about SPECTRAL_FS with the polyphase
+anti-alias FIR of respiration.py, so the spectrum is taken over a tenth of
+the samples, and no full-rate band-pass filter or peak search runs at all.
+Welch averaging over overlapping segments keeps single artefacts from
+dominating the spectrum.
+
+Pulse trains carry much of their power in harmonics, so the strongest bin
+can be twice the heart rate. A peak whose half frequency also holds a
+local peak with at least SUBHARMONIC_RATIO of its power is taken to be a
+harmonic and the search moves down an octave, never below the HR band. The
+peak is then refined between bins by a parabola through the log power of
+the peak bin and its neighbours (Gaussian interpolation), which for a Hann
+window is accurate to a small fraction of a bin.
+
+Confidence is the share of the power from the band's lower edge up to the
+HARMONICS-th harmonic that lies at the fundamental and its harmonics. Noisy
+recordings without a clear rhythm score low, and estimates below
+MIN_SPECTRAL_CONFIDENCE are not reported.
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+import scipy.signal as signal
+
+from respiration import decimate_channels
+
+
+# Rate (Hz) the channels are decimated to; the anti-alias filter passes up to
+# a quarter of it, above the second harmonic of the fastest accepted rate
+SPECTRAL_FS = 25.0
+
+# Welch segment length (seconds) and overlap (fraction of a segment); 16 s
+# segments put bins about 4.6 BPM apart on the BPM_SCALE clock
+WELCH_SEGMENT = 16.0
+WELCH_OVERLAP = 0.5
+
+# A peak is a harmonic when its half frequency holds this share of its power
+SUBHARMONIC_RATIO = 0.3
+
+# Harmonics (fundamental included) counted as periodic power in the confidence
+HARMONICS = 3
+
+# Estimates with a lower confidence are reported as 0 (no value); clean ECG
+# scores above 0.9, recordings without a clear rhythm mostly below 0.6
+MIN_SPECTRAL_CONFIDENCE = 0.7
+
+
+def hr_band(bpm_scale: float, bpm_range: Tuple[float, float]) -> Tuple[float, float]:
+    """Frequency band (Hz of the sample clock) of the accepted HR range."""
+    return bpm_range[0] / bpm_scale, bpm_range[1] / bpm_scale
+
+
+def welch_spectra(samples: np.ndarray, fs: float = 220,
+                  segment: float = WELCH_SEGMENT) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Welch power spectral density of every channel, on a decimated copy.
+
+    Args:
+        samples: Raw samples of shape (n, channels)
+        fs: Sampling frequency in Hz
+        segment: Welch segment length in seconds (shorter recordings use one
+            segment of their full length)
+
+    Returns:
+        Tuple of (freqs, psd): psd has shape (channels, len(freqs))
+    """
+    decimated, rate = decimate_channels(samples, fs, SPECTRAL_FS)
+    n = decimated.shape[1]
+    nperseg = max(min(int(round(segment * rate)), n), 1)
+    return signal.welch(decimated, rate, window='hann', nperseg=nperseg,
+                        noverlap=int(nperseg * WELCH_OVERLAP), detrend='constant', axis=-1)
+
+
+def spectral_peak(freqs: np.ndarray, psd: np.ndarray, band: Tuple[float, float]) -> Tuple[float, float]:
+    """
+    Fundamental frequency of the dominant periodic component within band.
+
+    Args:
+        freqs: Frequencies of the spectrum (evenly spaced from 0)
+        psd: Power spectral density, one value per frequency
+        band: Lowest and highest acceptable fundamental (Hz)
+
+    Returns:
+        Tuple of (frequency, confidence): the interpolated peak frequency,
+        within band (0 when the band holds no power), and the share of the
+        power from band[0] up to the HARMONICS-th harmonic found within one
+        bin of the fundamental or a harmonic
+    """
+    in_band = np.flatnonzero((freqs >= band[0]) & (freqs <= band[1]))
+    if len(in_band) < 3:
+        return 0.0, 0.0
+    total = psd[in_band].sum()
+    if total <= 0:
+        return 0.0, 0.0
+    step = freqs[1] - freqs[0]
+    k = int(in_band[np.argmax(psd[in_band])])
+    # Move down an octave while the half frequency holds a peak of comparable
+    # power within the band; it must stand above the bins two either side of
+    # it, so the rising low-frequency floor does not count
+    while True:
+        half = int(round(k / 2))
+        if half < 3:
+            break
+        j = half - 1 + int(np.argmax(psd[half - 1:half + 2]))
+        if freqs[j] < band[0] or psd[j] < SUBHARMONIC_RATIO * psd[k] or psd[j] <= max(psd[j - 2], psd[j + 2]):
+            break
+        k = j
+    k = min(max(k, 1), len(psd) - 2)
+
+    # Gaussian interpolation: parabola through the log power around the peak
+    a, b, c = np.log(np.maximum(psd[k - 1:k + 2], np.finfo(float).tiny))
+    curvature = a - 2 * b + c
+    delta = 0.5 * (a - c) / curvature if curvature < 0 else 0.0
+    frequency = float(np.clip((k + float(np.clip(delta, -0.5, 0.5))) * step, band[0], band[1]))
+
+    # A maximum on the band edge is the rising low-frequency floor (or a
+    # rhythm outside the band), not a heart rate
+    if k <= in_band[0] or k >= in_band[-1] or psd[k] < max(psd[k - 1], psd[k + 1]):
+        return frequency, 0.0
+    first = int(in_band[0])
+    last = min(int(round((HARMONICS + 0.5) * frequency / step)), len(psd))
+    harmonics = [int(round(h * frequency / step)) for h in range(1, HARMONICS + 1)]
+    periodic = sum(psd[j - 1:j + 2].sum() for j in harmonics if j + 1 < last)
+    span = psd[first:last].sum()
+    confidence = float(periodic / span) if span > 0 else 0.0
+    return frequency, min(confidence, 1.0)
+
+
+def spectral_hr(samples: np.ndarray, fs: float = 220) -> Dict:
+    """
+    Average HR of each channel and of all channels together from the spectrum.
+
+    The combined rate is the peak of the channels' spectra summed after each
+    is normalized to unit power in the HR band, so every usable channel
+    counts equally whatever its gain.
+
+    Args:
+        samples: Raw samples of shape (n, channels)
+        fs: Sampling frequency in Hz
+
+    Returns:
+        Dictionary with 'bpm' (per channel, 0 without a peak or below
+        MIN_SPECTRAL_CONFIDENCE), 'confidence' (per channel), 'combined'
+        (0 likewise) and 'combined_confidence'
+    """
+    from ecg_processor import BPM_RANGE, BPM_SCALE
+
+    band = hr_band(BPM_SCALE, BPM_RANGE)
+    n_channels = np.asarray(samples).shape[1]
+    freqs, psd = welch_spectra(samples, fs)
+    bpm, confidence = [], []
+    in_band = (freqs >= band[0]) & (freqs <= band[1])
+    band_power = psd[:, in_band].sum(axis=1) if psd.size else np.zeros(n_channels)
+    for channel in psd:
+        frequency, share = spectral_peak(freqs, channel, band)
+        bpm.append(BPM_SCALE * frequency if share >= MIN_SPECTRAL_CONFIDENCE else 0.0)
+        confidence.append(share)
+    usable = band_power > 0
+    if usable.any():
+        pooled = (psd[usable] / band_power[usable, None]).sum(axis=0)
+        frequency, combined_confidence = spectral_peak(freqs, pooled, band)
+    else:
+        frequency, combined_confidence = 0.0, 0.0
+    return {
+        'bpm': bpm,
+        'confidence': confidence,
+        'combined': BPM_SCALE * frequency if combined_confidence >= MIN_SPECTRAL_CONFIDENCE else 0.0,
+        'combined_confidence': combined_confidence,
+    }
@@ -0,0 +1,339 @@
+"""
+Streaming ECG Processor
+Bounded-memory analysis for recordings too large to load at once.
+
+Recordings are read in fixed-size blocks through generators. The band-pass
+filter runs forward with carried second-order-section state and backward over
+each block plus a lookahead overlap, which reproduces the zero-phase output of
+filtfilt away from the recording edges. Peaks are detected on a sliding
+context window and only committed once enough samples on both sides are
+known, so beats that straddle block boundaries are found exactly once.
+
+Committed beats are kept (a few bytes per beat, not per sample) so the
+combined HR comes from the same consensus beat train as in analyze_ecg_file.
+Signal quality masking is not applied: bad stretches are filtered and
+searched for beats like the rest of the recording.
+"""
+
+import os
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import scipy.signal as signal
+
+from ecg_processor import (BPM_RANGE, BPM_SCALE, SENSOR_COLUMNS, TEXT_TAIL_HOLD, beat_bpm, combine_beats,
+                           design_bandpass, parse_text_stream)
+from recording_format import (HEADER_SIZE, SAMPLE_DTYPE, is_binary_recording, iter_compressed_blocks,
+                              read_header)
+
+
+DEFAULT_BLOCK_SIZE = 65536      # samples per block
+TRIM_SAMPLES = 500              # samples dropped at each end, as in analyze_ecg_file
+
+# Text input is read in byte chunks of roughly block_size lines
+_TEXT_BYTES_PER_SAMPLE = 16
+
+
+def _iter_file_chunks(file_path: str, chunk_bytes: int) -> Iterator[bytes]:
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _iter_text_blocks(file_path: str, block_size: int) -> Iterator[np.ndarray]:
+    """Yield parsed sample blocks from a comma-separated text recording."""
+    read_bytes = max(block_size * _TEXT_BYTES_PER_SAMPLE, TEXT_TAIL_HOLD * 2)
+    yield from parse_text_stream(_iter_file_chunks(file_path, read_bytes))
+
+
+def iter_sample_blocks(file_path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[np.ndarray]:
+    """
+    Yield (n, 3) sample blocks from a text or binary recording.
+
+    Binary recordings yield at most block_size rows per block; text recordings
+    yield whatever each block_size-sized read parses to.
+    """
+    if is_binary_recording(file_path):
+        header = read_header(file_path)
+        if header is None:
+            return
+        if header['codec']:
+            for block in iter_compressed_blocks(file_path):
+                yield block[:, :len(SENSOR_COLUMNS)]
+            return
+        # Plain sequential reads keep resident memory bounded, unlike touching a memmap
+        channels = header['channels']
+        remaining = header['n_samples'] or None
+        with open(file_path, 'rb') as f:
+            f.seek(HEADER_SIZE)
+            while remaining is None or remaining > 0:
+                rows = block_size if remaining is None else min(block_size, remaining)
+                block = np.fromfile(f, dtype=SAMPLE_DTYPE, count=rows * channels)
+                rows = len(block) // channels
+                if rows == 0:
+                    break
+                if remaining is not None:
+                    remaining -= rows
+                yield block[:rows * channels].reshape(rows, channels)[:, :len(SENSOR_COLUMNS)]
+    else:
+        yield from _iter_text_blocks(file_path, block_size)
+
+
+def _iter_trimmed(file_path: str, block_size: int, start: int, stop: int) -> Iterator[np.ndarray]:
+    """Yield float blocks covering samples [start, stop) of the recording."""
+    position = 0
+    for block in iter_sample_blocks(file_path, block_size):
+        lo = max(start - position, 0)
+        hi = min(stop - position, len(block))
+        position += len(block)
+        if hi > lo:
+            yield np.asarray(block[lo:hi], dtype=np.float64)
+        if position >= stop:
+            break
+
+
+def _recording_stats(file_path: str, block_size: int) -> Optional[Dict]:
+    """First pass: sample count plus mean/std of the trimmed region per channel."""
+    n = 0
+    origin = None
+    total = np.zeros(len(SENSOR_COLUMNS))
+    total_sq = np.zeros(len(SENSOR_COLUMNS))
+    head: List[np.ndarray] = []
+    tail = np.empty((0, len(SENSOR_COLUMNS)))
+
+    for block in iter_sample_blocks(file_path, block_size):
+        block = np.asarray(block, dtype=np.float64)
+        if origin is None:
+            origin = block[0].copy()    # shift to keep the variance sums well conditioned
+        shifted = block - origin
+        total += shifted.sum(axis=0)
+        total_sq += np.square(shifted).sum(axis=0)
+        if n < TRIM_SAMPLES:
+            head.append(shifted[:TRIM_SAMPLES - n])
+        tail = np.concatenate([tail, shifted])[-TRIM_SAMPLES:]
+        n += len(block)
+
+    if n == 0:
+        return None
+    if n <= 2 * TRIM_SAMPLES:
+        return {'n': n}
+
+    head_block = np.concatenate(head)
+    count = n - 2 * TRIM_SAMPLES
+    trimmed_sum = total - head_block.sum(axis=0) - tail.sum(axis=0)
+    trimmed_sq = total_sq - np.square(head_block).sum(axis=0) - np.square(tail).sum(axis=0)
+    mean = trimmed_sum / count
+    var = np.maximum(trimmed_sq / count - mean ** 2, 0)
+    return {'n': n, 'mean': mean + origin, 'std': np.sqrt(var), 'count': count}
+
+
+class _ZeroPhaseFilter:
+    """
+    Block-wise sosfiltfilt along axis 0.
+
+    The forward pass carries its state across blocks and is exact. The backward
+    pass for each block starts from steady state at the end of a lookahead
+    overlap, so its start-up transient has decayed before the committed
+    samples. Both recording edges get sosfiltfilt's odd-extension padding, which
+    makes the first and last samples match the batch filter as well.
+    """
+
+    def __init__(self, sos: np.ndarray, lookahead: int):
+        self.sos = sos
+        self.lookahead = lookahead
+        self.zi_unit = signal.sosfilt_zi(sos)[:, :, None]
+        n_zeros = min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum())
+        self.padlen = 3 * (2 * len(sos) + 1 - n_zeros)
+        self.zi = None
+        self.head: List[np.ndarray] = []
+        self.raw_tail = None
+        self.pending = None
+
+    def _forward(self, x: np.ndarray) -> None:
+        y, self.zi = signal.sosfilt(self.sos, x, axis=0, zi=self.zi)
+        self.pending = y if self.pending is None else np.concatenate([self.pending, y])
+        self.raw_tail = np.concatenate([self.raw_tail, x])[-(self.padlen + 1):]
+
+    def _backward(self, y: np.ndarray) -> np.ndarray:
+        rev = y[::-1]
+        out, _ = signal.sosfilt(self.sos, rev, axis=0, zi=self.zi_unit * rev[0])
+        return out[::-1]
+
+    def push(self, x: np.ndarray) -> np.ndarray:
+        """Filter one block and return every sample that is now final."""
+        if self.zi is None:
+            self.head.append(x)
+            x = np.concatenate(self.head)
+            if len(x) <= self.padlen:
+                return x[:0]
+            self.head = []
+            # Odd extension before the first sample, as sosfiltfilt does
+            ext = 2 * x[0] - x[self.padlen:0:-1]
+            _, self.zi = signal.sosfilt(self.sos, ext, axis=0, zi=self.zi_unit * ext[0])
+            self.raw_tail = x[:0]
+
+        self._forward(x)
+        if len(self.pending) <= 2 * self.lookahead:
+            return self.pending[:0]
+        done = len(self.pending) - self.lookahead
+        out = self._backward(self.pending)[:done]
+        self.pending = self.pending[done:]
+        return out
+
+    def finish(self) -> np.ndarray:
+        """Flush the remaining samples with odd-extension padding at the end."""
+        if self.zi is None:
+            raise ValueError("not enough samples for zero-phase filtering")
+        ext = 2 * self.raw_tail[-1] - self.raw_tail[-2::-1]
+        self._forward(ext)
+        out = self._backward(self.pending)[:-self.padlen]
+        self.pending = None
+        return out
+
+
+class _PeakStream:
+    """Commit find_peaks results from a sliding window exactly once per beat."""
+
+    def __init__(self, fs: float, context: int):
+        self.fs = fs
+        self.context = context
+        self.margin = context // 2
+        self.history = np.empty(0)
+        self.offset = 0                 # absolute index of history[0]
+        self.last_peak: Optional[int] = None
+        self.peaks: List[np.ndarray] = []
+        self.bpm_count = 0
+        self.bpm_sum = 0.0
+        self.bpm_min = np.inf
+        self.bpm_max = -np.inf
+
+    def feed(self, filtered: np.ndarray, final: bool = False) -> None:
+        window = np.concatenate([self.history, filtered])
+        peaks, _ = signal.find_peaks(window, distance=self.fs * 0.5, prominence=0.5)
+        peaks = peaks + self.offset
+
+        limit = self.offset + len(window) - (0 if final else self.margin)
+        if self.last_peak is not None:
+            peaks = peaks[peaks > self.last_peak]
+        self._commit(peaks[peaks < limit])
+
+        keep = min(self.context, len(window))
+        self.offset += len(window) - keep
+        self.history = window[len(window) - keep:]
+
+    def _commit(self, peaks: np.ndarray) -> None:
+        if not len(peaks):
+            return
+        self.peaks.append(peaks.astype(np.int32))
+        if self.last_peak is not None:
+            peaks = np.r_[self.last_peak, peaks]
+        self.last_peak = int(peaks[-1])
+        if len(peaks) < 2:
+            return
+        bpm = BPM_SCALE / (np.diff(peaks) / self.fs)
+        bpm = bpm[(bpm > BPM_RANGE[0]) & (bpm < BPM_RANGE[1])]
+        if bpm.size:
+            self.bpm_count += bpm.size
+            self.bpm_sum += float(bpm.sum())
+            self.bpm_min = min(self.bpm_min, float(bpm.min()))
+            self.bpm_max = max(self.bpm_max, float(bpm.max()))
+
+    def summary(self) -> Dict:
+        if not self.bpm_count:
+            return {'avg': 0, 'min': 0, 'max': 0}
+        return {'avg': self.bpm_sum / self.bpm_count, 'min': self.bpm_min, 'max': self.bpm_max}
+
+
+def analyze_ecg_stream(file_path: str, fs: int = 220, block_size: int = DEFAULT_BLOCK_SIZE,
+                       overlap_seconds: float = 5.0) -> Optional[Dict]:
+    """
+    Analyze a recording block by block with bounded memory.
+
+    Produces the per-sensor and fused combined HR of analyze_ecg_file with
+    mask_bad_windows=False, without ever holding the whole recording. The file
+    is read twice: once for the sample count and normalization statistics,
+    once for filtering and peak detection.
+
+    Args:
+        file_path: Path to a text or binary recording
+        fs: Sampling frequency in Hz used for filtering and BPM
+        block_size: Samples per processing block
+        overlap_seconds: Lookahead for the backward filter pass and the
+            peak-detection context on each side of a block
+
+    Returns:
+        Dictionary with hr_results, combined_hr, total_samples and
+        sampling_rate, or None if failed
+    """
+    if file_path.startswith("http") or not os.path.exists(file_path):
+        print("Streaming analysis needs a local file.")
+        return None
+
+    stats = _recording_stats(file_path, block_size)
+    if stats is None:
+        print("No valid data found in the file.")
+        return None
+
+    n = stats['n']
+    n_channels = len(SENSOR_COLUMNS)
+    hr_results = [{'avg': 0, 'min': 0, 'max': 0} for _ in range(n_channels)]
+    # Beat indices per sensor, relative to the start of the recording
+    peaks = [np.array([], dtype=np.int32) for _ in range(n_channels)]
+
+    if n > 2 * TRIM_SAMPLES and stats['count'] >= 10:
+        active = np.flatnonzero(stats['std'] > 0)
+        for i in np.flatnonzero(stats['std'] == 0):
+            print(f"Sensor {i+1} signal is constant; cannot process.")
+
+        overlap = max(int(overlap_seconds * fs), 1)
+        zero_phase = _ZeroPhaseFilter(design_bandpass(fs), overlap)
+        mean, std = stats['mean'][active], stats['std'][active]
+        streams = [_PeakStream(fs, 2 * overlap) for _ in active]
+
+        for block in _iter_trimmed(file_path, block_size, TRIM_SAMPLES, n - TRIM_SAMPLES):
+            filtered = zero_phase.push((block[:, active] - mean) / std)
+            for j, stream in enumerate(streams):
+                stream.feed(filtered[:, j])
+
+        filtered = zero_phase.finish()
+        for j, stream in enumerate(streams):
+            stream.feed(filtered[:, j], final=True)
+
+        for j, stream in zip(active, streams):
+            hr_results[j] = stream.summary()
+            if stream.peaks:
+                peaks[j] = np.concatenate(stream.peaks) + TRIM_SAMPLES
+    else:
+        print("Not enough data points to trim for streaming analysis.")
+
+    # Combined HR from the consensus beat train, as in analyze_ecg_file
+    _, combined_hr = combine_beats(peaks, [beat_bpm(sensor_peaks, fs) for sensor_peaks in peaks], fs)
+
+    header = read_header(file_path) if is_binary_recording(file_path) else None
+
+    return {
+        'hr_results': hr_results,
+        'combined_hr': combined_hr,
+        'total_samples': n,
+        # Text recordings carry no rate; assume a 60 second recording
+        'sampling_rate': header['sample_rate'] if header else n / 60
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python stream_processor.py <recording>")
+        sys.exit(1)
+
+    results = analyze_ecg_stream(sys.argv[1])
+    if results:
+        from ecg_processor import format_hr_results
+        print(f"Total Samples: {results['total_samples']}")
+        print(format_hr_results(results['hr_results'], results['combined_hr']))
+    else:
+        print("Analysis failed. Check file path and data format.")
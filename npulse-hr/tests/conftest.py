@@ -0,0 +1,26 @@
+import contextlib
+import os
+import sys
+
+import pytest
+
+# The modules live flat in the project directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def http_server(tmp_path):
+    """
+    Serve a fresh directory over local HTTP with ETag validators.
+
+    Yields (base URL, directory, stop); calling stop() takes the server down
+    before the test ends.
+    """
+    # The benchmark's stand-in for the recordings host, shared rather than copied
+    from benchmark import local_http_server
+
+    directory = tmp_path / 'served'
+    directory.mkdir()
+    with contextlib.ExitStack() as stack:
+        base = stack.enter_context(local_http_server(str(directory)))
+        yield base, directory, stack.close
@@ -0,0 +1,49 @@
+"""Synthetic ECG recordings shaped like real ones for the tests."""
+
+import numpy as np
+
+# Offset (s), width (s) and amplitude of the P, Q, R, S and T waves relative to the R peak
+WAVES = [(-0.16, 0.025, 0.12), (-0.025, 0.008, -0.12), (0.0, 0.009, 1.0), (0.03, 0.01, -0.25), (0.28, 0.05, 0.3)]
+
+# Gain and baseline of each sensor
+SENSORS = [(300, 2000), (220, 2500), (160, 4800)]
+
+
+def synthetic_ecg(seconds: float = 60, bpm: float = 75, fs: float = 220, noise: float = 4.0,
+                  seed: int = 0) -> np.ndarray:
+    """
+    Three-sensor int16 ECG: sharp QRS complexes, P and T waves, breathing
+    baseline wander, white noise and 2% beat-to-beat interval jitter.
+
+    bpm is on the pipeline's BPM_SCALE clock, so beats are 73 / bpm seconds apart.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * fs)
+    interval = 73.0 / bpm * fs
+    beats = []
+    position = rng.uniform(0, interval)
+    while position < n:
+        beats.append(position)
+        position += interval * rng.normal(1, 0.02)
+    beats = np.array(beats)
+    t = np.arange(n)
+
+    pulse = np.zeros(n)
+    for offset, width, amplitude in WAVES:
+        for center in beats + offset * fs:
+            lo, hi = max(int(center - 5 * width * fs), 0), min(int(center + 5 * width * fs) + 1, n)
+            pulse[lo:hi] += amplitude * np.exp(-0.5 * ((t[lo:hi] - center) / (width * fs)) ** 2)
+
+    channels = []
+    for i, (gain, base) in enumerate(SENSORS):
+        wander = 40 * np.sin(2 * np.pi * 0.25 * t / fs + i)
+        channels.append(base + gain * pulse + wander + rng.normal(0, noise, n))
+    return np.round(np.column_stack(channels)).astype(np.int16)
+
+
+def noise_recording(seconds: float = 60, fs: float = 220, seed: int = 0) -> np.ndarray:
+    """Three sensors of drifting noise without any rhythm."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * fs)
+    drift = np.cumsum(rng.normal(0, 1, (n, 3)), axis=0)
+    return np.round(2000 + drift + rng.normal(0, 8, (n, 3))).astype(np.int16)
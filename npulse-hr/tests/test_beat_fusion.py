@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from beat_fusion import fuse_beats
+from ecg_processor import BPM_SCALE, beat_bpm, combine_beats, hr_trend, rr_series
+
+
+def beat_trains(seconds=60, interval=165, fs=220, seed=0):
+    """Three sensors seeing the same heartbeats, each a few samples off."""
+    rng = np.random.default_rng(seed)
+    beats = np.cumsum(rng.normal(interval, 3, int(seconds * fs / interval))).astype(np.int64)
+    return [beats + rng.integers(-4, 5, len(beats)) for _ in range(3)]
+
+
+def test_nearby_beats_of_all_sensors_become_one():
+    peaks = beat_trains()
+
+    fusion = fuse_beats(peaks, 220)
+
+    assert len(fusion['beats']) == len(peaks[0])
+    assert np.all(fusion['confidence'] == 1.0)
+    assert fusion['sensors'] == 3
+    assert np.all(np.abs(fusion['beats'] - peaks[0]) <= 8)
+
+
+def test_fused_hr_ignores_a_sensor_dropping_beats():
+    peaks = beat_trains()
+    _, clean = combine_beats(peaks, [beat_bpm(p) for p in peaks])
+    # Sensor 3 misses every third beat: its intervals there are twice as long
+    dropped = len(peaks[2][::3])
+    peaks[2] = np.delete(peaks[2], np.s_[::3])
+
+    fusion, combined = combine_beats(peaks, [beat_bpm(p) for p in peaks])
+    pooled = np.nanmean(np.concatenate([beat_bpm(p) for p in peaks]))
+
+    assert combined['avg'] == pytest.approx(clean['avg'], rel=0.01)
+    assert combined['avg'] == pytest.approx(BPM_SCALE / (165 / 220), rel=0.02)
+    assert pooled < 0.95 * clean['avg']
+    assert np.isclose(fusion['confidence'], 2 / 3).sum() == dropped
+
+
+def test_sensors_without_beats_do_not_contribute():
+    peaks = beat_trains()
+    peaks[1] = np.zeros(0, dtype=np.int64)
+
+    fusion = fuse_beats(peaks, 220)
+
+    assert fusion['sensors'] == 2
+    assert np.all(fusion['confidence'] == 1.0)
+    assert np.all(fusion['match'][:, 1] == -1)
+
+
+def test_precomputed_beat_values_give_the_same_trend_and_intervals():
+    peaks = beat_trains()
+    peaks[2] = np.delete(peaks[2], np.s_[::3])
+    values = [beat_bpm(p) for p in peaks]
+
+    trend = hr_trend(peaks, 60 * 220)
+    reused = hr_trend(peaks, 60 * 220, beat_values=values)
+
+    for key in ('bpm', 'beats', 'quality', 'combined'):
+        assert np.allclose(trend[key], reused[key], equal_nan=True), key
+    times, rr = rr_series(peaks[2])
+    assert np.allclose(rr, rr_series(peaks[2], bpm_values=values[2])[1], equal_nan=True)
+    assert np.allclose(60000 / rr, values[2][1:], equal_nan=True)
+    assert np.allclose(times, peaks[2][1:] * 60 / BPM_SCALE / 220)
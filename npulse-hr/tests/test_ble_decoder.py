@@ -0,0 +1,21 @@
+import numpy as np
+
+from ble_decoder import SampleDecoder
+from ecg_processor import parse_samples
+
+
+def test_lines_with_wrong_field_counts_are_dropped():
+    # The total value count is a multiple of three, but two of the lines are not
+    payload = b'1,2,3,4\n5,6\n7,8,9\n'
+
+    rows = SampleDecoder().feed(payload, force=True)
+
+    assert rows.tolist() == [[1, 2, 3], [7, 8, 9]]
+    assert rows.tolist() == parse_samples(payload, 3).tolist()
+
+
+def test_lines_split_across_notifications():
+    decoder = SampleDecoder()
+    rows = [decoder.feed(chunk).copy() for chunk in (b'101,202,', b'303\n404,5', b'05,606\n70')]
+
+    assert np.concatenate(rows).tolist() == [[101, 202, 303], [404, 505, 606]]
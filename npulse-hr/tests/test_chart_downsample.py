@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from chart_downsample import PYRAMID_BASE, build_pyramid, minmax_downsample, pyramid_range
+
+
+def recording(n=200_000, seed=0):
+    """Three channels of random walk with sparse one-sample spikes, no repeated values."""
+    rng = np.random.default_rng(seed)
+    x = np.cumsum(rng.normal(0, 1, (n, 3)), axis=0)
+    spikes = rng.choice(n, 40, replace=False)
+    x[spikes] += rng.choice([-500, 500], (40, 3))
+    return x
+
+
+def assert_buckets_keep_the_extremes(x, index, values, size, stop):
+    """
+    Every point pair is the min and max, in time order, of the size samples
+    from its first index; the last pair covers the samples up to stop.
+    """
+    firsts = index[0::2]
+    assert len(index) % 2 == 0 and np.all(np.diff(firsts) == size)
+    for k, (first, after) in enumerate(zip(firsts, np.append(firsts[1:], stop))):
+        bucket = x[first:after]
+        pair = values[2 * k:2 * k + 2]
+        assert np.array_equal(pair.min(axis=0), bucket.min(axis=0))
+        assert np.array_equal(pair.max(axis=0), bucket.max(axis=0))
+        low_first = bucket.argmin(axis=0) <= bucket.argmax(axis=0)
+        assert np.array_equal(pair[0], np.where(low_first, bucket.min(axis=0), bucket.max(axis=0)))
+
+
+@pytest.mark.parametrize('start, end, width', [(0, None, 300), (12_345, 67_890, 1000), (5, 2_000, 7)])
+def test_minmax_buckets_keep_every_extreme(start, end, width):
+    x = recording()
+
+    index, values = minmax_downsample(x, width, start, end)
+
+    end = len(x) if end is None else end
+    size = -(-(end - start) // width)
+    assert len(index) <= 2 * width and index[0] == start and index[-1] < end
+    assert_buckets_keep_the_extremes(x, index, values, size, end)
+
+
+def test_short_ranges_are_returned_unreduced():
+    x = recording(n=1000)
+
+    index, values = minmax_downsample(x, 300, 100, 500)
+
+    assert np.array_equal(index, np.arange(100, 500))
+    assert np.array_equal(values, x[100:500])
+    with pytest.raises(ValueError):
+        minmax_downsample(x, 0)
+
+
+def test_every_pyramid_viewport_keeps_the_raw_extremes():
+    x = recording()
+    pyramid = build_pyramid(x)
+    sizes = [level['size'] for level in pyramid['levels']]
+    rng = np.random.default_rng(1)
+
+    for _ in range(50):
+        start, end = np.sort(rng.integers(0, len(x), 2))
+        width = int(rng.integers(1, 500))
+        if end - start < 2:
+            continue
+
+        index, values, size = pyramid_range(pyramid, x, width, start, end)
+
+        if size == 1:
+            assert np.array_equal(values, x[start:end])
+            continue
+        # Widened to whole buckets of the level served from, at most two per
+        # pixel; below the finest level the raw range is reduced as it is
+        level = max([s for s in sizes if s <= (end - start) / width], default=1)
+        stop = min(-(-end // level) * level, len(x))
+        assert index[0] <= start and stop >= end
+        assert len(index) <= 4 * width
+        assert_buckets_keep_the_extremes(x, index, values, size, stop)
+
+
+def test_pyramid_levels_coarsen_by_the_factor():
+    pyramid = build_pyramid(recording())
+
+    sizes = [level['size'] for level in pyramid['levels']]
+
+    assert sizes[0] == PYRAMID_BASE and all(b == 4 * a for a, b in zip(sizes, sizes[1:]))
+    assert len(pyramid['levels'][-1]['low']) <= 4
+    assert np.array_equal(pyramid['levels'][-1]['high'].max(axis=0), recording().max(axis=0))
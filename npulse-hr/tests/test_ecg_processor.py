@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ecg_processor import BPM_RANGE, BPM_SCALE, analyze_ecg_file, hr_trend, samples_dataframe
+from ecg_signals import synthetic_ecg
+from recording_format import write_recording
+
+
+def test_binary_recording_is_not_copied(tmp_path):
+    path = str(tmp_path / 'ecg.npb')
+    write_recording(path, synthetic_ecg(seconds=30), 220)
+
+    results = analyze_ecg_file(path)
+
+    assert isinstance(results['samples'], np.memmap)
+    assert not any(isinstance(value, pd.DataFrame) for value in results.values())
+    assert samples_dataframe(results['samples']).shape == (30 * 220, 3)
+
+
+def test_hr_trend_windows_match_the_direct_mean():
+    rng = np.random.default_rng(0)
+    peaks = np.cumsum(rng.integers(90, 200, size=400))
+    # A 3 s dropout (24 BPM) is outside BPM_RANGE and must not count
+    peaks[200:] += 660
+    n_samples = int(peaks[-1]) + 100
+
+    trend = hr_trend([peaks], n_samples, fs=220, window=10, hop=5)
+
+    values = BPM_SCALE / (np.diff(peaks) / 220)
+    usable = (values > BPM_RANGE[0]) & (values < BPM_RANGE[1])
+    assert not usable.all()
+    for i, start in enumerate(trend['time']):
+        lo, hi = round(start * 220), round(start * 220) + 2200
+        ends = (peaks[1:] >= lo) & (peaks[1:] < hi)
+        expected = values[ends & usable]
+        assert trend['beats'][i, 0] == np.count_nonzero((peaks >= lo) & (peaks < hi))
+        if len(expected):
+            assert trend['bpm'][i, 0] == pytest.approx(expected.mean(), rel=1e-5)
+            assert trend['combined'][i] == pytest.approx(expected.mean(), rel=1e-5)
+        else:
+            assert np.isnan(trend['bpm'][i, 0])
+
+
+def test_hr_trend_quality_and_sensors_without_beats():
+    peaks = np.arange(0, 220 * 60, 110)  # 0.5 s apart, 146 BPM
+
+    trend = hr_trend([peaks, np.zeros(0, dtype=np.int64)], 220 * 60, fs=220, window=10, hop=5)
+
+    assert len(trend['time']) == 11
+    assert np.allclose(trend['bpm'][:, 0], BPM_SCALE / 0.5)
+    assert np.all(trend['beats'][:, 0] == 20)
+    assert np.all(trend['quality'][1:, 0] == 1.0)  # the first window misses the interval before beat 0
+    assert np.all(np.isnan(trend['bpm'][:, 1])) and not trend['beats'][:, 1].any()
+    assert not trend['quality'][:, 1].any()
+
+
+def test_hr_trend_combined_uses_the_fused_beats():
+    peaks = np.arange(0, 220 * 30, 110)
+    fusion = {'beats': peaks, 'bpm': np.full(len(peaks), 120.0), 'weight': np.ones(len(peaks))}
+    fusion['weight'][::2] = 0.0
+    fusion['bpm'][1::4] = 60.0
+
+    trend = hr_trend([peaks, peaks], 220 * 30, fs=220, window=10, hop=10, fusion=fusion)
+
+    # Half the weighted beats are at 60 BPM, the pooled sensor intervals play no part
+    assert np.allclose(trend['combined'], 90.0)
+    assert np.allclose(trend['bpm'], BPM_SCALE / 0.5)
@@ -0,0 +1,39 @@
+import pytest
+
+import gui_app
+from ecg_signals import synthetic_ecg
+from recording_format import write_recording
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('chart') / 'ecg.npb')
+    write_recording(path, synthetic_ecg(seconds=120, bpm=75), 220)
+    client = gui_app.app.test_client()
+    assert client.post('/analyze', json={'filepath': path}).get_json()['success']
+    return client
+
+
+@pytest.mark.parametrize('endpoint', ['/chart-data', '/chart-tiles'])
+def test_viewport_is_width_bounded(client, endpoint):
+    data = client.get(f'{endpoint}?start=10&end=100&width=300').get_json()
+
+    assert data['success']
+    # Pyramid levels widen the range to whole buckets, so a few more points may come back
+    assert len(data['labels']) <= 4 * 300
+    assert data['labels'][0] >= 10 * 220 - 1024
+
+
+def test_stats_come_from_the_analysis(client):
+    data = client.get('/chart-data?start=0&end=1').get_json()
+
+    assert data['stats'] == gui_app.last_results['results']['sample_stats']
+
+
+@pytest.mark.parametrize('endpoint', ['/chart-data', '/chart-tiles'])
+@pytest.mark.parametrize('query', ['end=inf', 'start=-inf', 'start=nan&end=5'])
+def test_non_finite_range_is_rejected(client, endpoint, query):
+    response = client.get(f'{endpoint}?{query}')
+
+    assert response.status_code == 200
+    assert response.get_json()['success'] is False
@@ -0,0 +1,31 @@
+import pytest
+
+import gui_app
+from ecg_signals import synthetic_ecg
+from recording_format import write_recording
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('trend') / 'ecg.npb')
+    write_recording(path, synthetic_ecg(seconds=120, bpm=75), 220)
+    client = gui_app.app.test_client()
+    assert client.post('/analyze', json={'filepath': path}).get_json()['success']
+    return client
+
+
+def test_trend_with_custom_window(client):
+    trend = client.get('/hr-trend?window=20&hop=10').get_json()
+
+    assert trend['success']
+    assert len(trend['time']) == 11
+    assert trend['combined'][0] == pytest.approx(75, abs=3)
+
+
+@pytest.mark.parametrize('query', ['window=inf', 'hop=inf', 'hop=nan', 'hop=1e-9', 'window=0',
+                                   'window=2&hop=5', 'window=1e300', 'window=10&hop=0.005'])
+def test_bad_window_or_hop_is_rejected(client, query):
+    response = client.get(f'/hr-trend?{query}')
+
+    assert response.status_code == 200
+    assert response.get_json()['success'] is False
@@ -0,0 +1,43 @@
+import io
+import os
+
+import pytest
+
+import gui_app
+from recording_format import read_header
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setitem(gui_app.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setitem(gui_app.app.config, 'RECORDING_FORMAT', 'npc')
+    return gui_app.app.test_client()
+
+
+def upload(client, text):
+    data = {'file': (io.BytesIO(text), 'ecg.txt')}
+    return client.post('/upload', data=data, content_type='multipart/form-data').get_json()
+
+
+def test_text_upload_is_stored_compressed(client, tmp_path):
+    result = upload(client, b'1,2,3\n4,5,6\n7,8,9\n')
+
+    assert result['success']
+    assert result['filename'].endswith('.npc')
+    assert read_header(result['filepath'])['n_samples'] == 3
+    assert os.listdir(tmp_path) == [result['filename']]
+
+
+def test_values_beyond_int16_keep_the_text_upload(client, tmp_path):
+    result = upload(client, b'1,2,3\n40000,5,6\n7,8,9\n')
+
+    assert result['success']
+    assert result['filename'].endswith('.txt')
+    # No half-written binary recording is left next to it
+    assert os.listdir(tmp_path) == [result['filename']]
+
+
+def test_analysis_cache_keeps_nothing_on_disk_by_default():
+    # Disk entries are unpickled, so none may come from the upload folder
+    assert gui_app.app.config['ANALYSIS_CACHE_DIR'] is None
+    assert gui_app.analysis_cache.disk_dir is None
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from hrv import TIME_FIELDS, hrv_batch, hrv_metrics, hrv_windows
+
+
+def rr_series(seconds, modulation_hz=0.1, seed=0, rejected=()):
+    """RR intervals (ms) around 800 ms, modulated at one frequency, with some intervals rejected."""
+    rng = np.random.default_rng(seed)
+    times, rr = [], []
+    t = 0.0
+    while t < seconds:
+        interval = 800 + 60 * np.sin(2 * np.pi * modulation_hz * t) + rng.normal(0, 15)
+        t += interval / 1000
+        times.append(t)
+        rr.append(interval)
+    rr = np.array(rr)
+    rr[list(rejected)] = np.nan
+    return np.array(times), rr
+
+
+def direct_time_domain(rr):
+    valid = rr[~np.isnan(rr)]
+    diff = np.diff(rr)
+    diff = diff[~np.isnan(diff)]  # only between two valid intervals
+    sdnn = np.std(valid, ddof=1)
+    sd1 = np.std(diff, ddof=1) / np.sqrt(2)
+    return {'beats': len(valid), 'mean_rr': valid.mean(), 'sdnn': sdnn,
+            'rmssd': np.sqrt(np.mean(diff ** 2)), 'pnn50': 100 * np.mean(np.abs(diff) > 50),
+            'sd1': sd1, 'sd2': np.sqrt(2 * sdnn ** 2 - sd1 ** 2)}
+
+
+def test_time_domain_matches_the_direct_formulas():
+    times, rr = rr_series(300, rejected=(5, 6, 100))
+
+    metrics = hrv_metrics(times, rr)
+
+    for key, expected in direct_time_domain(rr).items():
+        assert metrics[key] == pytest.approx(expected, rel=1e-9), key
+
+
+@pytest.mark.parametrize('spectrum', ['lomb', 'fft'])
+def test_lf_hf_follows_the_modulation_band(spectrum):
+    lf_times, lf_rr = rr_series(300, modulation_hz=0.1)
+    hf_times, hf_rr = rr_series(300, modulation_hz=0.25)
+
+    assert hrv_metrics(lf_times, lf_rr, spectrum=spectrum)['lf_hf'] > 3
+    assert hrv_metrics(hf_times, hf_rr, spectrum=spectrum)['lf_hf'] < 1 / 3
+
+
+def test_short_series_have_no_spectrum():
+    times, rr = rr_series(10)
+
+    metrics = hrv_metrics(times, rr)
+
+    assert not np.isnan(metrics['sdnn'])
+    assert np.isnan(metrics['lf']) and np.isnan(metrics['lf_hf'])
+
+
+def test_windows_match_the_metrics_of_each_slice():
+    times, rr = rr_series(900, rejected=(50, 400))
+
+    windows = hrv_windows(times, rr, window=300, hop=120, duration=900)
+
+    assert windows['time'].tolist() == [0, 120, 240, 360, 480, 600]
+    for i, start in enumerate(windows['time']):
+        inside = (times >= start) & (times < start + 300)
+        for key, expected in direct_time_domain(rr[inside]).items():
+            assert windows[key][i] == pytest.approx(expected, rel=1e-9), key
+
+
+def test_batch_matches_one_recording_at_a_time():
+    series = [rr_series(seconds, seed=seed, rejected=(3,)) for seed, seconds in enumerate((120, 300, 40))]
+
+    batch = hrv_batch(series)
+
+    for i, (times, rr) in enumerate(series):
+        single = hrv_metrics(times, rr, spectrum='fft')
+        for key in TIME_FIELDS:
+            assert batch[key][i] == pytest.approx(single[key], rel=1e-9), key
+        for key in ('lf', 'hf', 'lf_hf'):
+            assert batch[key][i] == pytest.approx(single[key], rel=1e-6, nan_ok=True), key
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from plot_renderer import render_ecg_png
+
+HR = {'avg': 75.0, 'min': 70.0, 'max': 80.0}
+
+
+@pytest.mark.parametrize('size', ['full', 'thumbnail', 'sparkline'])
+def test_renders_png(size):
+    samples = np.random.default_rng(0).integers(1900, 2100, (5000, 3))
+
+    png = render_ecg_png(samples, [HR] * 3, HR, 220, size=size)
+
+    assert png.startswith(b'\x89PNG')
+
+
+def test_empty_recording_is_rejected():
+    with pytest.raises(ValueError, match="no samples"):
+        render_ecg_png(np.empty((0, 3), dtype=np.int16), [HR] * 3, HR, 220)
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from ecg_processor import filter_channels
+from ecg_signals import synthetic_ecg
+from qrs_detector import REFRACTORY, pan_tompkins_peaks
+
+
+@pytest.mark.parametrize('bpm', [50, 75, 110, 150])
+def test_one_beat_per_heartbeat(bpm):
+    # The band-passed T-wave carries over half the QRS slope; it must not count as a beat
+    seconds = 60
+    filtered, _ = filter_channels(synthetic_ecg(seconds=seconds, bpm=bpm, seed=3))
+    beats = pan_tompkins_peaks(filtered[:, 0])
+
+    assert len(beats) == pytest.approx(seconds * bpm / 73, rel=0.06)
+    assert np.diff(beats).min() >= REFRACTORY * 220
+
+
+def test_dead_channel_gives_no_beats():
+    rng = np.random.default_rng(0)
+    recording = synthetic_ecg(seconds=30, bpm=75).astype(np.float64)
+    # A disconnected sensor: slow drift and a little noise, no heartbeat
+    t = np.arange(len(recording)) / 220
+    recording[:, 1] = 3000 + 80 * np.sin(2 * np.pi * 0.03 * t) + 2 * t + rng.normal(0, 2, len(recording))
+    filtered, _ = filter_channels(recording)
+
+    assert len(pan_tompkins_peaks(filtered[:, 0])) > 0
+    assert len(pan_tompkins_peaks(filtered[:, 1])) == 0
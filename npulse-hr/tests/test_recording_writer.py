@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+
+from recording_format import open_recording
+from recording_writer import PARTIAL_SUFFIX, RecordingWriter, recover_partial_recordings
+
+
+def test_recovery_skips_journals_still_being_written(tmp_path):
+    path = str(tmp_path / 'live.npb')
+    writer = RecordingWriter(path, flush_interval=60)
+    writer.write(np.ones((10, 3), dtype=np.int32))
+    writer.flush()
+
+    assert recover_partial_recordings(str(tmp_path)) == []
+    assert os.path.exists(path + PARTIAL_SUFFIX)
+
+    assert writer.close() == path
+    assert len(open_recording(path)[1]) == 10
+
+
+def test_recovery_finalizes_abandoned_journals(tmp_path):
+    path = str(tmp_path / 'crashed.npb')
+    writer = RecordingWriter(path, flush_interval=60)
+    writer.write(np.ones((10, 3), dtype=np.int32))
+    writer.flush()
+    # A crash: the journal is closed (releasing its lock) without being finalized
+    writer._stop.set()
+    writer._wake.set()
+    writer._thread.join()
+    writer._file.close()
+
+    assert recover_partial_recordings(str(tmp_path)) == [path]
+    assert len(open_recording(path)[1]) == 10
+    assert not os.path.exists(path + PARTIAL_SUFFIX)
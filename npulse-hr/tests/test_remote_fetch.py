@@ -0,0 +1,58 @@
+import os
+
+import requests
+
+from remote_fetch import fetch_url, open_url
+
+
+def serve(directory, name, body):
+    path = directory / name
+    path.write_bytes(body)
+    return path
+
+
+def test_cold_fetch_streams_the_body_into_the_cache(http_server, tmp_path):
+    base, directory, _ = http_server
+    serve(directory, 'ecg.txt', b'1,2,3\n4,5,6\n')
+    cache = tmp_path / 'cache'
+
+    assert fetch_url(f'{base}/ecg.txt', cache_dir=str(cache)) == '1,2,3\n4,5,6\n'
+    assert sorted(name.rsplit('.', 1)[1] for name in os.listdir(cache)) == ['body', 'json']
+
+
+def test_unchanged_body_is_revalidated_and_read_from_disk(http_server, tmp_path):
+    base, directory, _ = http_server
+    serve(directory, 'ecg.txt', b'1,2,3\n')
+    cache = str(tmp_path / 'cache')
+    fetch_url(f'{base}/ecg.txt', cache_dir=cache)
+
+    chunks = open_url(f'{base}/ecg.txt', cache_dir=cache)
+
+    # A 304 answer is served from the cached file, not the response
+    assert chunks.__name__ == '_iter_file'
+    assert b''.join(chunks) == b'1,2,3\n'
+
+
+def test_changed_body_replaces_the_cached_copy(http_server, tmp_path):
+    base, directory, _ = http_server
+    path = serve(directory, 'ecg.txt', b'1,2,3\n')
+    cache = str(tmp_path / 'cache')
+    fetch_url(f'{base}/ecg.txt', cache_dir=cache)
+
+    path.write_bytes(b'7,8,9\n10,11,12\n')  # new size, so a new ETag
+
+    assert fetch_url(f'{base}/ecg.txt', cache_dir=cache) == '7,8,9\n10,11,12\n'
+    assert fetch_url(f'{base}/ecg.txt', cache_dir=cache) == '7,8,9\n10,11,12\n'
+
+
+def test_cached_copy_is_used_when_the_server_is_down(http_server, tmp_path):
+    base, directory, stop = http_server
+    serve(directory, 'ecg.txt', b'1,2,3\n')
+    cache = str(tmp_path / 'cache')
+    fetch_url(f'{base}/ecg.txt', cache_dir=cache)
+
+    stop()
+
+    # A plain session, so the shared one's retry backoff does not slow the test
+    assert fetch_url(f'{base}/ecg.txt', cache_dir=cache, session=requests.Session()) == '1,2,3\n'
+    assert fetch_url(f'{base}/other.txt', cache_dir=cache, session=requests.Session()) is None
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from ecg_signals import synthetic_ecg
+from respiration import empty_respiration, respiration_rate
+
+
+def breathing(seconds, breaths_per_minute, fs=220, seed=0):
+    """Two channels with a sinusoidal baseline plus noise, and a constant third."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * fs)) / fs
+    wave = 200 * np.sin(2 * np.pi * breaths_per_minute / 60 * t)
+    samples = np.column_stack([2000 + wave + rng.normal(0, 20, len(t)),
+                               2500 - 0.5 * wave + rng.normal(0, 20, len(t)),
+                               np.full(len(t), 4800.0)])
+    return samples.astype(np.int16)
+
+
+@pytest.mark.parametrize('breaths_per_minute', [8, 15, 24])
+def test_rate_follows_the_baseline(breaths_per_minute):
+    result = respiration_rate(breathing(120, breaths_per_minute), 220)
+
+    assert result['rate'][:2] == pytest.approx([breaths_per_minute] * 2, rel=0.05)
+    assert result['combined'] == pytest.approx(breaths_per_minute, rel=0.05)
+    # The constant channel has no breaths
+    assert result['rate'][2] == 0.0 and not len(result['breaths'][2])
+
+
+def test_breaths_are_indexed_in_input_samples():
+    result = respiration_rate(breathing(60, 12), 220)
+
+    # One breath every 5 s at the full rate, whatever rate they were found at
+    assert np.median(np.diff(result['breaths'][0])) == pytest.approx(5 * 220, rel=0.05)
+    assert result['fs'] < 220
+
+
+def test_ecg_breathing_wander_is_found():
+    result = respiration_rate(synthetic_ecg(seconds=120), 220)
+
+    # The synthetic baseline wanders at 0.25 Hz under the QRS complexes
+    assert result['rate'] == pytest.approx([15] * 3, rel=0.05)
+
+
+def test_empty_result_matches_an_empty_recording():
+    fs = 220 * 73 / 60
+    expected = respiration_rate(np.zeros((0, 3), dtype=np.int16), fs)
+
+    empty = empty_respiration(3, fs)
+
+    assert empty['rate'] == expected['rate'] and empty['combined'] == expected['combined']
+    assert empty['fs'] == expected['fs']
+    assert [b.dtype for b in empty['breaths']] == [b.dtype for b in expected['breaths']]
+    assert [len(b) for b in empty['breaths']] == [0, 0, 0]
@@ -0,0 +1,75 @@
+import numpy as np
+
+from ecg_signals import synthetic_ecg
+from signal_quality import empty_quality, mask_samples, sample_mask, window_quality
+
+
+def damaged_ecg():
+    """One minute of ECG: sensor 1 clean, sensor 2 disconnected for 10-20 s, sensor 3 clipped for 30-40 s."""
+    samples = synthetic_ecg(seconds=60).astype(np.int32)
+    samples[10 * 220:20 * 220, 1] = samples[0, 1]
+    samples[30 * 220:40 * 220, 2] = samples[:, 2].max()
+    return samples
+
+
+def test_windows_flag_flatline_and_clipping():
+    quality = window_quality(damaged_ecg(), 220)
+
+    assert quality['good'].shape == (30, 3)
+    assert quality['time'][:3].tolist() == [0, 2, 4]
+    assert quality['good'][:, 0].all()
+    bad_flat = np.flatnonzero(~quality['good'][:, 1])
+    bad_clipped = np.flatnonzero(~quality['good'][:, 2])
+    assert bad_flat.tolist() == list(range(5, 10))
+    assert bad_clipped.tolist() == list(range(15, 20))
+    assert (quality['flatline'][5:10, 1] < 0.1).all()
+    assert (quality['clipping'][15:20, 2] > 0.5).all()
+
+
+def test_noise_fails_the_hr_band_concentration():
+    rng = np.random.default_rng(0)
+    noise = rng.normal(2000, 50, (60 * 220, 1))  # power spread over the whole band
+
+    quality = window_quality(noise, 220)
+
+    assert not quality['good'].any()
+
+
+def test_sample_mask_covers_exactly_the_good_windows():
+    quality = window_quality(damaged_ecg(), 220)
+
+    good = sample_mask(quality, 60 * 220)
+
+    assert good.shape == (60 * 220, 3)
+    assert good[:, 0].all()
+    assert not good[10 * 220:20 * 220, 1].any()
+    assert good[:10 * 220, 1].all() and good[20 * 220:, 1].all()
+    assert np.count_nonzero(~good[:, 2]) == 10 * 220
+
+
+def test_sample_mask_extends_the_last_window_and_passes_short_recordings():
+    samples = synthetic_ecg(seconds=61)[:61 * 220 - 100]
+    quality = window_quality(samples, 220)
+
+    assert sample_mask(quality, len(samples))[-100:].all()
+    assert sample_mask(empty_quality(3), 50).all()
+
+
+def test_masked_stretches_are_bridged_by_straight_lines():
+    samples = damaged_ecg()
+    good = sample_mask(window_quality(samples, 220), len(samples))
+
+    masked = mask_samples(samples, good)
+
+    assert np.array_equal(masked[good], samples[good])
+    bridge = masked[10 * 220:20 * 220, 1]
+    assert np.allclose(np.diff(bridge, 2), 0)
+
+
+def test_short_recordings_match_the_empty_result():
+    quality = window_quality(np.zeros((3, 3)), 220, offset=500)
+    empty = empty_quality(3, 220)
+
+    assert quality.keys() == empty.keys()
+    for key, value in empty.items():
+        assert np.array_equal(quality[key], value) and np.asarray(quality[key]).dtype == np.asarray(value).dtype
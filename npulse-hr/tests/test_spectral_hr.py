@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from ecg_processor import BPM_RANGE, BPM_SCALE, analyze_ecg_file
+from ecg_signals import noise_recording, synthetic_ecg
+from recording_format import write_recording
+from spectral_hr import MIN_SPECTRAL_CONFIDENCE, hr_band, spectral_hr, spectral_peak
+
+
+@pytest.mark.parametrize('bpm', [50, 75, 110])
+def test_fast_mode_agrees_with_beats(tmp_path, bpm):
+    path = str(tmp_path / 'ecg.npb')
+    write_recording(path, synthetic_ecg(bpm=bpm, seed=3), 220)
+
+    beats = analyze_ecg_file(path)
+    fast = analyze_ecg_file(path, mode='fast')
+
+    assert fast['mode'] == 'fast'
+    assert fast['spectral']['combined_confidence'] >= MIN_SPECTRAL_CONFIDENCE
+    assert fast['combined_hr']['avg'] == pytest.approx(beats['combined_hr']['avg'], abs=2)
+    for fast_hr, beat_hr in zip(fast['hr_results'], beats['hr_results']):
+        assert fast_hr['avg'] == pytest.approx(beat_hr['avg'], abs=2)
+
+
+def test_fast_mode_falls_back_to_beats_without_rhythm(tmp_path):
+    path = str(tmp_path / 'noise.npb')
+    write_recording(path, noise_recording(), 220)
+
+    fast = analyze_ecg_file(path, mode='fast')
+
+    assert fast['mode'] == 'beats'
+    assert fast['spectral']['combined'] == 0
+    assert fast['combined_hr'] == analyze_ecg_file(path)['combined_hr']
+
+
+def test_estimates_stay_in_band():
+    spectral = spectral_hr(noise_recording(seed=1))
+    for bpm in spectral['bpm'] + [spectral['combined']]:
+        assert bpm == 0 or BPM_RANGE[0] <= bpm <= BPM_RANGE[1]
+
+
+def test_octave_step_down_stops_at_band_edge():
+    band = hr_band(BPM_SCALE, BPM_RANGE)
+    freqs = np.arange(200) * 0.05
+    psd = np.full(len(freqs), 1e-3)
+    # Strong peak just inside the band whose subharmonic lies below it
+    k = int(np.ceil(band[0] / 0.05)) + 2
+    sub = k // 2
+    psd[k], psd[sub] = 1.0, 0.9
+
+    frequency, _ = spectral_peak(freqs, psd, band)
+
+    assert band[0] <= frequency <= band[1]
+    assert frequency == pytest.approx(freqs[k], abs=0.05)
@@ -0,0 +1,19 @@
+import pytest
+
+from ecg_processor import analyze_ecg_file
+from ecg_signals import synthetic_ecg
+from recording_format import write_recording
+from stream_processor import analyze_ecg_stream
+
+
+def test_stream_matches_in_memory_analysis(tmp_path):
+    path = str(tmp_path / 'ecg.npb')
+    write_recording(path, synthetic_ecg(seconds=300, bpm=80, noise=20), 220)
+
+    expected = analyze_ecg_file(path, mask_bad_windows=False)
+    streamed = analyze_ecg_stream(path, block_size=4096)
+
+    for key in ('avg', 'min', 'max'):
+        assert streamed['combined_hr'][key] == pytest.approx(expected['combined_hr'][key])
+        for sensor, reference in zip(streamed['hr_results'], expected['hr_results']):
+            assert sensor[key] == pytest.approx(reference[key])